@@ -9,6 +9,20 @@ from adafruit_pca9685 import PCA9685
 import tkinter as tk
 # Fix the import - use the UIOverlay class instead
 from UI import UIOverlay
+from camera_engine import CaptureEngine, BACKEND_V4L2, STATE_RECONNECTING
+from device_watch import DEVICE_DIR
+from latency import LatencyRecorder
+from render_scheduler import RenderScheduler
+from camera_probe import CapabilityCache
+from usb_budget import Topology
+from camera_transform import RemapCache, load_profiles
+from compositor import Compositor
+from framebuffer_sink import FB_DEVICE, FramebufferSink
+from hud import ANCHOR_RIGHT, HUD_MARGIN, Hud
+from tile_pool import TilePool, usable_cpus
+from layouts import LAYOUT_PANORAMA, LAYOUT_SINGLE, compile_layout, default_layout, next_layout
+from panorama import PanoramaCompositor, PanoramaTables, load_calibration
+from zoom import ZOOM_STEP, ZoomState
 import logging
 import os
 from datetime import datetime
@@ -63,9 +77,9 @@ camera_names = {
 
 # Track camera stats
 camera_stats = {
-    '1': {'frames_read': 0, 'frames_failed': 0, 'last_frame_time': None, 'start_time': None},
-    '2': {'frames_read': 0, 'frames_failed': 0, 'last_frame_time': None, 'start_time': None},
-    '3': {'frames_read': 0, 'frames_failed': 0, 'last_frame_time': None, 'start_time': None}
+    '1': {'frames_read': 0, 'frames_failed': 0, 'frames_stale': 0, 'last_frame_time': None, 'start_time': None, 'open_latency': None, 'fps': None, 'read_latency': None},
+    '2': {'frames_read': 0, 'frames_failed': 0, 'frames_stale': 0, 'last_frame_time': None, 'start_time': None, 'open_latency': None, 'fps': None, 'read_latency': None},
+    '3': {'frames_read': 0, 'frames_failed': 0, 'frames_stale': 0, 'last_frame_time': None, 'start_time': None, 'open_latency': None, 'fps': None, 'read_latency': None}
 }
 
 camera_paths = {
@@ -88,11 +102,32 @@ camera_paths = {
         #'/dev/v4l/by-path/platform-fd500000.pcie-pci-0000:01:00.0-usb-0:1.1.1:1.0-video-index0'
 }
 
+# Single owner of every cv2.VideoCapture in the process. The local display and
+# the web stream (hotspot.RemoteServer) both subscribe to it instead of opening
+# the /dev/video devices themselves, so they can run at the same time.
+# Each camera is opened at the smallest probed mode that fills its tile;
+# probe results are cached on disk so only the first run pays for them.
+# Modes are then planned together so cameras sharing the Sabrent hub stay
+# within its USB bandwidth (dry run: python usb_budget.py KEY=PATH ...).
+# Unplugged cameras are reopened in the background as soon as they reappear.
+# Low latency: frames that queued up in the driver are skipped (counted as frames_stale).
+# Capture goes straight through V4L2 mmap buffers instead of cv2.VideoCapture.
+frame_hub = CaptureEngine(camera_paths, camera_names, camera_stats, camera_loggers,
+                          capabilities=CapabilityCache(),
+                          topology=Topology.from_paths(camera_paths),
+                          device_dir=DEVICE_DIR,
+                          low_latency=True,
+                          backend=BACKEND_V4L2)
+
 current_mode = None
 current_cam_keys = None
+current_layout = None
 stop_thread = False
 display_thread = None
 multiview_selection = []
+display_window_ready = False
+# The UI overlay (and its remote server), once started; the HUD reads network status from it
+ui_overlay = None
 
 # Hardcode a reasonable default resolution that works on Pi displays
 SCREEN_WIDTH = 1024
@@ -101,6 +136,63 @@ SCREEN_HEIGHT = 600
 # Timeout (seconds) when waiting for the display thread to stop
 DISPLAY_THREAD_SHUTDOWN_TIMEOUT = 5
 
+# Display refresh rate (fps) the render loops are paced at; 30, 20 or 15 all work.
+# A tick without a new camera frame skips compositing entirely.
+RENDER_FPS = 30
+
+# Tiles of a multiview frame are resized in parallel on this many worker threads
+# (plus the display thread); None for COMPOSITOR_CPUS leaves them unpinned, or
+# e.g. {2, 3} keeps them off the cores the camera readers are busy on.
+# On a single core the pool can only add overhead (bench_compositor.py: 3-up
+# 1.55 ms serial vs 1.66 ms pooled), so it is only created with cores to spare;
+# the compositor also draws small frames (an inset, one tile) without it.
+COMPOSITOR_WORKERS = 2
+COMPOSITOR_CPUS = None
+tile_pool = TilePool(COMPOSITOR_WORKERS, COMPOSITOR_CPUS) if usable_cpus(COMPOSITOR_CPUS) > 1 else None
+
+# Where composites are shown: a fullscreen OpenCV window (through X11), or written
+# straight into the Linux framebuffer, skipping the window system's scaling and copies
+DISPLAY_SINK_OPENCV = 'opencv'
+DISPLAY_SINK_FRAMEBUFFER = 'framebuffer'
+DISPLAY_SINK = DISPLAY_SINK_OPENCV
+framebuffer = None
+
+# Camera names, fps and read latency per tile, plus fan and network status, drawn
+# into the composite itself rather than in separate translucent windows
+HUD_ENABLED = True
+# The fps and latency shown change a little every frame; they are read this often
+# (seconds) and latency rounded to this many ms, so labels aren't re-rendered per frame
+HUD_STATS_INTERVAL = 0.5
+HUD_LATENCY_STEP_MS = 5
+# Camera key -> (monotonic time read, fps, read latency in ms) last shown
+hud_readings = {}
+
+# Per-camera lens undistortion, crop, rotation and mirroring (camera_transforms.json),
+# compiled into one remap per tile and cached on disk across runs
+camera_transforms = load_profiles()
+remap_cache = RemapCache()
+
+# Digital pan/zoom per camera, from the touchscreen (drag, wheel, double tap) and the
+# web UI (pinch); it lives here rather than in a display thread so it survives mode switches
+camera_zoom = {k: ZoomState() for k in camera_paths}
+# (camera keys, tiles) on screen now, for mapping touches to a camera; None if not zoomable
+display_tiles = None
+# Camera zoom, tile and last position of a drag on the display in progress
+display_drag = None
+
+# Cameras the 'P' hotkey stitches into the panorama layout, left to right: Rowley's and
+# Brevity's views overlap over the rear cargo area. Calibrate with
+# `python panorama.py 1=<Rowley's device> 3=<Brevity's device>` (see panorama.py).
+PANORAMA_CAMERAS = ['1', '3']
+# Warp and blend tables, built on first use per camera set and screen size
+panorama_tables = {}
+
+# Longest startup waits (seconds) for the warm camera pool to deliver first frames
+CAMERA_WARMUP_TIMEOUT = 5
+
+# Capture-to-glass latency of the local display, by stage (enable latency.LATENCY_MEASUREMENT)
+display_latency = LatencyRecorder('display')
+
 # Skip the detection logic since it's returning incorrect values
 def get_screen_resolution():
     logger.info(f"Using fixed resolution: {SCREEN_WIDTH}x{SCREEN_HEIGHT}")
@@ -109,6 +201,160 @@ def get_screen_resolution():
 # Use a global variable to store screen dimensions
 SCREEN_WIDTH, SCREEN_HEIGHT = get_screen_resolution()
 
+def ensure_display_window():
+    """Create the fullscreen 'Camera View' window once; later calls are no-ops.
+
+    The window persists across mode switches, so the half-second settle delay
+    is only paid at startup instead of on every camera switch.
+    """
+    global display_window_ready, framebuffer
+    if display_window_ready:
+        return
+
+    if DISPLAY_SINK == DISPLAY_SINK_FRAMEBUFFER:
+        framebuffer = FramebufferSink(FB_DEVICE)
+        framebuffer.clear()
+        display_window_ready = True
+        return
+
+    # Create window with Raspberry Pi optimized settings
+    window_name = 'Camera View'
+    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    cv2.setMouseCallback(window_name, on_display_mouse)
+    
+    # Allow window system to initialize
+    time.sleep(0.5)
+    
+    # Force window to be positioned at 0,0 and set size explicitly
+    cv2.moveWindow(window_name, 0, 0)
+    cv2.resizeWindow(window_name, SCREEN_WIDTH, SCREEN_HEIGHT)
+    
+    # Set fullscreen 
+    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    
+    # Show initial black background while loading
+    black_bg = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), dtype=np.uint8)
+    cv2.imshow(window_name, black_bg)
+    cv2.waitKey(1)
+    display_window_ready = True
+
+def tile_at(x, y):
+    """``(zoom, tile)`` of the camera shown at screen (``x``, ``y``), or None."""
+    shown = display_tiles
+    if shown is None:
+        return None
+    cam_keys, tiles = shown
+    # Later tiles are drawn on top (PIP insets)
+    for k, t in reversed(list(zip(cam_keys, tiles))):
+        if t.x <= x < t.x + t.w and t.y <= y < t.y + t.h:
+            return camera_zoom[k], t
+    return None
+
+def on_display_mouse(event, x, y, flags, param):
+    """Touchscreen/mouse on the display: drag pans the camera under it, the wheel zooms
+    around the pointer, and a double tap zooms in there (or back out to the whole frame)."""
+    global display_drag
+    if event == cv2.EVENT_LBUTTONDOWN:
+        hit = tile_at(x, y)
+        display_drag = (hit, x, y) if hit is not None else None
+    elif event == cv2.EVENT_MOUSEMOVE and display_drag is not None and flags & cv2.EVENT_FLAG_LBUTTON:
+        (zoom, t), last_x, last_y = display_drag
+        # The image follows the finger, so the view moves the other way
+        zoom.pan_by((last_x - x) / t.w, (last_y - y) / t.h)
+        display_drag = ((zoom, t), x, y)
+    elif event == cv2.EVENT_LBUTTONUP:
+        display_drag = None
+    elif event in (cv2.EVENT_LBUTTONDBLCLK, cv2.EVENT_MOUSEWHEEL):
+        hit = tile_at(x, y)
+        if hit is None:
+            return
+        zoom, t = hit
+        anchor = ((x - t.x) / t.w, (y - t.y) / t.h)
+        if event == cv2.EVENT_LBUTTONDBLCLK:
+            zoom.toggle(anchor)
+        else:
+            zoom.zoom_by(ZOOM_STEP if cv2.getMouseWheelDelta(flags) > 0 else 1 / ZOOM_STEP, anchor)
+
+def zoom_versions(cam_keys):
+    return tuple(camera_zoom[k].version for k in cam_keys)
+
+def camera_states(engine, cam_keys):
+    """Reader state of each of ``cam_keys``; a change means a tile's black or placeholder card changes."""
+    return tuple(engine.camera_state(k) for k in cam_keys)
+
+def capture_size(compositor, cam_keys):
+    """Tile size to subscribe to ``cam_keys`` with: full resolution while any of them is
+    zoomed in, since the cropped region is scaled up to the whole tile."""
+    if any(camera_zoom[k].is_zoomed for k in cam_keys):
+        return None
+    return compositor.max_tile_size()
+
+def present(window_name, canvas, rects=None):
+    """Show ``canvas`` on the display sink; returns the key pressed in the window (0xFF if none).
+
+    ``rects`` limits a framebuffer write to the regions that changed; the
+    OpenCV window always gets the whole canvas.
+    """
+    if framebuffer is not None:
+        framebuffer.show(canvas, rects)
+        return 0xFF
+    cv2.imshow(window_name, canvas)
+    return cv2.waitKey(1) & 0xFF
+
+def poll_key():
+    """Service the OpenCV window's event loop; returns the key pressed (0xFF if none)."""
+    if framebuffer is not None:
+        return 0xFF
+    return cv2.waitKey(1) & 0xFF
+
+def display_buffers():
+    """Canvases for a compositor: the framebuffer keeps the last frame itself, so one will do,
+    and then the compositor's dirty tiles are exactly what changed on screen."""
+    return 1 if DISPLAY_SINK == DISPLAY_SINK_FRAMEBUFFER else 2
+
+def update_hud(hud, cam_keys, tiles):
+    """Refresh the HUD labels: camera, fps and read latency per tile, then fan and network status."""
+    if not HUD_ENABLED:
+        return
+    now = time.monotonic()
+    for i, k in enumerate(cam_keys):
+        reading = hud_readings.get(k)
+        if reading is None or now - reading[0] >= HUD_STATS_INTERVAL:
+            fps, read_latency = camera_stats[k]['fps'], camera_stats[k]['read_latency']
+            if read_latency is not None:
+                read_latency = round(read_latency * 1000 / HUD_LATENCY_STEP_MS) * HUD_LATENCY_STEP_MS
+            reading = (now, fps, read_latency)
+            hud_readings[k] = reading
+        _, fps, read_latency = reading
+        text = camera_names[k]
+        if fps is not None:
+            text += f"  {fps:.0f} fps"
+        if read_latency is not None:
+            text += f"  {read_latency} ms"
+        if display_tiles is not None and camera_zoom[k].is_zoomed:
+            # (the panorama stitches whole frames)
+            text += f"  {camera_zoom[k].zoom:.1f}x"
+        hud.set(('camera', i), text, tiles[i].x + HUD_MARGIN, tiles[i].y + HUD_MARGIN)
+    fans_text = "/".join(f"{fan_percent[i]}%" for i in sorted(fan_percent))
+    network = ui_overlay.remote_server.mode if ui_overlay is not None else None
+    hud.set('status', f"Fans {fans_text}  Net {network or 'off'}",
+            SCREEN_WIDTH - HUD_MARGIN, HUD_MARGIN, anchor=ANCHOR_RIGHT)
+
+def get_panorama_tables(cam_keys):
+    """Stitching tables for ``cam_keys`` on this screen, or None if they aren't calibrated together."""
+    key = (tuple(cam_keys), SCREEN_WIDTH, SCREEN_HEIGHT)
+    if key not in panorama_tables:
+        calibration = load_calibration()
+        if calibration is None:
+            logger.warning("No panorama calibration; run panorama.py against the cameras first")
+            return None
+        try:
+            panorama_tables[key] = PanoramaTables(calibration, cam_keys, SCREEN_WIDTH, SCREEN_HEIGHT)
+        except ValueError as e:
+            logger.warning(f"Cannot stitch {', '.join(camera_names[k] for k in cam_keys)}: {str(e)}")
+            return None
+    return panorama_tables[key]
+
 def get_single_frame(path):
     cap = cv2.VideoCapture(path)
     if not cap.isOpened():
@@ -120,10 +366,17 @@ def get_single_frame(path):
         return np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), dtype=np.uint8)
     return cv2.resize(frame, (SCREEN_WIDTH, SCREEN_HEIGHT))
 
-def show_multiview(cam_keys):
+def show_multiview(cam_keys, layout=None):
     global stop_thread, SCREEN_WIDTH, SCREEN_HEIGHT
     stop_thread = False
-    logger.info(f"Showing multiview: Camera {camera_names[cam_keys[0]]} and Camera {camera_names[cam_keys[1]]}")
+    layout = layout or default_layout(len(cam_keys))
+    tables = get_panorama_tables(cam_keys) if layout == LAYOUT_PANORAMA else None
+    if layout == LAYOUT_PANORAMA and tables is None:
+        layout = default_layout(len(cam_keys))
+    logger.info(
+        f"Showing multiview ({layout}): "
+        f"{', '.join('Camera ' + camera_names[k] for k in cam_keys)}"
+    )
 
     # Ensure we have valid screen dimensions
     if SCREEN_WIDTH <= 0 or SCREEN_HEIGHT <= 0:
@@ -131,55 +384,57 @@ def show_multiview(cam_keys):
         SCREEN_WIDTH, SCREEN_HEIGHT = 1024, 600
 
     def display():
-        caps = []
+        global display_tiles
         for k in cam_keys:
             camera_stats[k]['start_time'] = datetime.now()
             camera_stats[k]['frames_read'] = 0
             camera_stats[k]['frames_failed'] = 0
-            
-            camera_name = camera_names[k]
-            camera_loggers[k].info(f"Opening camera {camera_name} at {camera_paths[k]}")
-            
-            try:
-                cap = cv2.VideoCapture(camera_paths[k], cv2.CAP_V4L2)
-                
-                if not cap.isOpened():
-                    camera_loggers[k].error(f"Failed to open camera {camera_name}")
-                    cap = None
-                else:
-                    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-                    cap.set(cv2.CAP_PROP_FPS, 30)
-                    camera_loggers[k].info(f"Successfully opened camera {camera_name}, FPS set to 30")
-                
-                caps.append(cap)
-            except Exception as e:
-                camera_loggers[k].error(f"Exception opening camera {camera_name}: {str(e)}")
-                caps.append(None)
+            camera_stats[k]['frames_stale'] = 0
 
-        # Create window with Raspberry Pi optimized settings
         window_name = 'Camera View'
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        
-        # Allow window system to initialize
-        time.sleep(0.5)
-        
-        # Force window to be positioned at 0,0 and set size explicitly
-        cv2.moveWindow(window_name, 0, 0)
-        cv2.resizeWindow(window_name, SCREEN_WIDTH, SCREEN_HEIGHT)
-        
-        # Set fullscreen 
-        cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-        
-        # Show initial black background while loading
-        black_bg = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), dtype=np.uint8)
-        cv2.imshow(window_name, black_bg)
-        cv2.waitKey(1)
-
-        # Calculate exact half width for each camera
-        half_width = SCREEN_WIDTH // 2
+        ensure_display_window()
+
+        # Tile ROIs come precompiled from the layout table; per-source-resolution
+        # geometry is cached inside the compositor.
+        if tables is not None:
+            # Stitched from the uncorrected, unzoomed frames the calibration was taken from
+            compositor = PanoramaCompositor(tables, buffers=display_buffers(), pool=tile_pool)
+            zoom_keys = []
+            display_tiles = None
+        else:
+            compositor = Compositor(
+                SCREEN_WIDTH, SCREEN_HEIGHT,
+                compile_layout(layout, SCREEN_WIDTH, SCREEN_HEIGHT, len(cam_keys)),
+                buffers=display_buffers(), pool=tile_pool, remap_cache=remap_cache
+            )
+            for i, k in enumerate(cam_keys):
+                compositor.set_transform(i, camera_transforms.get(k))
+                compositor.set_zoom(i, camera_zoom[k])
+            zoom_keys = cam_keys
+            display_tiles = (cam_keys, compositor.tiles)
+
+        # Each camera gets its own reader thread in the shared hub; the loop below only
+        # takes the newest frame from each slot so one slow camera can't stall the other tile.
+        # The largest tile size lets the hub decode MJPEG at reduced resolution when it can.
+        # Synchronized: the cameras are grabbed back-to-back so tiles show the same instant.
+        # A zoomed camera is captured at full resolution instead.
+        engine = frame_hub
+        subscribed_size = capture_size(compositor, zoom_keys)
+        subscription = engine.subscribe(cam_keys, subscribed_size, synchronized=True)
         
         # Stats logging interval (every 30 seconds)
         last_stats_log = time.time()
+        last_seqs = engine.seqs(cam_keys)
+        last_zooms = zoom_versions(zoom_keys)
+        # States the presented canvas was drawn for (None: nothing presented yet)
+        last_states = None
+        # Capture-time spread between the tiles of the latest composite, and worst since last stats log
+        tile_skew = 0.0
+        max_tile_skew = 0.0
+        display_latency.reset()
+        scheduler = RenderScheduler(RENDER_FPS)
+        presented = False
+        hud = Hud()
 
         while not stop_thread:
             # Log camera stats periodically
@@ -195,173 +450,110 @@ def show_multiview(cam_keys):
                     if total_frames > 0:
                         failure_rate = (camera_stats[k]['frames_failed'] / total_frames) * 100
                     
+                    open_latency = camera_stats[k]['open_latency']
+                    open_latency_str = f"{open_latency * 1000:.0f}ms" if open_latency is not None else "N/A"
+                    
                     stats_logger.info(
                         f"Camera {camera_names[k]} stats: "
                         f"Uptime={uptime}, "
                         f"Frames read={camera_stats[k]['frames_read']}, "
                         f"Frames failed={camera_stats[k]['frames_failed']}, "
+                        f"Frames stale={camera_stats[k]['frames_stale']}, "
                         f"Failure rate={failure_rate:.2f}%, "
+                        f"Open latency={open_latency_str}, "
+                        f"Capture allocs/frame={engine.allocation_counters[k].per_frame():.2f}, "
                         f"Time since last frame: {datetime.now() - camera_stats[k]['last_frame_time'] if camera_stats[k]['last_frame_time'] else 'N/A'}"
                     )
+                stats_logger.info(
+                    f"Compositor allocs/frame={compositor.allocations.per_frame():.2f}, "
+                    f"tiles drawn={compositor.tiles_drawn}, copied={compositor.tiles_copied}, "
+                    f"skipped={compositor.tiles_skipped}"
+                )
+                stats_logger.info(
+                    f"Tile skew: last={tile_skew * 1000:.1f}ms, max={max_tile_skew * 1000:.1f}ms"
+                )
+                max_tile_skew = 0.0
+                if display_latency.enabled:
+                    stats_logger.info(display_latency.report())
+                stats_logger.info(scheduler.report())
                 last_stats_log = current_time
             
-            # Create a fresh black background for each frame
-            background = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), dtype=np.uint8)
-            
-            for i, (cap, k) in enumerate(zip(caps, cam_keys)):
-                if cap is None:
-                    camera_loggers[k].error(f"Camera {camera_names[k]} is None, cannot read frame")
-                    camera_stats[k]['frames_failed'] += 1
-                    continue
-                    
+            # Wake at the render rate and only recomposite if a camera delivered something
+            # new, was panned/zoomed, or changed state (so its black/placeholder tile is
+            # drawn once, not on every tick while it stays away)
+            scheduler.wait_next_tick()
+            seqs = engine.seqs(cam_keys)
+            new_frame = seqs != last_seqs
+            last_seqs = seqs
+            zooms = zoom_versions(zoom_keys)
+            zoomed = zooms != last_zooms
+            last_zooms = zooms
+            states = camera_states(engine, cam_keys)
+            state_changed = states != last_states
+            last_states = states
+            if zoomed and capture_size(compositor, zoom_keys) != subscribed_size:
+                # Subscribe again before dropping the old one, so no camera stops in between
+                subscribed_size = capture_size(compositor, zoom_keys)
+                previous, subscription = subscription, engine.subscribe(cam_keys, subscribed_size, synchronized=True)
+                engine.unsubscribe(previous)
+            if not new_frame and not zoomed and not state_changed:
+                # Keep HighGUI's event loop serviced while the screen stays as it is
+                if poll_key() == ord('q'):
+                    break
+                continue
+
+            picked_up = time.monotonic()
+            compositor.begin_frame()
+            capture_times = []
+            for i, k in enumerate(cam_keys):
                 try:
-                    ret, frame = cap.read()
-                    
-                    if not ret:
-                        camera_stats[k]['frames_failed'] += 1
-                        camera_loggers[k].warning(f"Camera {camera_names[k]} failed to read frame")
-                        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+                    # Resize from the frame's shared pyramid so small tiles (PIP insets,
+                    # grid cells) start from a level close to their size.
+                    # A camera still opening leaves a black tile; a lost one shows a placeholder
+                    # while the hub reconnects it in the background
+                    # Tiles whose camera hasn't advanced since this canvas last showed it are skipped
+                    pyramid, seq, capture_time = engine.latest_pyramid(k)
+                    if pyramid is None and engine.camera_state(k) == STATE_RECONNECTING:
+                        compositor.place_placeholder(i, f"{camera_names[k]}: reconnecting...")
                     else:
-                        camera_stats[k]['frames_read'] += 1
-                        camera_stats[k]['last_frame_time'] = datetime.now()
-                        
-                        # Log occasional heartbeat for successful frames (every 300 frames ~10 seconds at 30fps)
-                        if camera_stats[k]['frames_read'] % 300 == 0:
-                            camera_loggers[k].info(
-                                f"Camera {camera_names[k]} heartbeat: "
-                                f"{camera_stats[k]['frames_read']} frames read, "
-                                f"{camera_stats[k]['frames_failed']} frames failed"
-                            )
-                    
-                    # Get original frame dimensions
-                    h, w = frame.shape[:2]
-                    
-                    # Calculate scaling factors to FILL exactly half screen width and full height
-                    scale_w = half_width / w
-                    scale_h = SCREEN_HEIGHT / h
-                    scale = max(scale_w, scale_h)  # Use max to fill entire area (will crop)
-                    
-                    # Calculate the dimensions after scaling
-                    scaled_w = int(w * scale)
-                    scaled_h = int(h * scale)
-                    
-                    # Resize frame to the larger size
-                    frame_resized = cv2.resize(frame, (scaled_w, scaled_h))
-                    
-                    # Calculate center crop to get exact dimensions
-                    # Find the center point
-                    center_x = scaled_w // 2
-                    center_y = scaled_h // 2
-                    
-                    # Calculate the crop boundaries for exact half width and full height
-                    crop_x_start = center_x - (half_width // 2)
-                    crop_y_start = center_y - (SCREEN_HEIGHT // 2)
-                    
-                    # Ensure crop boundaries are within the image
-                    crop_x_start = max(0, min(crop_x_start, scaled_w - half_width))
-                    crop_y_start = max(0, min(crop_y_start, scaled_h - SCREEN_HEIGHT))
-                    
-                    # Extract the correctly sized center portion
-                    crop_x_end = crop_x_start + half_width
-                    crop_y_end = crop_y_start + SCREEN_HEIGHT
-                    
-                    # Handle case where scaled image isn't big enough
-                    if crop_x_end > scaled_w:
-                        crop_x_end = scaled_w
-                    if crop_y_end > scaled_h:
-                        crop_y_end = scaled_h
-                    
-                    # Crop the frame to focus on center while filling view
-                    frame_cropped = frame_resized[crop_y_start:crop_y_end, crop_x_start:crop_x_end]
-                    
-                    # Handle case where cropped frame doesn't match required dimensions
-                    final_h, final_w = frame_cropped.shape[:2]
-                    if final_w != half_width or final_h != SCREEN_HEIGHT:
-                        # Create a black canvas of exactly the right size
-                        exact_size = np.zeros((SCREEN_HEIGHT, half_width, 3), dtype=np.uint8)
-                        # Place the cropped frame centered in the canvas
-                        y_offset = (SCREEN_HEIGHT - final_h) // 2
-                        x_offset = (half_width - final_w) // 2
-                        exact_size[y_offset:y_offset+final_h, x_offset:x_offset+final_w] = frame_cropped
-                        frame_cropped = exact_size
-                    
-                    # Place in the correct half of the screen
-                    x_start = i * half_width
-                    background[:, x_start:x_start+half_width] = frame_cropped
-
+                        compositor.place_pyramid(i, pyramid, seq)
+                    if capture_time is not None:
+                        capture_times.append(capture_time)
                 except Exception as e:
                     camera_loggers[k].error(f"Exception processing frame from {camera_names[k]}: {str(e)}")
                     camera_stats[k]['frames_failed'] += 1
-                    frame = np.zeros((480, 640, 3), dtype=np.uint8)
-                
-                # Get original frame dimensions
-                h, w = frame.shape[:2]
-                
-                # Calculate scaling factors to FILL exactly half screen width and full height
-                scale_w = half_width / w
-                scale_h = SCREEN_HEIGHT / h
-                scale = max(scale_w, scale_h)  # Use max to fill entire area (will crop)
-                
-                # Calculate the dimensions after scaling
-                scaled_w = int(w * scale)
-                scaled_h = int(h * scale)
-                
-                # Resize frame to the larger size
-                frame_resized = cv2.resize(frame, (scaled_w, scaled_h))
-                
-                # Calculate center crop to get exact dimensions
-                # Find the center point
-                center_x = scaled_w // 2
-                center_y = scaled_h // 2
-                
-                # Calculate the crop boundaries for exact half width and full height
-                crop_x_start = center_x - (half_width // 2)
-                crop_y_start = center_y - (SCREEN_HEIGHT // 2)
-                
-                # Ensure crop boundaries are within the image
-                crop_x_start = max(0, min(crop_x_start, scaled_w - half_width))
-                crop_y_start = max(0, min(crop_y_start, scaled_h - SCREEN_HEIGHT))
-                
-                # Extract the correctly sized center portion
-                crop_x_end = crop_x_start + half_width
-                crop_y_end = crop_y_start + SCREEN_HEIGHT
-                
-                # Handle case where scaled image isn't big enough
-                if crop_x_end > scaled_w:
-                    crop_x_end = scaled_w
-                if crop_y_end > scaled_h:
-                    crop_y_end = scaled_h
-                
-                # Crop the frame to focus on center while filling view
-                frame_cropped = frame_resized[crop_y_start:crop_y_end, crop_x_start:crop_x_end]
-                
-                # Handle case where cropped frame doesn't match required dimensions
-                final_h, final_w = frame_cropped.shape[:2]
-                if final_w != half_width or final_h != SCREEN_HEIGHT:
-                    # Create a black canvas of exactly the right size
-                    exact_size = np.zeros((SCREEN_HEIGHT, half_width, 3), dtype=np.uint8)
-                    # Place the cropped frame centered in the canvas
-                    y_offset = (SCREEN_HEIGHT - final_h) // 2
-                    x_offset = (half_width - final_w) // 2
-                    exact_size[y_offset:y_offset+final_h, x_offset:x_offset+final_w] = frame_cropped
-                    frame_cropped = exact_size
-                
-                # Place in the correct half of the screen
-                x_start = i * half_width
-                background[:, x_start:x_start+half_width] = frame_cropped
-
-            # Display the composite image with both camera feeds
-            cv2.imshow(window_name, background)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+                    compositor.place(i, None)
+            try:
+                # Join barrier: every tile is on the canvas before it is shown
+                compositor.finish_frame()
+            except Exception as e:
+                logger.error(f"Exception compositing tiles: {str(e)}")
+
+            if len(capture_times) > 1:
+                tile_skew = max(capture_times) - min(capture_times)
+                max_tile_skew = max(max_tile_skew, tile_skew)
+            composited = time.monotonic()
+
+            # Display the composite image with both camera feeds (the first frame of a
+            # layout is written whole, since the screen still shows the previous one).
+            # The HUD is blended in for the display only, then taken out again
+            update_hud(hud, cam_keys, compositor.tiles)
+            hud_rects = hud.draw(compositor.canvas)
+            key = present(window_name, compositor.canvas,
+                          compositor.dirty_rects() + hud_rects if presented else None)
+            hud.erase()
+            presented = True
+            scheduler.presented()
+            if new_frame and capture_times:
+                # waitKey is where HighGUI paints, so this is as close to the glass as we can see.
+                # Measured from the oldest tile, i.e. the stalest thing on screen.
+                display_latency.record_frame(min(capture_times), [
+                    ('queue', picked_up), ('composite', composited), ('display', time.monotonic()),
+                ])
+            if key == ord('q'):
                 break
 
-        for i, (cap, k) in enumerate(zip(caps, cam_keys)):
-            if cap:
-                try:
-                    cap.release()
-                    camera_loggers[k].info(f"Released camera {camera_names[k]}")
-                except Exception as e:
-                    camera_loggers[k].error(f"Error releasing camera {camera_names[k]}: {str(e)}")
+        engine.unsubscribe(subscription)
 
     return threading.Thread(target=display)
 
@@ -370,87 +562,117 @@ def show_single(cam_key):
     stop_thread = False
     
     print(f"🔎 Fullscreen view: Camera {cam_key}")
-    path = camera_paths[cam_key]
-    cap = cv2.VideoCapture(path)
-    if not cap.isOpened():
-        print(f"❌ Failed to open {path}")
-        return None
+    camera_stats[cam_key]['start_time'] = datetime.now()
 
     # Use the same window name as multiview for persistence
     window_name = 'Camera View'
-    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-    
-    # Show initial black background while loading
-    black_bg = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), dtype=np.uint8)
-    cv2.imshow(window_name, black_bg)
-    cv2.waitKey(1)
 
     def display():
+        global display_tiles
+        ensure_display_window()
+        compositor = Compositor(
+            SCREEN_WIDTH, SCREEN_HEIGHT,
+            compile_layout(LAYOUT_SINGLE, SCREEN_WIDTH, SCREEN_HEIGHT, 1),
+            buffers=display_buffers(), remap_cache=remap_cache
+        )
+        compositor.set_transform(0, camera_transforms.get(cam_key))
+        # The zoomed region is cropped from the frame before it is scaled to the screen
+        compositor.set_zoom(0, camera_zoom[cam_key])
+        display_tiles = ([cam_key], compositor.tiles)
+        subscribed_size = capture_size(compositor, [cam_key])
+        subscription = frame_hub.subscribe([cam_key], subscribed_size)
+        last_seqs = frame_hub.seqs([cam_key])
+        last_zooms = zoom_versions([cam_key])
+        last_states = None
+        last_stats_log = time.time()
+        display_latency.reset()
+        scheduler = RenderScheduler(RENDER_FPS)
+        presented = False
+        hud = Hud()
+
         while not stop_thread:
-            ret, frame = cap.read()
-            if not ret:
-                time.sleep(0.1)
+            # Log display stats periodically (every 30 seconds, as in multiview)
+            current_time = time.time()
+            if current_time - last_stats_log > 30:
+                if display_latency.enabled:
+                    stats_logger.info(display_latency.report())
+                stats_logger.info(scheduler.report())
+                last_stats_log = current_time
+
+            scheduler.wait_next_tick()
+            seqs = frame_hub.seqs([cam_key])
+            new_frame = seqs != last_seqs
+            last_seqs = seqs
+            zooms = zoom_versions([cam_key])
+            zoomed = zooms != last_zooms
+            last_zooms = zooms
+            states = camera_states(frame_hub, [cam_key])
+            state_changed = states != last_states
+            last_states = states
+            if zoomed and capture_size(compositor, [cam_key]) != subscribed_size:
+                subscribed_size = capture_size(compositor, [cam_key])
+                previous, subscription = subscription, frame_hub.subscribe([cam_key], subscribed_size)
+                frame_hub.unsubscribe(previous)
+            pyramid, seq, capture_time = frame_hub.latest_pyramid(cam_key)
+            if not new_frame and not zoomed and not state_changed:
+                if poll_key() == ord('q'):
+                    break
                 continue
             
-            # Get original frame dimensions
-            h, w = frame.shape[:2]
-            
-            # Calculate scaling factors - use full screen dimensions
-            scale_w = SCREEN_WIDTH / w
-            scale_h = SCREEN_HEIGHT / h
-            scale = min(scale_w, scale_h)  # Maintain aspect ratio
-            
-            # Calculate new dimensions
-            new_w = int(w * scale)
-            new_h = int(h * scale)
-            
-            # Resize the frame
-            frame = cv2.resize(frame, (new_w, new_h))
-            
-            # Create a black background image with screen dimensions
-            background = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), dtype=np.uint8)
-            
-            # Calculate centering offsets
-            x_offset = (SCREEN_WIDTH - new_w) // 2
-            y_offset = (SCREEN_HEIGHT - new_h) // 2
-            
-            # Place the frame on the black background
-            background[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = frame
+            # Scale to fit the screen (aspect ratio kept, letterboxed in black)
+            picked_up = time.monotonic()
+            compositor.begin_frame()
+            if pyramid is None:
+                compositor.place_placeholder(0, f"{camera_names[cam_key]}: reconnecting...")
+            else:
+                compositor.place_pyramid(0, pyramid, seq)
+            compositor.finish_frame()
+            composited = time.monotonic()
             
             # Display the result
-            cv2.imshow(window_name, background)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            update_hud(hud, [cam_key], compositor.tiles)
+            hud_rects = hud.draw(compositor.canvas)
+            key = present(window_name, compositor.canvas,
+                          compositor.dirty_rects() + hud_rects if presented else None)
+            hud.erase()
+            presented = True
+            scheduler.presented()
+            if new_frame and pyramid is not None:
+                # Same stages as multiview, from the frame's capture to after waitKey painted it
+                display_latency.record_frame(capture_time, [
+                    ('queue', picked_up), ('composite', composited), ('display', time.monotonic()),
+                ])
+            if key == ord('q'):
                 break
                 
-        cap.release()
+        frame_hub.unsubscribe(subscription)
 
     return threading.Thread(target=display)
 
-def switch_mode(mode, cam_keys=None):
-    global current_mode, current_cam_keys, stop_thread, display_thread
+def switch_mode(mode, cam_keys=None, layout=None):
+    global current_mode, current_cam_keys, current_layout, stop_thread, display_thread
+
+    logger.info(
+        f"Switching mode to: {mode}"
+        f"{' with cameras ' + ','.join([camera_names[k] for k in cam_keys]) if cam_keys else ''}"
+        f"{' in layout ' + layout if layout else ''}"
+    )
 
-    logger.info(f"Switching mode to: {mode}{' with cameras ' + ','.join([camera_names[k] for k in cam_keys]) if cam_keys else ''}")
+    switch_started = time.monotonic()
 
-    # Mark old thread for stopping but don't destroy window
+    # Mark old thread for stopping but don't destroy window. The cameras stay open
+    # in the warm pool, so the old frame stays up until the new thread draws over it.
     stop_thread = True
     if display_thread and display_thread.is_alive():
-        # Show a black frame before switching
-        black_bg = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), dtype=np.uint8)
-        cv2.namedWindow('Camera View', cv2.WINDOW_NORMAL)
-        cv2.setWindowProperty('Camera View', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-        cv2.imshow('Camera View', black_bg)
-        cv2.waitKey(1)
-        
-        # Now wait for thread to finish
         display_thread.join()
         logger.info("Previous display thread terminated")
 
     current_mode = mode
     current_cam_keys = cam_keys if mode == 'multi' else None
+    current_layout = (layout or default_layout(len(cam_keys))) if mode == 'multi' else LAYOUT_SINGLE
 
     if mode == 'multi':
-        display_thread = show_multiview(cam_keys)
+        display_thread = show_multiview(cam_keys, current_layout)
     elif mode in ['1', '2', '3']:
         display_thread = show_single(mode)
     else:
@@ -458,23 +680,10 @@ def switch_mode(mode, cam_keys=None):
         return
 
     display_thread.start()
-    logger.info(f"New display thread started for mode: {mode}")
-
-
-def show_hotspot_message():
-    """Show a message on the Pi display indicating cameras are accessible via web."""
-    window_name = 'Camera View'
-    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-    background = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 3), dtype=np.uint8)
-    text = "Camera accessible via web interface"
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    text_size = cv2.getTextSize(text, font, 0.7, 2)[0]
-    text_x = (SCREEN_WIDTH - text_size[0]) // 2
-    text_y = (SCREEN_HEIGHT + text_size[1]) // 2
-    cv2.putText(background, text, (text_x, text_y), font, 0.7, (255, 255, 255), 2)
-    cv2.imshow(window_name, background)
-    cv2.waitKey(1)
+    logger.info(
+        f"New display thread started for mode: {mode} "
+        f"(switch took {(time.monotonic() - switch_started) * 1000:.0f} ms)"
+    )
 
 
 ##### FAN SECTION #####
@@ -495,6 +704,9 @@ DUTY_33  = 0x5555  # 33%
 DUTY_66  = 0xAAAA  # 66%
 DUTY_100 = 0xFFFF  # 100%
 
+# Last duty set per fan channel (percent), for the HUD; reading it back from the PCA9685 means an I2C transfer
+fan_percent = {0: 0, 1: 0, 2: 0}
+
 # Map keys to (fan channel, duty cycle)
 duty_lookup = {
     # Fan 1 (PCA channel 0)
@@ -530,12 +742,25 @@ def on_press(key):
                 fans[fan_index].duty_cycle = duty
                 fan_name = f"Fan {fan_index+1}"
                 percent = int((duty / 0xFFFF) * 100)
+                fan_percent[fan_index] = percent
                 print(f"[KEY '{c.upper()}'] → {fan_name} speed set to {percent}%")
 
             # Fullscreen camera mode
             elif c in ['1', '2', '3'] and current_mode != 'multi_select':
                 switch_mode(c)
 
+            # Stitched panorama of the overlapping rear cameras
+            elif c == 'p' and current_mode != 'multi_select':
+                switch_mode('multi', PANORAMA_CAMERAS, LAYOUT_PANORAMA)
+
+            # All three cameras at once
+            elif c == '4' and current_mode != 'multi_select':
+                switch_mode('multi', ['1', '2', '3'])
+
+            # Cycle the multiview layout (e.g. 2-up -> PIP, 3-up -> 2x2 -> PIP)
+            elif c == 'l' and current_mode == 'multi':
+                switch_mode('multi', current_cam_keys, next_layout(current_layout, len(current_cam_keys)))
+
             # Enter multi-select mode
             elif c == '0':
                 print("📺 Entering multi-select mode: Press 2 camera numbers (1-3)")
@@ -564,21 +789,43 @@ def on_release(key):
         global stop_thread
         stop_thread = True
         if display_thread and display_thread.is_alive():
-            display_thread.join()
+            display_thread.join(timeout=DISPLAY_THREAD_SHUTDOWN_TIMEOUT)
+        frame_hub.stop()
+        if tile_pool is not None:
+            tile_pool.shutdown()
+        if framebuffer is not None:
+            framebuffer.close()
         return False  # This stops the keyboard listener
 
 ##### MAIN ENTRY POINT #####
 def main():
     logger.info("Camera system starting up")
-    logger.info("Hotkeys: 1/2/3 = Fullscreen view, 0 + two cameras = Multiview, A/S/D/F/G/H = Fan speed, ESC = Quit")
+    logger.info("Hotkeys: 1/2/3 = Fullscreen view, 0 + two cameras = Multiview, 4 = All cameras, L = Cycle layout, P = Panorama, A/S/D/F/G/H = Fan speed, ESC = Quit")
+    logger.info("Touch: drag = Pan, wheel = Zoom, double tap = Zoom in/out (pinch in the web UI)")
+
+    # Open every camera in parallel and keep them streaming for the life of the
+    # process, so later mode switches never reopen a device. The (0, 0) tile size
+    # lets cameras nobody is watching decode at the smallest scale, while the
+    # capture mode stays big enough for a full-screen view so switching to one
+    # doesn't renegotiate (and reopen) the camera.
+    frame_hub.subscribe(list(camera_paths), tile_size=(0, 0),
+                        min_capture_size=(SCREEN_WIDTH, SCREEN_HEIGHT))
+    if not frame_hub.wait_until_streaming(list(camera_paths), CAMERA_WARMUP_TIMEOUT):
+        logger.warning("Not every camera delivered a frame during warm-up")
+    for k, latency in frame_hub.open_latencies().items():
+        if latency is None:
+            logger.warning(f"Camera {camera_names[k]} open latency: not streaming")
+        else:
+            logger.info(f"Camera {camera_names[k]} open latency: {latency * 1000:.0f} ms")
 
     # Auto-start in multiview mode with Cameras 3 and 1
     logger.info("Auto-starting in multiview mode with Brevity and Rowley cameras")
     switch_mode('multi', ['3', '1'])
     
     # Set up OpenCV window - keep this part
-    cv2.namedWindow('Camera View', cv2.WINDOW_NORMAL)
-    cv2.setWindowProperty('Camera View', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    if DISPLAY_SINK == DISPLAY_SINK_OPENCV:
+        cv2.namedWindow('Camera View', cv2.WINDOW_NORMAL)
+        cv2.setWindowProperty('Camera View', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
     
     # Create a keyboard controller for the UI to send keypresses
     kb_controller = keyboard.Controller()
@@ -592,38 +839,22 @@ def main():
         kb_controller.press(key)
         kb_controller.release(key)
 
-    # Callback: stop the local display thread (so cameras can be used by Flask stream)
-    def stop_display():
-        global stop_thread, display_thread
-        stop_thread = True
-        if display_thread and display_thread.is_alive():
-            display_thread.join(timeout=DISPLAY_THREAD_SHUTDOWN_TIMEOUT)
-        logger.info("Local display stopped for hotspot mode")
-
-    # Callback: resume the local display using the last active mode
-    def resume_display():
-        global current_mode, current_cam_keys
-        mode = current_mode
-        keys = current_cam_keys
-        if mode:
-            logger.info(f"Resuming local display in mode: {mode}")
-            switch_mode(mode, keys)
-
     # Function for RemoteServer to query the current display state
     def get_display_state():
-        return {'mode': current_mode, 'cam_keys': current_cam_keys}
+        return {'mode': current_mode, 'cam_keys': current_cam_keys, 'layout': current_layout}
     
     # Start the UI overlay thread
+    global ui_overlay
     ui = UIOverlay(
         send_camera=send_camera,
         send_fan=send_fan,
         camera_paths=camera_paths,
-        stop_display_fn=stop_display,
-        resume_display_fn=resume_display,
-        show_hotspot_msg_fn=show_hotspot_message,
+        frame_hub=frame_hub,
         get_display_state_fn=get_display_state,
+        zoom_states=camera_zoom,
     )
     ui.start()
+    ui_overlay = ui
     
     # Continue with keyboard listener
     with keyboard.Listener(on_press=on_press, on_release=on_release) as listener:
@@ -344,7 +344,8 @@ class OverlayMenu:
 class UIOverlay(threading.Thread):
     def __init__(self, send_camera, send_fan, camera_paths=None,
                  stop_display_fn=None, resume_display_fn=None,
-                 show_hotspot_msg_fn=None, get_display_state_fn=None):
+                 show_hotspot_msg_fn=None, get_display_state_fn=None,
+                 frame_hub=None, zoom_states=None):
         super().__init__(daemon=True)
         self.send_camera = send_camera
         self.send_fan = send_fan
@@ -375,6 +376,8 @@ class UIOverlay(threading.Thread):
             stop_display_fn=stop_display_fn,
             resume_display_fn=resume_display_fn,
             get_display_state_fn=get_display_state_fn,
+            frame_hub=frame_hub,
+            zoom_states=zoom_states,
         )
 
     # Original send_fan wrapper to track states
@@ -581,7 +584,9 @@ class UIOverlay(threading.Thread):
             ('Rowley', lambda: self._update_camera_state('1')),
             ('Glow', lambda: self._update_camera_state('2')),
             ('Brevity', lambda: self._update_camera_state('3')),
-            ('Multi', lambda: self._update_camera_state('0'))
+            ('Multi', lambda: self._update_camera_state('0')),
+            ('All', lambda: self._update_camera_state('4')),
+            ('Layout', lambda: self.send_camera('l'))
         ], title="Select Camera")
         
         # Highlight the active camera if one is set
@@ -874,7 +879,8 @@ class UIOverlay(threading.Thread):
             '1': 'Rowley',
             '2': 'Glow',
             '3': 'Brevity',
-            '0': 'Multi'  # Multi-view mode
+            '0': 'Multi',  # Multi-view mode
+            '4': 'All'     # All cameras at once
         }
         
         # Update active camera state
@@ -2,13 +2,11 @@ import cv2
 import numpy as np
 import threading
 from pynput import keyboard
-import time
 from board import SCL, SDA
 import busio
 from adafruit_pca9685 import PCA9685
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
 import os
 
 ##### CAMERA SECTION #####
@@ -34,6 +32,86 @@ def get_screen_resolution():
 # Use a global variable to store screen dimensions
 SCREEN_WIDTH, SCREEN_HEIGHT = get_screen_resolution()
 
+# How often (ms) the Tk loop checks the capture threads for new frames
+TK_FRAME_INTERVAL = 1000 // 30
+
+##### TK FRAME PATH #####
+class PPMFrame:
+    """Converts BGR frames to binary PPM bytes (what tk.PhotoImage reads natively).
+
+    The header and pixels live in one preallocated buffer: the frame is
+    resized and converted to RGB straight into it, so each frame costs one
+    resize, one cvtColor and one copy out to an immutable ``bytes``.
+    """
+
+    def __init__(self):
+        self._size = None
+        self._buffer = None
+        self._pixels = None
+        self._resized = None
+
+    def _allocate(self, width, height):
+        header = f"P6\n{width} {height}\n255\n".encode('ascii')
+        self._buffer = bytearray(len(header) + width * height * 3)
+        self._buffer[:len(header)] = header
+        self._pixels = np.frombuffer(self._buffer, dtype=np.uint8, offset=len(header)).reshape(height, width, 3)
+        self._resized = np.empty((height, width, 3), dtype=np.uint8)
+        self._size = (width, height)
+
+    def convert(self, frame, width, height):
+        """Return ``frame`` scaled to ``width`` x ``height`` as PPM bytes."""
+        if self._size != (width, height):
+            self._allocate(width, height)
+        if frame.shape[1::-1] == (width, height):
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._pixels)
+        else:
+            cv2.resize(frame, (width, height), dst=self._resized)
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._pixels)
+        return bytes(self._buffer)
+
+
+class CaptureThread(threading.Thread):
+    """Reads one camera and keeps its newest frame ready as PPM bytes.
+
+    The blocking ``read()`` and the conversion happen here, off the Tk
+    thread; the UI only picks up ``latest()`` when ``seq`` has moved on.
+    """
+
+    def __init__(self, path, target_size_fn):
+        super().__init__(daemon=True)
+        self.path = path
+        self._target_size_fn = target_size_fn
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._ppm = None
+        self.seq = 0
+        self.cap = cv2.VideoCapture(path, cv2.CAP_V4L2)
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        self.cap.set(cv2.CAP_PROP_FPS, 30)
+        # Only ever the newest frame, never a queue of old ones
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def run(self):
+        converter = PPMFrame()
+        while not self._stop_event.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                self._stop_event.wait(0.1)
+                continue
+            ppm = converter.convert(frame, *self._target_size_fn(frame.shape[1], frame.shape[0]))
+            with self._lock:
+                self._ppm = ppm
+                self.seq += 1
+        self.cap.release()
+
+    def latest(self):
+        """Return ``(ppm bytes, seq)`` of the newest frame (``(None, 0)`` before the first)."""
+        with self._lock:
+            return self._ppm, self.seq
+
+    def stop(self):
+        self._stop_event.set()
+
 ##### UI SECTION #####
 class CameraUI(tk.Tk):
     def __init__(self):
@@ -50,8 +128,12 @@ class CameraUI(tk.Tk):
         self.current_mode = None
         self.multiview_selection = []
         self.is_multiview_select_mode = False
-        self.camera_caps = {}
-        self.photo_images = {}  # Keep references to avoid garbage collection
+        self.camera_threads = {}
+        # One PhotoImage per view, updated in place; also keeps Tk from garbage collecting it
+        self.photo_images = {}
+        self.shown_seqs = {}
+        self.active_cameras = []
+        self.update_job = None
         
         # Create UI elements
         self.create_widgets()
@@ -67,6 +149,7 @@ class CameraUI(tk.Tk):
         
         # Create camera views (initially hidden)
         self.single_view = tk.Label(self.camera_frame, bg="black")
+        self.attach_photo(self.single_view)
         self.single_view.pack(expand=True, fill="both")
         self.single_view.pack_forget()
         
@@ -74,6 +157,8 @@ class CameraUI(tk.Tk):
         self.multi_view_frame = tk.Frame(self.camera_frame, bg="black")
         self.left_view = tk.Label(self.multi_view_frame, bg="black")
         self.right_view = tk.Label(self.multi_view_frame, bg="black")
+        self.attach_photo(self.left_view)
+        self.attach_photo(self.right_view)
         self.left_view.pack(side="left", expand=True, fill="both")
         self.right_view.pack(side="left", expand=True, fill="both")
         self.multi_view_frame.pack(expand=True, fill="both")
@@ -193,43 +278,35 @@ class CameraUI(tk.Tk):
         self.multiview_prompt.place(relx=0.5, rely=0.5, anchor="center")
         print("📺 Select two cameras for multiview")
     
+    def attach_photo(self, view):
+        """Give ``view`` the PhotoImage it keeps for good; frames are loaded into it in place."""
+        photo = tk.PhotoImage(master=self)
+        view.configure(image=photo)
+        self.photo_images[view] = photo
+
     def update_camera_view(self):
-        """Update camera view with latest frame"""
+        """Show any new frames the capture threads have converted since the last call"""
         try:
             if self.current_mode == 'multi':
-                # Update both views for multiview
-                for i, cam_key in enumerate(self.active_cameras):
-                    ret, frame = self.camera_caps[cam_key].read()
-                    if ret:
-                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        frame = self.resize_frame(frame, is_multiview=True)
-                        self.photo_images[cam_key] = ImageTk.PhotoImage(image=Image.fromarray(frame))
-                        if i == 0:
-                            self.left_view.configure(image=self.photo_images[cam_key])
-                        else:
-                            self.right_view.configure(image=self.photo_images[cam_key])
-            
+                views = [self.left_view, self.right_view]
             elif self.current_mode in ['1', '2', '3']:
-                # Update single view
-                cam_key = self.current_mode
-                ret, frame = self.camera_caps[cam_key].read()
-                if ret:
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frame = self.resize_frame(frame, is_multiview=False)
-                    self.photo_images[cam_key] = ImageTk.PhotoImage(image=Image.fromarray(frame))
-                    self.single_view.configure(image=self.photo_images[cam_key])
-            
-            # Continue update loop if not stopped
-            if not stop_thread:
-                self.after(30, self.update_camera_view)
-                
+                views = [self.single_view]
+            else:
+                views = []
+            for view, cam_key in zip(views, self.active_cameras):
+                ppm, seq = self.camera_threads[cam_key].latest()
+                if ppm is not None and seq != self.shown_seqs.get(cam_key):
+                    self.photo_images[view].configure(data=ppm, format='PPM')
+                    self.shown_seqs[cam_key] = seq
         except Exception as e:
             print(f"Camera update error: {e}")
-            self.after(100, self.update_camera_view)
-    
-    def resize_frame(self, frame, is_multiview=False):
-        """Resize the frame for display"""
-        h, w = frame.shape[:2]
+
+        # Continue update loop if not stopped
+        if not stop_thread:
+            self.update_job = self.after(TK_FRAME_INTERVAL, self.update_camera_view)
+
+    def display_size(self, w, h, is_multiview=False):
+        """Size (w, h) a ``w`` x ``h`` frame is shown at"""
         target_height = SCREEN_HEIGHT // 3 * 2  # Use 2/3 of screen height
         
         if is_multiview:
@@ -244,27 +321,18 @@ class CameraUI(tk.Tk):
         scale = min(scale_w, scale_h)  # Maintain aspect ratio
         
         # Calculate new dimensions
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-        
-        # Resize the frame
-        return cv2.resize(frame, (new_w, new_h))
+        return int(w * scale), int(h * scale)
     
     def switch_mode(self, mode, cam_keys=None):
         """Switch between camera modes"""
-        global stop_thread
-        
-        # Stop existing camera threads
-        stop_thread = True
-        time.sleep(0.2)
-        stop_thread = False
-        
-        # Close existing camera captures
-        for cap in self.camera_caps.values():
-            cap.release()
-        self.camera_caps.clear()
+        # Stop the update loop and the existing camera threads
+        if self.update_job is not None:
+            self.after_cancel(self.update_job)
+            self.update_job = None
+        self.stop_cameras()
         
         self.current_mode = mode
+        self.shown_seqs.clear()
         
         # Hide all views
         self.single_view.pack_forget()
@@ -274,19 +342,16 @@ class CameraUI(tk.Tk):
             self.active_cameras = cam_keys
             # Open the selected cameras
             for cam_key in cam_keys:
-                self.camera_caps[cam_key] = cv2.VideoCapture(camera_paths[cam_key], cv2.CAP_V4L2)
-                self.camera_caps[cam_key].set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-                self.camera_caps[cam_key].set(cv2.CAP_PROP_FPS, 30)
+                self.start_camera(cam_key, is_multiview=True)
             
             # Show multiview frame
             self.multi_view_frame.pack(expand=True, fill="both")
             print(f"📷 Showing multiview: Camera {cam_keys[0]} and Camera {cam_keys[1]}")
             
         elif mode in ['1', '2', '3']:
+            self.active_cameras = [mode]
             # Open the selected camera
-            self.camera_caps[mode] = cv2.VideoCapture(camera_paths[mode], cv2.CAP_V4L2)
-            self.camera_caps[mode].set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-            self.camera_caps[mode].set(cv2.CAP_PROP_FPS, 30)
+            self.start_camera(mode, is_multiview=False)
             
             # Show single view
             self.single_view.pack(expand=True, fill="both")
@@ -294,6 +359,20 @@ class CameraUI(tk.Tk):
         
         # Start the update loop
         self.update_camera_view()
+
+    def start_camera(self, cam_key, is_multiview):
+        thread = CaptureThread(
+            camera_paths[cam_key], lambda w, h: self.display_size(w, h, is_multiview)
+        )
+        self.camera_threads[cam_key] = thread
+        thread.start()
+
+    def stop_cameras(self):
+        for thread in self.camera_threads.values():
+            thread.stop()
+        for thread in self.camera_threads.values():
+            thread.join(timeout=2)
+        self.camera_threads.clear()
     
     def handle_key(self, event):
         """Handle keyboard shortcuts"""
@@ -333,8 +412,7 @@ class CameraUI(tk.Tk):
         stop_thread = True
         
         # Stop all camera captures
-        for cap in self.camera_caps.values():
-            cap.release()
+        self.stop_cameras()
             
         # Turn off fan
         fan.duty_cycle = 0x0000
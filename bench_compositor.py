@@ -0,0 +1,73 @@
+import argparse
+import time
+import cv2
+import numpy as np
+from compositor import POOL_MIN_PIXELS, Compositor
+from frame_pyramid import FramePyramid
+from layouts import LAYOUT_2UP, LAYOUT_3UP, compile_layout
+from tile_pool import TILE_POOL_WORKERS, TilePool, usable_cpus
+
+
+def make_frames(count, width, height):
+    """Noisy test frames, so resizes can't take any shortcuts on flat input."""
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def time_layout(layout, frames, screen, pool, iterations, pool_min_pixels=0):
+    """Mean milliseconds per composite, every tile redrawn from a fresh pyramid each frame."""
+    compositor = Compositor(screen[0], screen[1], compile_layout(layout, *screen, len(frames)), pool=pool,
+                            pool_min_pixels=pool_min_pixels)
+    stores = [{} for _ in frames]
+
+    def composite():
+        compositor.begin_frame()
+        for i, frame in enumerate(frames):
+            compositor.place_pyramid(i, FramePyramid(frame, stores[i]))
+        compositor.finish_frame()
+
+    composite()  # warm up: geometry caches, pyramid stores, pool threads
+    start = time.perf_counter()
+    for _ in range(iterations):
+        composite()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare serial and thread-pool tile compositing for the 2-up and 3-up layouts."
+    )
+    parser.add_argument('--workers', type=int, default=TILE_POOL_WORKERS, help="tile pool worker threads")
+    parser.add_argument('--cpus', metavar='N,N,...', help="pin tile workers to these CPUs")
+    parser.add_argument('--source', metavar='WxH', default='1280x720', help="camera frame size")
+    parser.add_argument('--screen', metavar='WxH', default='1024x600', help="output canvas size")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--cv-threads', type=int,
+                        help="cv2.setNumThreads() value; OpenCV's own threading competes with the pool")
+    args = parser.parse_args()
+
+    source = tuple(int(v) for v in args.source.split('x'))
+    screen = tuple(int(v) for v in args.screen.split('x'))
+    cpus = [int(c) for c in args.cpus.split(',')] if args.cpus else None
+    if args.cv_threads is not None:
+        cv2.setNumThreads(args.cv_threads)
+
+    pool = TilePool(args.workers, cpus)
+    print(f"{args.source} -> {args.screen}, {args.workers} workers"
+          f"{' on CPUs ' + args.cpus if cpus else ''}, {usable_cpus(cpus)} usable CPUs, "
+          f"OpenCV threads={cv2.getNumThreads()}")
+    try:
+        for layout, count in ((LAYOUT_2UP, 2), (LAYOUT_3UP, 3)):
+            frames = make_frames(count, *source)
+            serial = time_layout(layout, frames, screen, None, args.iterations)
+            pooled = time_layout(layout, frames, screen, pool, args.iterations)
+            # As Main uses it: small frames stay on the display thread
+            auto = time_layout(layout, frames, screen, pool, args.iterations, POOL_MIN_PIXELS)
+            print(f"  {layout}: serial {serial:.2f}ms, pool {pooled:.2f}ms ({serial / pooled:.2f}x), "
+                  f"pool above {POOL_MIN_PIXELS} px {auto:.2f}ms ({serial / auto:.2f}x)")
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
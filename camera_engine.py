@@ -0,0 +1,1001 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from functools import partial
+import cv2
+from frame_buffers import AllocationCounter, BufferRing, CAPTURE_BUFFER_COUNT
+from frame_pyramid import FramePyramid
+from camera_probe import choose_mode
+from usb_budget import format_plan, plan_bandwidth
+from device_watch import DeviceWatcher
+from v4l2_capture import V4L2Capture
+from mjpeg import decode_reduced, is_raw_jpeg, merge_required_sizes, pick_reduction
+
+# ---- Capture Settings ----
+
+CAPTURE_FOURCC = 'MJPG'
+CAPTURE_FPS = 30
+# Capture backends: OpenCV's VideoCapture, or the pure-Python mmap V4L2
+# backend in v4l2_capture.py that hands out driver buffers without copying.
+BACKEND_OPENCV = 'opencv'
+BACKEND_V4L2 = 'v4l2'
+CAPTURE_BACKEND = BACKEND_OPENCV
+# Pause (seconds) after a failed read so a stalled camera doesn't spin a core.
+READ_FAIL_BACKOFF = 0.05
+# Timeout (seconds) when waiting for a reader thread to exit.
+READER_SHUTDOWN_TIMEOUT = 2
+# Log a heartbeat every N successful frames (~10 seconds at 30fps).
+HEARTBEAT_INTERVAL = 300
+# How long (seconds) a smaller negotiated mode must stay sufficient before the
+# camera is reopened at it; switching up to a bigger mode happens right away.
+MODE_DOWNGRADE_DELAY = 5
+# Longest a synchronized reader waits (seconds) for the rest of its group
+# before the group is considered broken and cameras read independently.
+SYNC_GRAB_TIMEOUT = 0.25
+# How long (seconds) a broken sync group, or a member that was too slow for
+# it, waits before trying again.
+SYNC_RETRY_INTERVAL = 2.0
+# Longest one group grab may take (seconds); members it hasn't reached by then
+# grab on their own for that frame.
+SYNC_GRAB_BUDGET = 0.05
+# A member whose grab in the group took longer than this (seconds, 1.5 frames
+# at 30fps) is running slower than the others and sits out for a while.
+SYNC_SLOW_GRAB = 0.05
+# Members whose nominal frame rate is lower than the fastest member's by more
+# than this factor grab independently instead of pacing the group.
+SYNC_MAX_RATE_RATIO = 1.25
+# Weight of the newest frame in the smoothed fps and read latency (per-frame
+# exponential moving average; 0.1 settles within a second or so at 30fps).
+RATE_SMOOTHING = 0.1
+# Kernel buffer timestamps older than this (seconds) at grab time are
+# assumed to be on another clock and replaced by the grab time.
+MAX_KERNEL_TIMESTAMP_AGE = 1.0
+# Low-latency mode: driver queue depth, how old (in frame intervals at the
+# negotiated rate) a grabbed frame may be before it counts as stale on backends
+# that can't tell whether another frame is queued, and how many stale frames
+# one grab may skip.
+LOW_LATENCY_BUFFERSIZE = 1
+STALE_FRAME_INTERVALS = 1.5
+MAX_STALE_DRAIN = 4
+# Consecutive failed reads (~1.5 s with READ_FAIL_BACKOFF) before a camera
+# is treated as lost and reopened.
+LOST_AFTER_FAILURES = 30
+# Reconnect backoff (seconds): starts at the minimum and doubles per failed
+# open up to the maximum. A device reappearing cuts the wait short.
+RECONNECT_BACKOFF_MIN = 0.5
+RECONNECT_BACKOFF_MAX = 30
+
+# Reader states, as reported by CameraReader.state / CaptureEngine.camera_state()
+STATE_CONNECTING = 'connecting'      # first open in progress
+STATE_STREAMING = 'streaming'        # open and delivering frames
+STATE_RECONNECTING = 'reconnecting'  # lost or failed to open; retrying with backoff
+STATE_STOPPED = 'stopped'
+
+logger = logging.getLogger("CaptureEngine")
+
+
+def open_capture(path, fourcc=CAPTURE_FOURCC, fps=CAPTURE_FPS, size=None, buffersize=None,
+                 backend=None):
+    """Open a V4L2 camera at ``path`` and request the given format, frame rate and (w, h) size.
+
+    ``buffersize`` limits how many frames the driver queues (None = driver default).
+    ``backend`` is ``BACKEND_OPENCV`` or ``BACKEND_V4L2`` (default ``CAPTURE_BACKEND``).
+    """
+    if (backend or CAPTURE_BACKEND) == BACKEND_V4L2:
+        cap = V4L2Capture(path)
+    else:
+        cap = cv2.VideoCapture(path, cv2.CAP_V4L2)
+    if cap.isOpened():
+        if buffersize is not None:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, buffersize)
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if size is not None:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        cap.set(cv2.CAP_PROP_FPS, fps)
+    return cap
+
+
+# ---- Latest-Frame Slot ----
+
+class FrameSlot:
+    """Holds the newest frame from one camera.
+
+    The reader thread overwrites the slot on every frame; consumers take
+    whatever is newest without blocking on the camera. ``seq`` increases by
+    one per published frame so consumers can tell whether anything changed.
+    Published frames are shared between consumers and must be treated as
+    read-only. They live in the reader's buffer ring and are recycled after a
+    few frames, so a consumer that needs a frame for longer must copy it.
+
+    Each published frame also gets a ``FramePyramid`` so consumers that want
+    a smaller copy share one lazily built set of downscaled levels, and, when
+    the reader is pulling raw MJPEG, the camera's own compressed bytes.
+    """
+
+    def __init__(self, update_cond=None, alloc_counter=None):
+        self._lock = threading.Lock()
+        self._update_cond = update_cond
+        self._alloc_counter = alloc_counter
+        self._frame = None
+        self._pyramid = None
+        self._jpeg = None
+        self._seq = 0
+        self._timestamp = None
+        # Pyramid level buffers, recycled in step with the capture buffer ring
+        self._level_stores = [{} for _ in range(CAPTURE_BUFFER_COUNT)]
+        self._store_index = 0
+
+    def publish(self, frame, timestamp=None, jpeg=None):
+        """Store ``frame`` (and its source ``jpeg`` bytes, if any) as the newest frame and wake consumers."""
+        self._store_index = (self._store_index + 1) % len(self._level_stores)
+        pyramid = FramePyramid(frame, self._level_stores[self._store_index], self._alloc_counter)
+        with self._lock:
+            self._frame = frame
+            self._pyramid = pyramid
+            self._jpeg = jpeg
+            self._seq += 1
+            self._timestamp = timestamp if timestamp is not None else time.monotonic()
+        if self._update_cond is not None:
+            with self._update_cond:
+                self._update_cond.notify_all()
+
+    def clear(self):
+        """Drop the held frame (e.g. when the camera closes) without resetting ``seq``."""
+        with self._lock:
+            self._frame = None
+            self._pyramid = None
+            self._jpeg = None
+            self._timestamp = None
+
+    def latest(self):
+        """Return ``(frame, seq, timestamp)``; ``frame`` is None until the first publish."""
+        with self._lock:
+            return self._frame, self._seq, self._timestamp
+
+    def latest_pyramid(self):
+        """Return ``(pyramid, seq, timestamp)``; ``pyramid`` is None until the first publish."""
+        with self._lock:
+            return self._pyramid, self._seq, self._timestamp
+
+    def latest_jpeg(self):
+        """Return ``(jpeg, seq, timestamp)``; ``jpeg`` is the camera's raw MJPEG frame or None."""
+        with self._lock:
+            return self._jpeg, self._seq, self._timestamp
+
+    @property
+    def seq(self):
+        with self._lock:
+            return self._seq
+
+
+# ---- Per-Camera Reader ----
+
+class CameraReader(threading.Thread):
+    """Background thread that owns one ``cv2.VideoCapture`` and feeds a ``FrameSlot``.
+
+    ``stats`` is an optional dict with the same keys as ``camera_stats`` in
+    Main.py; it is updated in place as frames arrive.
+
+    With ``reduced_decode`` on, the reader asks ``required_size_fn()`` for the
+    largest tile any consumer draws this camera into. When that is at most
+    half the sensor size, it pulls the raw MJPEG bytes
+    (``CAP_PROP_CONVERT_RGB`` off) and decodes them at 1/2, 1/4 or 1/8 scale
+    in the DCT domain instead of letting OpenCV decode at full resolution.
+    Raw MJPEG is also pulled whenever ``wants_jpeg_fn()`` is true, so the
+    web stream can forward the camera's own JPEG bytes (see mjpeg.py).
+
+    With ``capabilities`` (a ``camera_probe.CapabilityCache``) the reader
+    negotiates the smallest format/size/fps mode that still fills
+    ``mode_size_fn()`` (by default the required tile), and reopens the
+    camera when the requirement changes.
+    Without it the camera's default size is used. ``planned_mode_fn()``, when
+    given, overrides that choice with the mode from the USB bandwidth plan.
+
+    Frames are read as ``grab()`` then ``retrieve()``. When ``sync_fn()``
+    returns a ``SyncGroup``, the grab is done by the group for all its
+    cameras back-to-back, and this thread only retrieves and decodes.
+    Every frame is published with its capture time: the V4L2 buffer
+    timestamp (``CAP_PROP_POS_MSEC``, on the ``time.monotonic()`` clock)
+    when the backend reports a plausible one, otherwise the grab time.
+
+    A camera that fails to open, stops delivering frames, or whose device
+    node disappears (``device_lost()``) is released and reopened in this
+    thread with exponential backoff, so consumers never block on an open.
+    ``state`` tells them whether to show a "reconnecting" placeholder.
+
+    In ``low_latency`` mode the driver queue is kept to
+    ``LOW_LATENCY_BUFFERSIZE`` and every grab drains frames that were
+    already waiting, so only the newest frame is ever decoded. A backend
+    that can tell (``frame_waiting()``, see v4l2_capture.py) is grabbed
+    again only while another frame is already queued, so draining never
+    waits for the camera. Otherwise a frame whose kernel timestamp is older
+    than ``STALE_FRAME_INTERVALS`` frame periods counts as stale; without
+    kernel timestamps only the shorter queue applies. Skipped frames are
+    counted in ``stats['frames_stale']``. Grabs done by a ``SyncGroup``
+    don't drain: the extra grabs would run one camera after another inside
+    the group grab and spread the frames apart again.
+    """
+
+    def __init__(self, key, path, slot, name=None, stats=None, cam_logger=None,
+                 alloc_counter=None, required_size_fn=None, reduced_decode=True,
+                 wants_jpeg_fn=None, capabilities=None, planned_mode_fn=None, sync_fn=None,
+                 low_latency=False, backend=None, mode_size_fn=None):
+        super().__init__(daemon=True, name=f"CameraReader-{key}")
+        self.key = key
+        self.path = path
+        self.slot = slot
+        self.camera_name = name or key
+        self.stats = stats
+        self.log = cam_logger or logger
+        self._stop_event = threading.Event()
+        self._cap = None
+        # Frames are read into a small ring of reused buffers (see frame_buffers.BufferRing)
+        self._buffers = BufferRing(counter=alloc_counter)
+        # Seconds from starting the open to the first delivered frame (None until then)
+        self.open_latency = None
+        self._required_size_fn = required_size_fn or (lambda: None)
+        self._mode_size_fn = mode_size_fn or self._required_size_fn
+        self._wants_jpeg_fn = wants_jpeg_fn or (lambda: False)
+        self._reduced_decode = reduced_decode
+        self._raw_supported = True
+        self._sensor_size = (0, 0)
+        # Current decode scale (1, 2, 4 or 8) and whether we read raw MJPEG and
+        # decode it ourselves (False = OpenCV's own full-size decode)
+        self.decode_factor = 1
+        self.raw_mode = False
+        self._last_jpeg = None
+        self._capabilities = capabilities
+        self._planned_mode_fn = planned_mode_fn or (lambda: None)
+        self._sync_fn = sync_fn or (lambda: None)
+        self._low_latency = low_latency
+        self._backend = backend
+        # Frame rate the camera was opened at (None if it doesn't say)
+        self.nominal_fps = None
+        # Result and monotonic time of the last grab(), and the grabbed frame's capture time
+        self.grab_ok = False
+        self.grab_time = None
+        self.capture_time = None
+        # Smoothed delivery rate and capture-to-publish latency (seconds), for the HUD
+        self.fps = None
+        self.read_latency = None
+        self._last_publish = None
+        self.state = STATE_CONNECTING
+        # Set when the device directory changes, to cut a reconnect backoff short
+        self._device_event = threading.Event()
+        self._device_lost = False
+        # Negotiated capture mode (None = camera defaults) and a pending smaller one
+        self.mode = None
+        self._downgrade_since = None
+        # Mode wanted now, and the (required size, planned mode) it was negotiated for
+        self._wanted_mode = None
+        self._mode_inputs = None
+
+    def stop(self):
+        self._stop_event.set()
+        self._device_event.set()
+
+    def device_appeared(self):
+        """The device node (re)appeared: retry the open now instead of after the backoff."""
+        self._device_lost = False
+        self._device_event.set()
+
+    def device_lost(self):
+        """The device node vanished: drop the capture and start reconnecting."""
+        self._device_lost = True
+        self._device_event.set()
+
+    @property
+    def is_open(self):
+        return self._cap is not None and self._cap.isOpened()
+
+    def _negotiate_mode(self, refresh=False):
+        """Mode that fills the current required size, or None without capability data.
+
+        Also records what it was negotiated for in ``_mode_inputs``.
+        """
+        required, planned = self._mode_size_fn(), self._planned_mode_fn()
+        self._mode_inputs = (required, planned)
+        if self._capabilities is None:
+            return None
+        if planned is not None:
+            return planned
+        return choose_mode(self._capabilities.modes(self.path, refresh=refresh), required)
+
+    def _open(self):
+        self.log.info(f"Opening camera {self.camera_name} at {self.path}")
+        self.mode = self._negotiate_mode(refresh=True)
+        self._wanted_mode = self.mode
+        self._downgrade_since = None
+        buffersize = LOW_LATENCY_BUFFERSIZE if self._low_latency else None
+        cap = None
+        try:
+            if self.mode is None:
+                cap = open_capture(self.path, buffersize=buffersize, backend=self._backend)
+            else:
+                self.log.info(f"Camera {self.camera_name} negotiated {self.mode}")
+                cap = open_capture(self.path, self.mode.fourcc, self.mode.fps,
+                                   (self.mode.width, self.mode.height), buffersize, self._backend)
+            if not cap.isOpened():
+                self.log.error(f"Failed to open camera {self.camera_name}")
+                cap.release()
+                return None
+            # The V4L2 backend sets the format and starts streaming on the first query,
+            # so this can fail too (e.g. EBUSY) and is retried like a failed open
+            self._sensor_size = (
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            )
+            self.nominal_fps = self.mode.fps if self.mode is not None else (cap.get(cv2.CAP_PROP_FPS) or None)
+        except Exception as e:
+            self.log.error(f"Exception opening camera {self.camera_name}: {str(e)}")
+            if cap is not None:
+                try:
+                    cap.release()
+                except Exception:
+                    pass
+            return None
+        # A fresh capture decodes to BGR at full size until told otherwise
+        self.decode_factor = 1
+        self.raw_mode = False
+        self._raw_supported = self.mode is None or self.mode.fourcc == 'MJPG'
+        self.log.info(f"Successfully opened camera {self.camera_name}, FPS set to {CAPTURE_FPS}")
+        return cap
+
+    def _check_mode(self):
+        """Reopen the camera if a different negotiated mode is now needed.
+
+        A mode that no longer fills the requirement is replaced immediately;
+        a cheaper one is only adopted once it has been sufficient for
+        ``MODE_DOWNGRADE_DELAY`` seconds, so brief view changes don't bounce
+        the camera. Runs every frame, so it only negotiates again when the
+        required size or the bandwidth plan changed.
+        """
+        if (self._mode_size_fn(), self._planned_mode_fn()) != self._mode_inputs:
+            self._wanted_mode = self._negotiate_mode()
+        wanted = self._wanted_mode
+        if wanted is None or wanted == self.mode:
+            self._downgrade_since = None
+            return
+        upgrade = self.mode is None or wanted.width * wanted.height > self.mode.width * self.mode.height
+        if not upgrade:
+            now = time.monotonic()
+            if self._downgrade_since is None:
+                self._downgrade_since = now
+            if now - self._downgrade_since < MODE_DOWNGRADE_DELAY:
+                return
+        self.log.info(f"Camera {self.camera_name} renegotiating {self.mode} -> {wanted}")
+        self._cap.release()
+        self._cap = self._open()
+
+    def _update_decode_mode(self):
+        """Pick decode scale and raw/decoded capture from what subscribers currently need."""
+        factor = 1
+        if self._reduced_decode and self._raw_supported:
+            factor = pick_reduction(*self._sensor_size, self._required_size_fn())
+        raw = self._raw_supported and (factor > 1 or self._wants_jpeg_fn())
+        if factor == self.decode_factor and raw == self.raw_mode:
+            return
+        if raw != self.raw_mode:
+            # Raw MJPEG bytes are only needed when we decode ourselves or forward them
+            self._cap.set(cv2.CAP_PROP_CONVERT_RGB, 0 if raw else 1)
+        self.log.info(
+            f"Camera {self.camera_name} decode scale 1/{self.decode_factor} -> 1/{factor}, "
+            f"raw MJPEG {'on' if raw else 'off'}"
+        )
+        self.decode_factor = factor
+        self.raw_mode = raw
+
+    def grab(self, drain=True):
+        """Grab (but don't decode) the next frame; records ``grab_ok`` and ``grab_time``.
+
+        ``drain=False`` skips the low-latency drain of stale queued frames.
+        """
+        try:
+            self.grab_ok = self._cap is not None and self._cap.grab()
+        except Exception as e:
+            self.log.error(f"Exception grabbing frame from {self.camera_name}: {str(e)}")
+            self.grab_ok = False
+        self.grab_time = time.monotonic()
+        self.capture_time = self._capture_timestamp() if self.grab_ok else self.grab_time
+        if self.grab_ok and self._low_latency and drain:
+            self._drain_stale()
+        return self.grab_ok
+
+    def _drain_stale(self):
+        """Grab past frames that sat in the driver queue so the newest one gets decoded."""
+        frame_waiting = getattr(self._cap, 'frame_waiting', None)
+        if frame_waiting is None:
+            # No way to ask the driver: a frame older than the frame interval allows sat in the queue
+            max_age = STALE_FRAME_INTERVALS / (self.nominal_fps or CAPTURE_FPS)
+
+            def frame_waiting():
+                return self.grab_time - self.capture_time > max_age
+        drained = 0
+        while drained < MAX_STALE_DRAIN and frame_waiting():
+            try:
+                self.grab_ok = self._cap.grab()
+            except Exception as e:
+                self.log.error(f"Exception grabbing frame from {self.camera_name}: {str(e)}")
+                self.grab_ok = False
+            if not self.grab_ok:
+                break
+            drained += 1
+            self.grab_time = time.monotonic()
+            self.capture_time = self._capture_timestamp()
+        if drained and self.stats is not None:
+            self.stats['frames_stale'] += drained
+
+    def _capture_timestamp(self):
+        """Kernel capture time of the grabbed frame, falling back to the grab time."""
+        try:
+            stamp = self._cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        except Exception:
+            stamp = 0
+        if stamp > 0 and 0 <= self.grab_time - stamp < MAX_KERNEL_TIMESTAMP_AGE:
+            return stamp
+        return self.grab_time
+
+    def _retrieve_frame(self):
+        """Retrieve and decode the grabbed frame; returns ``(ok, frame)``.
+
+        In raw mode the compressed bytes are kept in ``_last_jpeg`` for publishing.
+        """
+        self._last_jpeg = None
+        if not self.raw_mode:
+            target = self._buffers.next_target()
+            if target is None:
+                return self._cap.retrieve()
+            return self._cap.retrieve(image=target)
+
+        ret, raw = self._cap.retrieve()
+        if not ret:
+            return False, None
+        if not is_raw_jpeg(raw):
+            # Backend/format doesn't hand out raw MJPEG; stay on OpenCV's decode
+            self.log.warning(f"Camera {self.camera_name} does not provide raw MJPEG, disabling raw capture")
+            self._raw_supported = False
+            self._update_decode_mode()
+            return raw.ndim == 3, raw
+        self._buffers.next_target()
+        frame = decode_reduced(raw, self.decode_factor)
+        if getattr(self._cap, 'zero_copy', False):
+            # ``raw`` is the driver's buffer and goes back to it on the next grab;
+            # copy it only when someone forwards the JPEG bytes
+            self._last_jpeg = raw.copy() if self._wants_jpeg_fn() else None
+        else:
+            self._last_jpeg = raw
+        return frame is not None, frame
+
+    def _read_frame(self):
+        """Grab (alone or with the sync group) and decode one frame; returns ``(ok, frame)``."""
+        self._update_decode_mode()
+        sync = self._sync_fn()
+        if sync is None or not sync.wait(self):
+            self.grab()
+        if not self.grab_ok:
+            return False, None
+        return self._retrieve_frame()
+
+    def run(self):
+        backoff = RECONNECT_BACKOFF_MIN
+        while not self._stop_event.is_set():
+            open_started = time.monotonic()
+            self._device_event.clear()
+            if isinstance(self.path, str) and not os.path.exists(self.path):
+                self._cap = None
+            else:
+                self._cap = self._open()
+            if self._cap is None:
+                if self.state != STATE_RECONNECTING:
+                    self.log.warning(f"Camera {self.camera_name} unavailable, retrying in the background")
+                self.state = STATE_RECONNECTING
+                self._device_event.wait(backoff)
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+                continue
+
+            backoff = RECONNECT_BACKOFF_MIN
+            try:
+                self._stream(open_started)
+            finally:
+                self._release()
+            if not self._stop_event.is_set():
+                self.log.warning(f"Camera {self.camera_name} lost, reconnecting")
+                self.state = STATE_RECONNECTING
+                # Don't keep showing the last frame from before the disconnect
+                self.slot.clear()
+        self.state = STATE_STOPPED
+
+    def _release(self):
+        if self._cap is not None:
+            try:
+                self._cap.release()
+                self.log.info(f"Released camera {self.camera_name}")
+            except Exception as e:
+                self.log.error(f"Error releasing camera {self.camera_name}: {str(e)}")
+            self._cap = None
+
+    def _stream(self, open_started):
+        """Read and publish frames until stopped or the camera is lost."""
+        failures = 0
+        first_frame = True
+        self._device_lost = False
+        # The gap across a reconnect isn't a frame interval
+        self._last_publish = None
+        self.fps = None
+        while not self._stop_event.is_set() and not self._device_lost:
+            if self._capabilities is not None:
+                self._check_mode()
+                if self._cap is None:
+                    return
+            try:
+                ret, frame = self._read_frame()
+            except Exception as e:
+                self.log.error(f"Exception reading frame from {self.camera_name}: {str(e)}")
+                ret, frame = False, None
+
+            if not ret:
+                if self.stats is not None:
+                    self.stats['frames_failed'] += 1
+                failures += 1
+                if failures == 1:
+                    # Only the first failure of a streak is logged; the streak ends in a reconnect
+                    self.log.warning(f"Camera {self.camera_name} failed to read frame")
+                if failures >= LOST_AFTER_FAILURES:
+                    return
+                self._stop_event.wait(READ_FAIL_BACKOFF)
+                continue
+
+            failures = 0
+            self.slot.publish(self._buffers.commit(frame), self.capture_time, jpeg=self._last_jpeg)
+            self._update_rates()
+            if first_frame:
+                first_frame = False
+                self.state = STATE_STREAMING
+                self.open_latency = time.monotonic() - open_started
+                self.log.info(
+                    f"Camera {self.camera_name} first frame after "
+                    f"{self.open_latency * 1000:.0f} ms"
+                )
+                if self.stats is not None:
+                    self.stats['open_latency'] = self.open_latency
+            if self.stats is not None:
+                self.stats['frames_read'] += 1
+                self.stats['last_frame_time'] = datetime.now()
+                self.stats['fps'] = self.fps
+                self.stats['read_latency'] = self.read_latency
+                if self.stats['frames_read'] % HEARTBEAT_INTERVAL == 0:
+                    self.log.info(
+                        f"Camera {self.camera_name} heartbeat: "
+                        f"{self.stats['frames_read']} frames read, "
+                        f"{self.stats['frames_failed']} frames failed"
+                    )
+
+    def _update_rates(self):
+        """Fold the frame just published into ``fps`` and ``read_latency``."""
+        now = time.monotonic()
+        if self.capture_time is not None:
+            latency = now - self.capture_time
+            self.read_latency = latency if self.read_latency is None else (
+                self.read_latency + RATE_SMOOTHING * (latency - self.read_latency))
+        if self._last_publish is not None and now > self._last_publish:
+            fps = 1.0 / (now - self._last_publish)
+            self.fps = fps if self.fps is None else self.fps + RATE_SMOOTHING * (fps - self.fps)
+        self._last_publish = now
+
+
+# ---- Synchronized Grab ----
+
+class SyncGroup:
+    """Grabs a set of cameras back-to-back so their frames are captured together.
+
+    Each member reader calls ``wait()`` instead of grabbing on its own. Once
+    all of them have arrived, the last one grabs every camera in a tight
+    loop, then all readers retrieve and decode their own frame in parallel.
+    The spread of grab times is recorded in ``last_skew`` (seconds).
+
+    Only cameras that can keep up take part, so the group never drags one
+    down to another's pace: a member that isn't streaming (still opening,
+    or reconnecting) grabs alone, as does one opened at a frame rate more
+    than ``SYNC_MAX_RATE_RATIO`` below the fastest member's, and one whose
+    grab in the group took over ``SYNC_SLOW_GRAB`` sits out for
+    ``SYNC_RETRY_INTERVAL`` seconds. A group grab stops after
+    ``SYNC_GRAB_BUDGET``; members it didn't reach grab alone that frame.
+
+    If a member doesn't arrive within ``SYNC_GRAB_TIMEOUT`` (camera stalled)
+    the group breaks and readers grab independently, retrying the group
+    every ``SYNC_RETRY_INTERVAL`` seconds.
+    """
+
+    def __init__(self, readers, log=None):
+        self.readers = list(readers)
+        self.keys = frozenset(r.key for r in self.readers)
+        self.log = log or logger
+        self.last_skew = None
+        self._lock = threading.Lock()
+        self._broken_at = None
+        # Readers the current barrier is for; it is rebuilt when that set changes
+        self._members = ()
+        self._barrier = None
+        self._sitting_out = {}  # reader key -> monotonic time it may rejoin
+        self._grabbed = {}  # reader key -> whether the last group grab got its frame
+
+    def _eligible(self, now):
+        """Members that can take part in a group grab right now."""
+        members = [
+            r for r in self.readers
+            if r.state == STATE_STREAMING and self._sitting_out.get(r.key, 0) <= now
+        ]
+        rates = [r.nominal_fps for r in members if r.nominal_fps]
+        if rates:
+            fastest = max(rates)
+            members = [r for r in members if not r.nominal_fps or r.nominal_fps * SYNC_MAX_RATE_RATIO >= fastest]
+        return tuple(members)
+
+    def _grab_all(self, members):
+        deadline = time.monotonic() + SYNC_GRAB_BUDGET
+        grabbed = []
+        for r in members:
+            started = time.monotonic()
+            if started > deadline:
+                self._grabbed[r.key] = False
+                continue
+            r.grab(drain=False)
+            self._grabbed[r.key] = True
+            grabbed.append(r)
+            if r.grab_time - started > SYNC_SLOW_GRAB:
+                if r.key not in self._sitting_out:
+                    self.log.info(
+                        f"Camera {r.camera_name} too slow for sync group {sorted(self.keys)}, "
+                        f"grabbing it independently (retried every {SYNC_RETRY_INTERVAL:.0f}s)"
+                    )
+                self._sitting_out[r.key] = r.grab_time + SYNC_RETRY_INTERVAL
+        times = [r.grab_time for r in grabbed if r.grab_ok]
+        self.last_skew = max(times) - min(times) if len(times) > 1 else 0.0
+
+    def wait(self, reader):
+        """Wait for the group grab; returns False if ``reader`` must grab this frame alone."""
+        now = time.monotonic()
+        with self._lock:
+            if self._broken_at is not None:
+                if now - self._broken_at < SYNC_RETRY_INTERVAL:
+                    return False
+                self._broken_at = None
+            members = self._eligible(now)
+            if reader not in members or len(members) < 2:
+                return False
+            if members != self._members or self._barrier is None:
+                # Readers waiting on the old barrier grab alone once
+                if self._barrier is not None:
+                    self._barrier.abort()
+                self._members = members
+                self._barrier = threading.Barrier(len(members), action=partial(self._grab_all, members),
+                                                  timeout=SYNC_GRAB_TIMEOUT)
+            barrier = self._barrier
+        try:
+            barrier.wait()
+            return self._grabbed.get(reader.key, False)
+        except threading.BrokenBarrierError:
+            with self._lock:
+                if barrier is self._barrier and self._broken_at is None:
+                    self.log.warning(
+                        f"Sync group {sorted(self.keys)} broken, grabbing independently"
+                    )
+                    self._broken_at = time.monotonic()
+                    self._barrier = None
+            return False
+
+    def close(self):
+        """Release every waiting reader; they fall back to grabbing alone."""
+        with self._lock:
+            self._broken_at = float('inf')
+            barrier, self._barrier = self._barrier, None
+        if barrier is not None:
+            barrier.abort()
+
+
+# ---- Capture Engine / Frame Hub ----
+
+# One consumer's interest in a set of cameras (see CaptureEngine.subscribe).
+Subscription = namedtuple('Subscription', ['keys', 'tile_size', 'want_jpeg', 'synchronized', 'min_capture_size'])
+Subscription.__new__.__defaults__ = (None,)
+
+class CaptureEngine:
+    """Runs one ``CameraReader`` per camera and exposes their latest-frame slots.
+
+    The compositor calls ``latest(key)`` for each tile and never blocks on a
+    camera, so a slow or stalled camera only freezes its own tile.
+
+    Cameras are opened in parallel (each reader opens its own device). A
+    long-lived subscription to every camera keeps them all warm, so switching
+    views only changes which slots the compositor reads.
+
+    A single engine is shared by every consumer in the process (the local
+    display and the web stream), so it doubles as the frame hub: consumers
+    ``subscribe()`` to the cameras they need and the engine keeps each camera
+    open while at least one subscription references it. Nobody else should
+    open the ``/dev/video`` devices directly.
+
+    With both ``capabilities`` and a ``usb_budget.Topology``, every change
+    in subscriptions re-plans the modes of all running cameras so the
+    cameras sharing a hub stay within its bandwidth; cameras that can't fit
+    are logged as errors up front instead of failing when opened.
+
+    With ``device_dir`` set, a ``DeviceWatcher`` polls that directory and
+    tells readers when their device node disappears or comes back, so
+    unplugged cameras reconnect as soon as they are plugged in again.
+
+    A ``synchronized`` subscription puts its cameras in a ``SyncGroup`` so
+    the frames it composites were grabbed within a few milliseconds of
+    each other.
+
+    ``low_latency`` puts every reader in drain mode (see ``CameraReader``),
+    and ``backend`` picks the capture backend (see ``open_capture()``).
+    """
+
+    def __init__(self, camera_paths, camera_names=None, stats=None, loggers=None,
+                 reduced_decode=True, capabilities=None, topology=None, device_dir=None,
+                 low_latency=False, backend=None):
+        self.camera_paths = camera_paths
+        self.camera_names = camera_names or {}
+        self.stats = stats or {}
+        self.loggers = loggers or {}
+        self._update_cond = threading.Condition()
+        self._slots = {}
+        self._readers = {}
+        # Per-camera capture buffer allocations; survives reader restarts
+        self.allocation_counters = {k: AllocationCounter() for k in camera_paths}
+        self._subs_lock = threading.Lock()
+        self._subscriptions = {}  # token -> Subscription
+        self._required_sizes = {}  # camera key -> merged tile size (None = full resolution)
+        self._mode_sizes = {}  # camera key -> size its capture mode must fill (None = full resolution)
+        self._jpeg_wanted = set()  # camera keys some subscriber wants raw MJPEG bytes for
+        self._next_token = 0
+        self._sync_group = None
+        self.device_dir = device_dir
+        self.low_latency = low_latency
+        self.backend = backend
+        self._watcher = None
+        self.reduced_decode = reduced_decode
+        # Optional camera_probe.CapabilityCache used for mode negotiation
+        self.capabilities = capabilities
+        # Optional usb_budget.Topology; with it, modes come from a bandwidth plan
+        self.topology = topology
+        self._planned_modes = {}  # camera key -> CameraMode from the last plan
+
+    # ---- Subscriptions ----
+
+    def subscribe(self, keys, tile_size=None, want_jpeg=False, synchronized=False, min_capture_size=None):
+        """Register interest in ``keys`` and start any camera not already running.
+
+        ``tile_size`` is the largest (w, h) this consumer will draw the frames
+        into; cameras may then be decoded at reduced resolution. ``None``
+        asks for full resolution, ``(0, 0)`` for "keep streaming, any size".
+        ``want_jpeg`` asks for the camera's compressed MJPEG bytes alongside
+        each frame (see ``latest_jpeg()``). ``synchronized`` grabs ``keys``
+        together (see ``SyncGroup``); the newest synchronized subscription wins.
+        ``min_capture_size`` keeps the cameras capturing at a mode that fills
+        that (w, h) even while ``tile_size`` is smaller, so a camera kept warm
+        at a tiny decode can be shown larger without reopening it; only the
+        USB bandwidth plan may go below it.
+        Returns a token to pass to ``unsubscribe()``.
+        """
+        keys = tuple(keys)
+        with self._subs_lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscriptions[token] = Subscription(keys, tile_size, want_jpeg, synchronized,
+                                                      min_capture_size)
+            self._update_required_sizes()
+            self.start(keys)
+            self._update_sync_group()
+        return token
+
+    def unsubscribe(self, token):
+        """Drop a subscription and stop cameras that no other subscription uses."""
+        with self._subs_lock:
+            sub = self._subscriptions.pop(token, None)
+            keys = sub.keys if sub else ()
+            still_used = {k for s in self._subscriptions.values() for k in s.keys}
+            unused = [k for k in keys if k not in still_used]
+            self._update_required_sizes()
+            self._update_sync_group()
+            stopping = self._detach(unused)
+        # Joined outside the lock: a reader stuck in a blocking grab mustn't hold up other subscribers
+        self._join(stopping)
+
+    def _update_required_sizes(self):
+        sizes = {}
+        mode_sizes = {}
+        jpeg_wanted = set()
+        for sub in self._subscriptions.values():
+            mode_size = sub.tile_size
+            if sub.min_capture_size is not None:
+                mode_size = merge_required_sizes([sub.tile_size, sub.min_capture_size])
+            for k in sub.keys:
+                sizes.setdefault(k, []).append(sub.tile_size)
+                mode_sizes.setdefault(k, []).append(mode_size)
+            if sub.want_jpeg:
+                jpeg_wanted.update(sub.keys)
+        self._required_sizes = {k: merge_required_sizes(v) for k, v in sizes.items()}
+        self._mode_sizes = {k: merge_required_sizes(v) for k, v in mode_sizes.items()}
+        self._jpeg_wanted = jpeg_wanted
+        if self.capabilities is not None and self.topology is not None:
+            self._plan_bandwidth()
+
+    def _plan_bandwidth(self):
+        keys = list(self._required_sizes)
+        modes = {k: self.capabilities.modes(self.camera_paths[k]) for k in keys}
+        plan = plan_bandwidth(self.topology, modes, self._mode_sizes)
+        if plan.modes != self._planned_modes:
+            logger.info("USB bandwidth plan:\n" + format_plan(plan))
+        if plan.over_budget:
+            logger.error(
+                f"USB bandwidth exceeded even at the cheapest modes for cameras "
+                f"{', '.join(plan.over_budget)}; they may fail to stream"
+            )
+        self._planned_modes = plan.modes
+
+    def planned_mode(self, key):
+        """Mode the bandwidth plan assigned to camera ``key`` (None without a plan)."""
+        return self._planned_modes.get(key)
+
+    def _update_sync_group(self):
+        synced = [s for _, s in sorted(self._subscriptions.items()) if s.synchronized]
+        keys = frozenset(synced[-1].keys) if synced else frozenset()
+        readers = [self._readers[k] for k in sorted(keys) if k in self._readers]
+        group = self._sync_group
+        if group is not None and group.keys == keys and group.readers == readers:
+            return
+        if group is not None:
+            group.close()
+        # A group of one has nothing to line up with
+        self._sync_group = SyncGroup(readers) if len(readers) > 1 else None
+
+    def sync_group_for(self, key):
+        group = self._sync_group
+        return group if group is not None and key in group.keys else None
+
+    def sync_skew(self):
+        """Grab-time spread (seconds) of the last synchronized grab, or None."""
+        group = self._sync_group
+        return group.last_skew if group is not None else None
+
+    def required_size(self, key):
+        """Largest tile (w, h) any subscriber draws camera ``key`` into (None = full resolution)."""
+        return self._required_sizes.get(key)
+
+    def mode_size(self, key):
+        """Size (w, h) camera ``key``'s capture mode must fill: ``required_size()`` or a subscriber's floor."""
+        return self._mode_sizes.get(key)
+
+    # ---- Reader lifecycle ----
+
+    def _on_devices_changed(self, appeared, disappeared):
+        for k, reader in list(self._readers.items()):
+            path = self.camera_paths[k]
+            if path in disappeared:
+                reader.device_lost()
+            elif path in appeared:
+                reader.device_appeared()
+
+    def start(self, keys):
+        """Start reader threads for ``keys`` (cameras already running are left alone)."""
+        if self.device_dir is not None and self._watcher is None:
+            self._watcher = DeviceWatcher(self._on_devices_changed, self.device_dir)
+            self._watcher.start()
+        for k in keys:
+            if k in self._readers and self._readers[k].is_alive():
+                continue
+            counter = self.allocation_counters.setdefault(k, AllocationCounter())
+            slot = self._slots.setdefault(k, FrameSlot(self._update_cond, counter))
+            reader = CameraReader(
+                k, self.camera_paths[k], slot,
+                name=self.camera_names.get(k),
+                stats=self.stats.get(k),
+                cam_logger=self.loggers.get(k),
+                alloc_counter=counter,
+                required_size_fn=lambda k=k: self.required_size(k),
+                mode_size_fn=lambda k=k: self.mode_size(k),
+                wants_jpeg_fn=lambda k=k: k in self._jpeg_wanted,
+                reduced_decode=self.reduced_decode,
+                capabilities=self.capabilities,
+                planned_mode_fn=lambda k=k: self.planned_mode(k),
+                sync_fn=lambda k=k: self.sync_group_for(k),
+                low_latency=self.low_latency,
+                backend=self.backend,
+            )
+            self._readers[k] = reader
+            reader.start()
+
+    def stop(self, keys=None):
+        """Stop reader threads for ``keys`` (all cameras when omitted) and wait for them."""
+        if keys is None and self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        self._join(self._detach(list(self._readers) if keys is None else keys))
+
+    def _detach(self, keys):
+        """Tell the readers of ``keys`` to stop and drop them; returns ``{key: reader}`` to ``_join()``."""
+        group = self._sync_group
+        if group is not None and group.keys & set(keys):
+            # Don't leave the remaining members waiting on a camera that is going away
+            group.close()
+            self._sync_group = None
+        stopping = {}
+        for k in keys:
+            reader = self._readers.pop(k, None)
+            if reader:
+                reader.stop()
+                stopping[k] = reader
+        return stopping
+
+    def _join(self, stopping):
+        """Wait for readers ``_detach()`` returned to exit."""
+        for k, reader in stopping.items():
+            if reader.is_alive():
+                reader.join(timeout=READER_SHUTDOWN_TIMEOUT)
+            if k in self._slots and k not in self._readers:
+                # Don't hand a stale frame to the next subscriber (unless one already restarted it)
+                self._slots[k].clear()
+
+    def is_open(self, key):
+        reader = self._readers.get(key)
+        return reader is not None and reader.is_open
+
+    def camera_state(self, key):
+        """One of the ``STATE_*`` constants for camera ``key``."""
+        reader = self._readers.get(key)
+        return reader.state if reader is not None else STATE_STOPPED
+
+    def open_latencies(self):
+        """Return ``{key: seconds}`` from open to first frame for each running camera (None if not yet streaming)."""
+        return {k: r.open_latency for k, r in self._readers.items()}
+
+    def wait_until_streaming(self, keys, timeout):
+        """Block until every camera in ``keys`` has delivered a frame or ``timeout`` expires.
+
+        Returns True if all of them are streaming.
+        """
+        deadline = time.monotonic() + timeout
+        with self._update_cond:
+            return self._update_cond.wait_for(
+                lambda: all(self.latest(k)[0] is not None for k in keys),
+                max(0, deadline - time.monotonic()),
+            )
+
+    def latest(self, key):
+        """Return ``(frame, seq, timestamp)`` for camera ``key`` without blocking."""
+        slot = self._slots.get(key)
+        if slot is None:
+            return None, 0, None
+        return slot.latest()
+
+    def latest_pyramid(self, key):
+        """Return ``(pyramid, seq, timestamp)`` for camera ``key`` without blocking."""
+        slot = self._slots.get(key)
+        if slot is None:
+            return None, 0, None
+        return slot.latest_pyramid()
+
+    def latest_jpeg(self, key):
+        """Return ``(jpeg, seq, timestamp)`` for camera ``key``; ``jpeg`` is None unless raw MJPEG is being captured."""
+        slot = self._slots.get(key)
+        if slot is None:
+            return None, 0, None
+        return slot.latest_jpeg()
+
+    def seqs(self, keys):
+        """Return the current sequence number of each camera in ``keys``."""
+        return tuple(self._slots[k].seq if k in self._slots else 0 for k in keys)
+
+    def wait_for_new_frame(self, keys, last_seqs, timeout):
+        """Block until any camera in ``keys`` publishes past ``last_seqs`` or ``timeout`` expires.
+
+        Returns the new sequence tuple (equal to ``last_seqs`` on timeout).
+        """
+        with self._update_cond:
+            self._update_cond.wait_for(lambda: self.seqs(keys) != tuple(last_seqs), timeout)
+        return self.seqs(keys)
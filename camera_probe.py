@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+from collections import namedtuple
+
+# ---- Capability Probing ----
+
+# One capture mode a camera advertises.
+CameraMode = namedtuple('CameraMode', ['fourcc', 'width', 'height', 'fps'])
+
+# Probe results, keyed by device path and USB vendor:product ID, so a camera
+# moved to another port (or swapped for a different model) is probed again.
+CAPABILITY_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_modes.json")
+# Timeout (seconds) for one v4l2-ctl listing.
+PROBE_TIMEOUT = 5
+# Formats in order of preference. MJPG keeps USB bandwidth low enough for
+# several cameras on one hub; YUYV is uncompressed and only used as a fallback.
+PREFERRED_FOURCCS = ('MJPG', 'YUYV')
+# Frame rate negotiation aims for.
+TARGET_FPS = 30
+
+logger = logging.getLogger("CameraProbe")
+
+_FORMAT_RE = re.compile(r"\[\d+\]: '(\w{1,4})'")
+_SIZE_RE = re.compile(r"Size: Discrete (\d+)x(\d+)")
+_INTERVAL_RE = re.compile(r"Interval: Discrete [\d.]+s \(([\d.]+) fps\)")
+
+
+def parse_v4l2_formats(text):
+    """Parse ``v4l2-ctl --list-formats-ext`` output into a list of ``CameraMode``."""
+    modes = []
+    fourcc = size = None
+    for line in text.splitlines():
+        m = _FORMAT_RE.search(line)
+        if m:
+            fourcc, size = m.group(1), None
+            continue
+        m = _SIZE_RE.search(line)
+        if m:
+            size = (int(m.group(1)), int(m.group(2)))
+            continue
+        m = _INTERVAL_RE.search(line)
+        if m and fourcc and size:
+            mode = CameraMode(fourcc, size[0], size[1], round(float(m.group(1))))
+            if mode not in modes:
+                modes.append(mode)
+    return modes
+
+
+def probe_modes(path):
+    """List the modes the camera at ``path`` supports (empty if it can't be probed)."""
+    try:
+        result = subprocess.run(
+            ["v4l2-ctl", "-d", path, "--list-formats-ext"],
+            capture_output=True, text=True, timeout=PROBE_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not probe {path}: {str(e)}")
+        return []
+    if result.returncode != 0:
+        logger.warning(f"v4l2-ctl failed for {path}: {result.stderr.strip()}")
+        return []
+    return parse_v4l2_formats(result.stdout)
+
+
+def usb_id(path):
+    """Return ``"vendor:product"`` for the USB camera behind ``path``, or None if unknown."""
+    try:
+        node = os.path.basename(os.path.realpath(path))
+        device = os.path.realpath(f"/sys/class/video4linux/{node}/device")
+        # The video node hangs off a USB interface; the IDs live on its parent device
+        for candidate in (device, os.path.dirname(device)):
+            vendor_file = os.path.join(candidate, "idVendor")
+            if os.path.exists(vendor_file):
+                with open(vendor_file) as f:
+                    vendor = f.read().strip()
+                with open(os.path.join(candidate, "idProduct")) as f:
+                    product = f.read().strip()
+                return f"{vendor}:{product}"
+    except OSError:
+        pass
+    return None
+
+
+# ---- Mode Selection ----
+
+def choose_mode(modes, required=None, fps=TARGET_FPS, fourccs=PREFERRED_FOURCCS):
+    """Pick the cheapest mode that still fills a ``required`` (w, h) tile.
+
+    ``required`` None means "largest available". Modes that can't reach
+    ``fps`` are only used when nothing else fits, and formats are tried in
+    ``fourccs`` order. Returns None when ``modes`` is empty.
+    """
+    candidates = [m for m in modes if m.fourcc in fourccs] or list(modes)
+    if not candidates:
+        return None
+    fast = [m for m in candidates if m.fps >= fps]
+    candidates = fast or candidates
+
+    def rank(m):
+        fmt = fourccs.index(m.fourcc) if m.fourcc in fourccs else len(fourccs)
+        return fmt, m.width * m.height, -m.fps
+
+    if required is not None:
+        req_w, req_h = required
+        # A tile is filled (center-cropped), so both sides must be covered
+        filling = [m for m in candidates if m.width >= req_w and m.height >= req_h]
+        if filling:
+            return min(filling, key=rank)
+    # Nothing is big enough (or full resolution was asked for): take the largest
+    largest = max(m.width * m.height for m in candidates)
+    return min((m for m in candidates if m.width * m.height == largest), key=rank)
+
+
+# ---- On-Disk Cache ----
+
+class CapabilityCache:
+    """Probe each camera once and remember its modes across runs.
+
+    ``modes(path)`` returns the cached list when the device path and USB ID
+    match a previous probe, so a normal startup never runs ``v4l2-ctl``.
+    The USB ID read from sysfs and failed (empty) probes are remembered in
+    memory too, so asking again is a dict lookup until ``refresh`` is passed.
+    """
+
+    def __init__(self, cache_file=CAPABILITY_CACHE_FILE, probe=probe_modes, id_fn=usb_id):
+        self.cache_file = cache_file
+        self._probe = probe
+        self._id_fn = id_fn
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._ids = {}  # path -> USB ID as last read
+        self._failed = set()  # paths whose last probe found no modes
+
+    def _load(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f).get('cameras', {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        try:
+            with open(self.cache_file, 'w') as f:
+                json.dump({'cameras': self._entries}, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not write capability cache {self.cache_file}: {str(e)}")
+
+    def modes(self, path, refresh=False):
+        """Return the list of ``CameraMode`` for ``path``, probing only on a cache miss.
+
+        ``refresh`` (e.g. when the camera is (re)opened) reads the USB ID
+        again and retries a probe that failed before.
+        """
+        with self._lock:
+            if refresh or path not in self._ids:
+                self._ids[path] = self._id_fn(path)
+                self._failed.discard(path)
+            key = f"{path}|{self._ids[path] or 'unknown'}"
+            entry = self._entries.get(key)
+            if entry is not None:
+                return [CameraMode(*m) for m in entry]
+            if path in self._failed:
+                return []
+        modes = self._probe(path)
+        logger.info(f"Probed {path}: {len(modes)} modes")
+        with self._lock:
+            if modes:
+                self._entries[key] = [list(m) for m in modes]
+                self._save()
+            else:
+                # Not saved to disk; the camera may just not be plugged in yet
+                self._failed.add(path)
+        return modes
+
+    def invalidate(self, path=None):
+        """Forget cached modes for ``path`` (every camera when omitted)."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._ids.clear()
+                self._failed.clear()
+            else:
+                for key in [k for k in self._entries if k.split('|', 1)[0] == path]:
+                    del self._entries[key]
+                self._ids.pop(path, None)
+                self._failed.discard(path)
+            self._save()
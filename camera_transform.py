@@ -0,0 +1,283 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# ---- Transform Profiles ----
+
+# Per-camera corrections, by camera key. Copy camera_transforms.example.json
+# and fill in the calibration from cv2.calibrateCamera for each lens.
+TRANSFORMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_transforms.json")
+# Compiled remap tables, one file per (profile, source size).
+REMAP_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "remap_cache")
+
+ROTATIONS = (0, 90, 180, 270)
+
+logger = logging.getLogger("CameraTransform")
+
+# How one camera's frames are corrected, applied in this order:
+# - ``camera_matrix``/``dist_coeffs``: lens calibration measured at
+#   ``calibration_size`` (w, h); None skips undistortion. ``balance`` is
+#   getOptimalNewCameraMatrix's alpha: 0 keeps only valid pixels, 1 keeps
+#   the whole (curved-edged) sensor image.
+# - ``crop``: (left, top, right, bottom) fractions of the undistorted frame to keep.
+# - ``rotation``: clockwise degrees, one of ``ROTATIONS``.
+# - ``mirror``: flip left-right (rear-facing cameras).
+TransformProfile = namedtuple('TransformProfile', [
+    'camera_matrix', 'dist_coeffs', 'calibration_size', 'balance', 'crop', 'rotation', 'mirror',
+])
+TransformProfile.__new__.__defaults__ = (None, None, None, 0.0, (0.0, 0.0, 1.0, 1.0), 0, False)
+
+
+def load_profiles(path=TRANSFORMS_FILE):
+    """Read ``{camera key: TransformProfile}`` from JSON; a missing file means no corrections."""
+    try:
+        with open(path, 'r') as f:
+            cameras = json.load(f).get('cameras', {})
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        logger.error(f"Ignoring malformed transform profiles {path}: {str(e)}")
+        return {}
+    profiles = {}
+    for key, c in cameras.items():
+        profile = TransformProfile(
+            camera_matrix=tuple(tuple(row) for row in c['camera_matrix']) if c.get('camera_matrix') else None,
+            dist_coeffs=tuple(c['dist_coeffs']) if c.get('dist_coeffs') else None,
+            calibration_size=tuple(c['calibration_size']) if c.get('calibration_size') else None,
+            balance=c.get('balance', 0.0),
+            crop=tuple(c.get('crop', (0.0, 0.0, 1.0, 1.0))),
+            rotation=c.get('rotation', 0),
+            mirror=c.get('mirror', False),
+        )
+        if profile.rotation not in ROTATIONS:
+            raise ValueError(f"Camera {key}: rotation must be one of {ROTATIONS}, not {profile.rotation}")
+        profiles[key] = profile
+    return profiles
+
+
+def _crop_rect(profile, src_w, src_h):
+    left, top, right, bottom = profile.crop
+    return (int(round(left * src_w)), int(round(top * src_h)),
+            int(round(right * src_w)), int(round(bottom * src_h)))
+
+
+def output_size(profile, src_w, src_h):
+    """Size of a ``src_w`` x ``src_h`` frame after cropping and rotation."""
+    x0, y0, x1, y1 = _crop_rect(profile, src_w, src_h)
+    w, h = x1 - x0, y1 - y0
+    return (h, w) if profile.rotation in (90, 270) else (w, h)
+
+
+def source_size_for(profile, width, height):
+    """Frame size whose corrected output is at least ``width`` x ``height``."""
+    if profile.rotation in (90, 270):
+        width, height = height, width
+    left, top, right, bottom = profile.crop
+    return int(np.ceil(width / (right - left))), int(np.ceil(height / (bottom - top)))
+
+
+# ---- Remap Tables ----
+
+def build_maps(profile, src_w, src_h, region, dst_w, dst_h):
+    """Compile ``profile`` into one ``cv2.remap`` map pair.
+
+    ``region`` is the (x0, y0, x1, y1) part of the corrected image (of
+    ``output_size()``) to show, scaled to ``dst_w`` x ``dst_h``; so the maps
+    do the tile's crop and resize too. Each output pixel is traced back
+    through mirror, rotation, crop and lens model to the source pixel it
+    samples. Returns fixed-point maps (``CV_16SC2``), the fastest to remap with.
+    """
+    map_x, map_y = _trace(profile, src_w, src_h, region, dst_w, dst_h)
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+
+def build_full_maps(profile, src_w, src_h):
+    """Float ``(map_x, map_y)`` of the whole corrected image, one entry per output pixel.
+
+    The expensive part of every table for this profile and source size;
+    ``crop_maps()`` cuts any region and tile size out of it.
+    """
+    out_w, out_h = output_size(profile, src_w, src_h)
+    return _trace(profile, src_w, src_h, (0, 0, out_w, out_h), out_w, out_h)
+
+
+def crop_maps(full_maps, region, dst_w, dst_h):
+    """``build_maps()`` for ``region`` and ``dst_w`` x ``dst_h``, cut out of ``build_full_maps()``.
+
+    The full maps are resampled with the crop and scale alone, at the same
+    pixel centers ``build_maps()`` traces; the lens model is smooth enough
+    that interpolating between whole pixels loses nothing.
+    """
+    rx0, ry0, rx1, ry1 = region
+    scale_x, scale_y = (rx1 - rx0) / dst_w, (ry1 - ry0) / dst_h
+    # Output pixel -> corrected-image coordinates, as in _trace()
+    to_full = np.float64([
+        [scale_x, 0, rx0 + 0.5 * scale_x - 0.5],
+        [0, scale_y, ry0 + 0.5 * scale_y - 0.5],
+    ])
+    map_x, map_y = (
+        cv2.warpAffine(m, to_full, (dst_w, dst_h), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                       borderMode=cv2.BORDER_REPLICATE)
+        for m in full_maps
+    )
+    return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+
+def _trace(profile, src_w, src_h, region, dst_w, dst_h):
+    """Source pixel coordinates (float32 maps) sampled for each pixel of ``build_maps()``."""
+    out_w, out_h = output_size(profile, src_w, src_h)
+    rx0, ry0, rx1, ry1 = region
+    # Pixel centers of the output, in corrected-image coordinates
+    xs = rx0 + (np.arange(dst_w, dtype=np.float64) + 0.5) * (rx1 - rx0) / dst_w - 0.5
+    ys = ry0 + (np.arange(dst_h, dtype=np.float64) + 0.5) * (ry1 - ry0) / dst_h - 0.5
+    x, y = np.meshgrid(xs, ys)
+
+    if profile.mirror:
+        x = out_w - 1 - x
+    # Undo the clockwise rotation: (x, y) in the rotated image -> (u, v) in the cropped one
+    crop_x0, crop_y0, crop_x1, crop_y1 = _crop_rect(profile, src_w, src_h)
+    crop_w, crop_h = crop_x1 - crop_x0, crop_y1 - crop_y0
+    if profile.rotation == 90:
+        u, v = y, crop_h - 1 - x
+    elif profile.rotation == 180:
+        u, v = crop_w - 1 - x, crop_h - 1 - y
+    elif profile.rotation == 270:
+        u, v = crop_w - 1 - y, x
+    else:
+        u, v = x, y
+    u = u + crop_x0
+    v = v + crop_y0
+
+    if profile.camera_matrix is not None:
+        u, v = _distort(profile, src_w, src_h, u, v)
+    return u.astype(np.float32), v.astype(np.float32)
+
+
+def _distort(profile, src_w, src_h, u, v):
+    """Map undistorted pixel coordinates to where the lens actually put them in the source."""
+    calib_w, calib_h = profile.calibration_size or (src_w, src_h)
+    camera_matrix = np.array(profile.camera_matrix, dtype=np.float64)
+    # Focal lengths and center scale with the capture resolution
+    camera_matrix[0] *= src_w / calib_w
+    camera_matrix[1] *= src_h / calib_h
+    dist_coeffs = np.array(profile.dist_coeffs or (), dtype=np.float64)
+    new_matrix, _ = cv2.getOptimalNewCameraMatrix(
+        camera_matrix, dist_coeffs, (src_w, src_h), profile.balance
+    )
+    # Undistorted pixels -> normalized rays -> projected through the lens model
+    rays = np.stack([
+        (u - new_matrix[0, 2]) / new_matrix[0, 0],
+        (v - new_matrix[1, 2]) / new_matrix[1, 1],
+        np.ones_like(u),
+    ], axis=-1).reshape(-1, 1, 3)
+    projected, _ = cv2.projectPoints(rays, np.zeros(3), np.zeros(3), camera_matrix, dist_coeffs)
+    projected = projected.reshape(u.shape + (2,))
+    return projected[..., 0], projected[..., 1]
+
+
+class RemapCache:
+    """Full-frame remap tables by profile and source size, in memory and on disk.
+
+    Building a table traces every pixel through the lens model, far too
+    slow for the frame loop, so each one (``build_full_maps()``) is built
+    once and saved to ``directory`` (None keeps them in memory only). A
+    later run just loads them. Any tile size, layout or zoom then only
+    takes a ``crop_maps()`` of it. ``request()`` does the loading and
+    building on a background thread, for callers that can't wait for it.
+    """
+
+    def __init__(self, directory=REMAP_CACHE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._maps = {}
+        # Tables requested but not built yet; the builder thread works through them in order
+        self._pending = set()
+        self._queue = queue.Queue()
+        self._builder = None
+        self._failed = set()
+
+    @staticmethod
+    def _key(profile, src_w, src_h):
+        text = json.dumps(['full', list(profile), src_w, src_h])
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def maps(self, profile, src_w, src_h):
+        """Return ``build_full_maps()`` for these arguments, building it if need be."""
+        key = self._key(profile, src_w, src_h)
+        with self._lock:
+            maps = self._maps.get(key)
+        if maps is None:
+            maps = self._obtain(key, (profile, src_w, src_h))
+            with self._lock:
+                self._maps[key] = maps
+        return maps
+
+    def request(self, profile, src_w, src_h):
+        """Like ``maps()``, but never waits: None until the table is ready.
+
+        The first request for a table queues it for the builder thread; ask
+        again (e.g. next frame) to pick it up. A table that failed to build
+        stays None.
+        """
+        key = self._key(profile, src_w, src_h)
+        with self._lock:
+            maps = self._maps.get(key)
+            if maps is not None or key in self._pending or key in self._failed:
+                return maps
+            self._pending.add(key)
+            if self._builder is None:
+                self._builder = threading.Thread(target=self._build_requested, name="RemapBuilder",
+                                                 daemon=True)
+                self._builder.start()
+        self._queue.put((key, (profile, src_w, src_h)))
+        return None
+
+    def _build_requested(self):
+        while True:
+            key, args = self._queue.get()
+            try:
+                maps = self._obtain(key, args)
+            except (cv2.error, ValueError) as e:
+                logger.error(f"Could not build remap table for {args[1]}x{args[2]}: {str(e)}")
+                maps = None
+            with self._lock:
+                self._pending.discard(key)
+                if maps is None:
+                    self._failed.add(key)
+                else:
+                    self._maps[key] = maps
+
+    def _obtain(self, key, args):
+        """Load the table for ``key`` from disk or build (and save) it."""
+        maps = self._load(key)
+        if maps is None:
+            maps = build_full_maps(*args)
+            self._save(key, maps)
+        return maps
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                return data['map_x'], data['map_y']
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save(self, key, maps):
+        if self.directory is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            np.savez(self._path(key), map_x=maps[0], map_y=maps[1])
+        except OSError as e:
+            logger.warning(f"Could not write remap cache {self._path(key)}: {str(e)}")
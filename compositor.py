@@ -0,0 +1,465 @@
+from collections import namedtuple
+from functools import partial
+import cv2
+import numpy as np
+from camera_transform import RemapCache, crop_maps, output_size, source_size_for
+from frame_buffers import CanvasSet
+
+# ---- Tile Geometry ----
+
+# How a source frame is fitted into its tile:
+# - 'fill': scale to cover the whole tile and center-crop the overflow
+# - 'fit':  scale to fit inside the tile and letterbox the rest in black
+FIT_FILL = 'fill'
+FIT_FIT = 'fit'
+
+# A tile is a destination rectangle on the output canvas.
+Tile = namedtuple('Tile', ['x', 'y', 'w', 'h', 'fit'])
+
+# Precomputed mapping from one source resolution into one tile:
+# ``src`` is the (x0, y0, x1, y1) crop of the source frame that ends up visible,
+# ``dst`` is the (x, y, w, h) rectangle on the canvas it is resized into.
+TileGeometry = namedtuple('TileGeometry', ['src', 'dst'])
+
+
+def compute_tile_geometry(src_w, src_h, tile):
+    """Work out which part of a ``src_w`` x ``src_h`` frame lands where in ``tile``.
+
+    Cropping happens in source coordinates, before the resize, so only the
+    visible pixels are ever scaled.
+    """
+    if tile.fit == FIT_FILL:
+        scale = max(tile.w / src_w, tile.h / src_h)
+        crop_w = min(src_w, int(round(tile.w / scale)))
+        crop_h = min(src_h, int(round(tile.h / scale)))
+        x0 = (src_w - crop_w) // 2
+        y0 = (src_h - crop_h) // 2
+        return TileGeometry((x0, y0, x0 + crop_w, y0 + crop_h), (tile.x, tile.y, tile.w, tile.h))
+
+    scale = min(tile.w / src_w, tile.h / src_h)
+    new_w = max(1, int(src_w * scale))
+    new_h = max(1, int(src_h * scale))
+    x_off = tile.x + (tile.w - new_w) // 2
+    y_off = tile.y + (tile.h - new_h) // 2
+    return TileGeometry((0, 0, src_w, src_h), (x_off, y_off, new_w, new_h))
+
+
+def render_placeholder(width, height, label):
+    """Dark grey card with ``label`` centered, for a tile that has no camera frame."""
+    card = np.full((height, width, 3), 40, dtype=np.uint8)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    scale = max(0.4, min(1.0, width / 640))
+    (text_w, text_h), _ = cv2.getTextSize(label, font, scale, 2)
+    origin = ((width - text_w) // 2, (height + text_h) // 2)
+    cv2.putText(card, label, origin, font, scale, (200, 200, 200), 2, cv2.LINE_AA)
+    return card
+
+
+def required_source_size(src_w, src_h, tile):
+    """Size the whole ``src_w`` x ``src_h`` frame is scaled to when drawn into ``tile``.
+
+    A pyramid level at least this large has enough pixels for the tile.
+    """
+    if tile.fit == FIT_FILL:
+        scale = max(tile.w / src_w, tile.h / src_h)
+    else:
+        scale = min(tile.w / src_w, tile.h / src_h)
+    return int(src_w * scale), int(src_h * scale)
+
+
+def _run_all(fns):
+    for fn in fns:
+        fn()
+
+
+def _overlaps(a, b):
+    return a.x < b.x + b.w and b.x < a.x + a.w and a.y < b.y + b.h and b.y < a.y + a.h
+
+
+# ---- Compositor ----
+
+# Fewest output pixels resized in one frame (about a third of a 1024x600
+# screen) before the tiles are worth spreading over the pool; below that,
+# handing them to other threads costs about as much as it saves.
+POOL_MIN_PIXELS = 150000
+
+class Compositor:
+    """Composites camera frames into preallocated output canvases.
+
+    Tile geometry is computed once per (source resolution, tile) pair and
+    cached; each frame is then a single ``cv2.resize`` of the visible source
+    region straight into its slice of the canvas, with no intermediate
+    buffers. Geometry is only recomputed when a camera's resolution changes.
+
+    Canvases are double-buffered (``buffers``): call ``begin_frame()`` before
+    placing tiles, then hand ``canvas`` to the display. Steady-state frames
+    allocate nothing; ``allocations`` counts every canvas ever created.
+
+    Tiles placed with a frame sequence number are only redrawn when the
+    sequence advanced: a canvas that already shows that frame is left
+    alone, and one that is a frame behind copies the tile from the previous
+    canvas instead of resizing again. Tiles touched this frame are listed
+    in ``dirty_tiles`` (see ``dirty_rects()``). Overlapping tiles (PIP
+    insets) are redrawn whenever a tile underneath them was.
+
+    With a ``pool`` (a ``tile_pool.TilePool``) placing a tile only does the
+    bookkeeping; the pixel work is queued and ``finish_frame()`` draws all
+    tiles in parallel, waiting for every one before returning. Tiles are
+    disjoint canvas regions, so only overlapping tiles have to wait for
+    each other. A frame with a single tile to draw, or fewer than
+    ``pool_min_pixels`` resized, is drawn on the calling thread instead.
+    Call ``finish_frame()`` before showing the canvas either way.
+
+    A tile given a ``camera_transform.TransformProfile`` (``set_transform()``)
+    is drawn with a single ``cv2.remap`` instead of the resize: lens
+    undistortion, crop, rotation, mirroring and the scale into the tile are
+    compiled into one map pair per source resolution, cut out of the
+    camera's full-frame table in ``remap_cache``. That table is built in the
+    background; until it is ready the tile shows its frames uncorrected.
+
+    A tile given a ``zoom.ZoomState`` (``set_zoom()``) shows only the zoomed
+    part of its frames: the region of interest is cropped before the
+    resize (or cut out of the full-frame table for the remap), and the
+    pyramid level is picked for the region, not the whole frame. Its
+    geometry is cached like any other and only recomputed when the zoom's
+    ``version`` changes.
+    """
+
+    def __init__(self, width, height, tiles, buffers=2, pool=None, remap_cache=None,
+                 pool_min_pixels=POOL_MIN_PIXELS):
+        self.width = width
+        self.height = height
+        self.tiles = list(tiles)
+        self.canvases = CanvasSet(
+            lambda: np.zeros((height, width, 3), dtype=np.uint8), count=buffers
+        )
+        self._geometry_cache = {}  # (tile index, src_w, src_h) -> TileGeometry
+        self._required_size_cache = {}  # (tile index, src_w, src_h) -> (w, h)
+        self._placeholder_cache = {}  # (w, h, label) -> rendered placeholder card
+        self._transforms = {}  # tile index -> TransformProfile
+        self._remap_cache = remap_cache
+        self._tile_maps = {}  # (tile index, src_w, src_h) -> (map1, map2)
+        self._zooms = {}  # tile index -> ZoomState
+        # Zoom version each tile's caches were built for, and its (x0, y0, x1, y1) view
+        # as fractions of the frame (None: the whole frame)
+        self._zoom_views = {}  # tile index -> (version, view)
+        # Geometry and frame sequence last drawn into each tile, tracked separately per canvas
+        self._tile_geometry = [[None] * len(self.tiles) for _ in range(buffers)]
+        self._tile_seq = [[None] * len(self.tiles) for _ in range(buffers)]
+        # Tiles drawn after (on top of) each tile that they overlap
+        self._covers = [
+            [j for j in range(i + 1, len(self.tiles)) if _overlaps(self.tiles[i], self.tiles[j])]
+            for i in range(len(self.tiles))
+        ]
+        self.dirty_tiles = []
+        self.pool = pool
+        self.pool_min_pixels = pool_min_pixels
+        # Pixel work queued for finish_frame() when drawing on a pool: tile index -> callables
+        self._jobs = None
+        # Output pixels resized (not just copied) into the canvas this frame
+        self._frame_pixels = 0
+        # Tile updates since creation: resized from a frame, copied from the previous canvas, skipped
+        self.tiles_drawn = 0
+        self.tiles_copied = 0
+        self.tiles_skipped = 0
+
+    @property
+    def canvas(self):
+        """The canvas currently being drawn (and, after the frame, displayed)."""
+        return self.canvases.current
+
+    @property
+    def allocations(self):
+        return self.canvases.counter
+
+    def max_tile_size(self):
+        """Largest (w, h) over all tiles; tells the capture side how much resolution is needed."""
+        sizes = [
+            (t.w, t.h) if i not in self._transforms else source_size_for(self._transforms[i], t.w, t.h)
+            for i, t in enumerate(self.tiles)
+        ]
+        return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+    def begin_frame(self):
+        """Switch to the next canvas; the previous one stays intact for consumers."""
+        self.dirty_tiles = []
+        self._jobs = {} if self.pool is not None else None
+        self._frame_pixels = 0
+        return self.canvases.advance()
+
+    def finish_frame(self):
+        """Draw any tiles queued for the pool and wait until all of them are on the canvas."""
+        jobs, self._jobs = self._jobs, None
+        if not jobs:
+            return self.canvas
+        if len(jobs) > 1 and self._frame_pixels >= self.pool_min_pixels:
+            self.pool.run(self._waves(jobs))
+        else:
+            # Queued in placement order, i.e. insets after what they cover
+            for fns in jobs.values():
+                _run_all(fns)
+        return self.canvas
+
+    def _waves(self, jobs):
+        """Group queued tiles so each wave only holds tiles that don't overlap an earlier, unfinished one."""
+        waves = []
+        wave_of = {}
+        for index, fns in jobs.items():
+            wave = 1 + max(
+                (wave_of[j] for j in wave_of if j in self._covers[index] or index in self._covers[j]),
+                default=-1,
+            )
+            wave_of[index] = wave
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(partial(_run_all, fns))
+        return waves
+
+    def _paint(self, index, fn):
+        """Run pixel work ``fn`` for tile ``index`` now, or queue it when drawing on a pool."""
+        if self._jobs is None:
+            fn()
+        else:
+            self._jobs.setdefault(index, []).append(fn)
+
+    def dirty_rects(self):
+        """``(x, y, w, h)`` of every tile redrawn since ``begin_frame()``."""
+        return [tuple(self.tiles[i][:4]) for i in self.dirty_tiles]
+
+    def _mark_dirty(self, index, seq=None):
+        ci = self.canvases.index
+        self._tile_seq[ci][index] = seq
+        if index not in self.dirty_tiles:
+            self.dirty_tiles.append(index)
+        for j in self._covers[index]:
+            # Whatever was drawn on top of this tile has been painted over
+            self._tile_geometry[ci][j] = None
+            self._tile_seq[ci][j] = None
+
+    def _reuse(self, index, seq):
+        """Satisfy tile ``index`` for frame ``seq`` without resizing; True if it was."""
+        if seq is None:
+            return False
+        ci = self.canvases.index
+        if self._tile_seq[ci][index] == seq:
+            self.tiles_skipped += 1
+            return True
+        pi = self.canvases.previous_index
+        if pi != ci and self._tile_seq[pi][index] == seq:
+            t = self.tiles[index]
+            region = self.canvas[t.y:t.y + t.h, t.x:t.x + t.w]
+            shown = self.canvases.previous[t.y:t.y + t.h, t.x:t.x + t.w]
+            self._paint(index, lambda: np.copyto(region, shown))
+            self._tile_geometry[ci][index] = self._tile_geometry[pi][index]
+            self._mark_dirty(index, seq)
+            self.tiles_copied += 1
+            return True
+        return False
+
+    def set_transform(self, index, profile):
+        """Correct tile ``index``'s frames with ``profile`` (None: plain resize)."""
+        if self._transforms.get(index) == profile:
+            return
+        if profile is None:
+            self._transforms.pop(index, None)
+        else:
+            self._transforms[index] = profile
+            if self._remap_cache is None:
+                self._remap_cache = RemapCache(directory=None)
+        self._forget(index)
+
+    def set_zoom(self, index, zoom):
+        """Show the part of tile ``index``'s frames that ``zoom`` (a ``ZoomState``, None: all) selects."""
+        if self._zooms.get(index) is zoom:
+            return
+        if zoom is None:
+            self._zooms.pop(index, None)
+        else:
+            self._zooms[index] = zoom
+        self._zoom_views.pop(index, None)
+        self._forget(index)
+
+    def _check_zoom(self, index):
+        """Pick up a pan/zoom of tile ``index`` since it was last drawn."""
+        zoom = self._zooms.get(index)
+        if zoom is None:
+            return
+        version, roi = zoom.snapshot()
+        seen = self._zoom_views.get(index)
+        if seen is not None and seen[0] == version:
+            return
+        self._forget(index)
+        self._zoom_views[index] = (version, None if roi == (0.0, 0.0, 1.0, 1.0) else roi)
+
+    def _zoomed(self, index):
+        seen = self._zoom_views.get(index)
+        return seen is not None and seen[1] is not None
+
+    def _forget(self, index):
+        """Drop tile ``index``'s cached geometry and make every canvas redraw it."""
+        for cache in (self._geometry_cache, self._required_size_cache, self._tile_maps):
+            for key in [k for k in cache if k[0] == index]:
+                del cache[key]
+        for ci in range(len(self._tile_geometry)):
+            self._tile_geometry[ci][index] = None
+            self._tile_seq[ci][index] = None
+
+    def _output_size(self, index, src_w, src_h):
+        """Size a ``src_w`` x ``src_h`` frame has once tile ``index``'s transform is applied."""
+        profile = self._transforms.get(index)
+        return (src_w, src_h) if profile is None else output_size(profile, src_w, src_h)
+
+    def _view(self, index, width, height):
+        """The (x0, y0, x1, y1) part of a ``width`` x ``height`` image tile ``index`` is zoomed to."""
+        if not self._zoomed(index):
+            return 0, 0, width, height
+        fx0, fy0, fx1, fy1 = self._zoom_views[index][1]
+        x0, y0 = int(round(fx0 * width)), int(round(fy0 * height))
+        x1 = min(width, max(x0 + 1, int(round(fx1 * width))))
+        y1 = min(height, max(y0 + 1, int(round(fy1 * height))))
+        return x0, y0, x1, y1
+
+    def _geometry_for(self, index, src_w, src_h, corrected=True):
+        """Crop and placement of a ``src_w`` x ``src_h`` frame in tile ``index``.
+
+        ``corrected=False`` fits the frame as captured, ignoring the tile's transform.
+        """
+        key = (index, src_w, src_h) if corrected else (index, src_w, src_h, 'uncorrected')
+        geom = self._geometry_cache.get(key)
+        if geom is None:
+            size = self._output_size(index, src_w, src_h) if corrected else (src_w, src_h)
+            # Fitted to the zoomed region only, then shifted to where that region is in the frame
+            vx0, vy0, vx1, vy1 = self._view(index, *size)
+            geom = compute_tile_geometry(vx1 - vx0, vy1 - vy0, self.tiles[index])
+            x0, y0, x1, y1 = geom.src
+            geom = TileGeometry((x0 + vx0, y0 + vy0, x1 + vx0, y1 + vy0), geom.dst)
+            self._geometry_cache[key] = geom
+        return geom
+
+    def _maps_for(self, index, src_w, src_h, geom):
+        """Remap tables for tile ``index``, or None while the full-frame one is still being built."""
+        key = (index, src_w, src_h)
+        maps = self._tile_maps.get(key)
+        if maps is None:
+            full_maps = self._remap_cache.request(self._transforms[index], src_w, src_h)
+            if full_maps is None:
+                return None
+            # Just a resample of the full table, cheap enough for every pan/zoom step
+            maps = crop_maps(full_maps, geom.src, *geom.dst[2:])
+            self._tile_maps[key] = maps
+        return maps
+
+    def clear_tile(self, index):
+        """Paint tile ``index`` black (used for missing cameras and letterbox bars)."""
+        t = self.tiles[index]
+        region = self.canvas[t.y:t.y + t.h, t.x:t.x + t.w]
+        self._paint(index, lambda: region.fill(0))
+        self._tile_geometry[self.canvases.index][index] = None
+        self._mark_dirty(index)
+
+    def place(self, index, frame, seq=None):
+        """Resize ``frame`` into tile ``index``; a None frame blanks the tile.
+
+        ``seq`` is the frame's sequence number from the capture side; when
+        given, a tile that already shows it is not redrawn.
+        """
+        drawn = self._tile_geometry[self.canvases.index]
+        if frame is None:
+            if drawn[index] is not None:
+                self.clear_tile(index)
+            return
+        self._check_zoom(index)
+        if self._reuse(index, seq):
+            return
+
+        src_h, src_w = frame.shape[:2]
+        self._draw(index, src_w, src_h, lambda: frame, seq)
+
+    def _draw(self, index, src_w, src_h, source, seq):
+        """Resize ``source()``, a ``src_w`` x ``src_h`` frame, into tile ``index``."""
+        drawn = self._tile_geometry[self.canvases.index]
+        geom = self._geometry_for(index, src_w, src_h)
+        maps = None
+        if index in self._transforms:
+            maps = self._maps_for(index, src_w, src_h, geom)
+            if maps is None:
+                geom = self._geometry_for(index, src_w, src_h, corrected=False)
+        if geom is not drawn[index]:
+            # Resolution changed: wipe stale pixels (e.g. old letterbox area) once
+            self.clear_tile(index)
+            drawn[index] = geom
+
+        x0, y0, x1, y1 = geom.src
+        dx, dy, dw, dh = geom.dst
+        dst = self.canvas[dy:dy + dh, dx:dx + dw]
+        self._frame_pixels += dw * dh
+        if maps is not None:
+            # Crop and scale are part of the maps, so this replaces the resize
+            map1, map2 = maps
+            self._paint(index, lambda: cv2.remap(source(), map1, map2, cv2.INTER_LINEAR, dst=dst))
+        else:
+            self._paint(index, lambda: cv2.resize(source()[y0:y1, x0:x1], (dw, dh), dst=dst))
+        # An uncorrected stand-in is redrawn next frame even if the camera has nothing new
+        pending = maps is None and index in self._transforms
+        self._mark_dirty(index, None if pending else seq)
+        self.tiles_drawn += 1
+
+    def place_placeholder(self, index, label):
+        """Fill tile ``index`` with a "``label``" card (e.g. while its camera reconnects).
+
+        Cards are rendered once per tile size and label, and only copied into
+        a canvas that doesn't already show them.
+        """
+        drawn = self._tile_geometry[self.canvases.index]
+        key = ('placeholder', label)
+        if drawn[index] == key:
+            return
+        t = self.tiles[index]
+        card = self._placeholder_cache.get((t.w, t.h, label))
+        if card is None:
+            card = render_placeholder(t.w, t.h, label)
+            self._placeholder_cache[(t.w, t.h, label)] = card
+            self.allocations.allocated()
+        region = self.canvas[t.y:t.y + t.h, t.x:t.x + t.w]
+        self._paint(index, lambda: np.copyto(region, card))
+        drawn[index] = key
+        self._mark_dirty(index)
+
+    def place_pyramid(self, index, pyramid, seq=None):
+        """Like ``place()``, but resize from the smallest pyramid level that covers the tile."""
+        if pyramid is None:
+            self.place(index, None)
+            return
+        self._check_zoom(index)
+        if self._reuse(index, seq):
+            # Checked before picking a level, so an unchanged tile doesn't build one
+            return
+        src_h, src_w = pyramid.base.shape[:2]
+        key = (index, src_w, src_h)
+        need = self._required_size_cache.get(key)
+        if need is None:
+            if index in self._transforms or self._zoomed(index):
+                vx0, vy0, vx1, vy1 = self._view(index, *self._output_size(index, src_w, src_h))
+                view_w, view_h = vx1 - vx0, vy1 - vy0
+                fitted_w, fitted_h = required_source_size(view_w, view_h, self.tiles[index])
+                # Same scale applied to the frame as captured (the transform may crop or
+                # rotate it, the zoom shows only part of it)
+                scale = max(fitted_w / view_w, fitted_h / view_h)
+                need = int(src_w * scale), int(src_h * scale)
+                if index in self._transforms and index in self._zooms:
+                    # Zooming in moves to finer levels: have the full-resolution table ready
+                    self._remap_cache.request(self._transforms[index], src_w, src_h)
+            else:
+                need = required_source_size(src_w, src_h, self.tiles[index])
+            self._required_size_cache[key] = need
+        # The level itself is built with the pixel work, i.e. on the pool when there is one
+        n = pyramid.level_for_size(*need)
+        src_w, src_h = pyramid.level_size(n)
+        self._draw(index, src_w, src_h, lambda: pyramid.level(n), seq)
+
+    def compose(self, frames):
+        """Start a new frame, place one frame per tile (in tile order) and return the canvas."""
+        self.begin_frame()
+        for i, frame in enumerate(frames):
+            self.place(i, frame)
+        return self.finish_frame()
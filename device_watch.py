@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+
+# Where udev publishes stable camera names; cameras are configured by these paths.
+DEVICE_DIR = "/dev/v4l/by-path"
+# How often (seconds) the device directory is rescanned.
+DEVICE_POLL_INTERVAL = 1.0
+
+logger = logging.getLogger("DeviceWatch")
+
+
+def list_devices(directory):
+    """Return the set of full paths currently in ``directory`` (empty if it doesn't exist)."""
+    try:
+        return {os.path.join(directory, name) for name in os.listdir(directory)}
+    except OSError:
+        # The whole directory disappears when the last camera is unplugged
+        return set()
+
+
+class DeviceWatcher(threading.Thread):
+    """Polls a device directory and reports cameras appearing and disappearing.
+
+    ``on_change(appeared, disappeared)`` is called from the watcher thread
+    with two sets of full paths whenever the directory contents change.
+    Polling an ordinary directory keeps this testable against a fake device
+    tree (create and delete files in a temp dir) and needs no inotify binding.
+    """
+
+    def __init__(self, on_change, directory=DEVICE_DIR, interval=DEVICE_POLL_INTERVAL):
+        super().__init__(daemon=True, name="DeviceWatcher")
+        self.directory = directory
+        self.interval = interval
+        self._on_change = on_change
+        self._stop_event = threading.Event()
+        self.devices = list_devices(directory)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def poll(self):
+        """Rescan once and report any change; returns ``(appeared, disappeared)``."""
+        current = list_devices(self.directory)
+        appeared = current - self.devices
+        disappeared = self.devices - current
+        self.devices = current
+        if appeared or disappeared:
+            for path in sorted(appeared):
+                logger.info(f"Device appeared: {path}")
+            for path in sorted(disappeared):
+                logger.warning(f"Device disappeared: {path}")
+            try:
+                self._on_change(appeared, disappeared)
+            except Exception as e:
+                logger.error(f"Error handling device change: {str(e)}")
+        return appeared, disappeared
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
@@ -0,0 +1,110 @@
+import threading
+
+# ---- Allocation Accounting ----
+
+class AllocationCounter:
+    """Counts frame-sized buffer allocations against frames produced.
+
+    In steady state every producer (camera reader, compositor) reuses its
+    buffers, so ``per_frame()`` should read 0.0; anything else means a buffer
+    is being reallocated on the hot path (e.g. a resolution keeps changing).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.frames = 0
+        self._last_allocations = 0
+        self._last_frames = 0
+
+    def allocated(self, count=1):
+        with self._lock:
+            self.allocations += count
+
+    def frame(self):
+        with self._lock:
+            self.frames += 1
+
+    def per_frame(self):
+        """Allocations per frame since the previous call (0.0 when no frames were produced)."""
+        with self._lock:
+            allocs = self.allocations - self._last_allocations
+            frames = self.frames - self._last_frames
+            self._last_allocations = self.allocations
+            self._last_frames = self.frames
+        return allocs / frames if frames else 0.0
+
+
+# ---- Capture Buffer Ring ----
+
+# Buffers per camera. A consumer must be done with a frame (or copy it) before
+# the reader wraps around, i.e. within CAPTURE_BUFFER_COUNT - 1 frame periods
+# (~100 ms at 30fps), which comfortably covers a composite or a JPEG encode.
+CAPTURE_BUFFER_COUNT = 4
+
+
+class BufferRing:
+    """Fixed ring of reusable capture targets for one camera.
+
+    ``next_target()`` hands out the next buffer to read into (``None`` until
+    the first frame has fixed the resolution); ``commit()`` records what the
+    read actually returned. ``cv2.VideoCapture.read(image=...)`` reuses a
+    target of the right shape and dtype, so steady-state reads allocate nothing.
+    """
+
+    def __init__(self, count=CAPTURE_BUFFER_COUNT, counter=None):
+        self._buffers = [None] * count
+        self._index = 0
+        self.counter = counter or AllocationCounter()
+
+    def next_target(self):
+        self._index = (self._index + 1) % len(self._buffers)
+        return self._buffers[self._index]
+
+    def commit(self, frame):
+        """Record the array a read returned into the current target slot."""
+        if frame is not self._buffers[self._index]:
+            # The read had to allocate (first frame, or the resolution changed)
+            self._buffers[self._index] = frame
+            self.counter.allocated()
+        self.counter.frame()
+        return frame
+
+
+# ---- Output Canvases ----
+
+class CanvasSet:
+    """Round-robin set of preallocated output canvases (double-buffered by default).
+
+    The compositor draws into ``current`` after ``advance()``; the canvas it
+    drew into last time stays untouched for one more frame, so a consumer
+    that still holds it (web encoder, display sink) never sees a half-drawn
+    frame.
+    """
+
+    def __init__(self, make_canvas, count=2, counter=None):
+        self.counter = counter or AllocationCounter()
+        self._canvases = [make_canvas() for _ in range(count)]
+        self.counter.allocated(count)
+        self.index = 0
+
+    @property
+    def current(self):
+        return self._canvases[self.index]
+
+    @property
+    def previous_index(self):
+        return (self.index - 1) % len(self._canvases)
+
+    @property
+    def previous(self):
+        """The canvas drawn (and shown) last frame."""
+        return self._canvases[self.previous_index]
+
+    def advance(self):
+        self.index = (self.index + 1) % len(self._canvases)
+        self.counter.frame()
+        return self.current
+
+    def __len__(self):
+        return len(self._canvases)
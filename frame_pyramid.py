@@ -0,0 +1,81 @@
+import threading
+import cv2
+
+# Stop halving once either side would drop below this many pixels.
+PYRAMID_MIN_SIDE = 16
+
+
+def level_for_size(w, h, min_w, min_h):
+    """Index of the smallest pyramid level of a ``w`` x ``h`` frame that is still at least ``min_w`` x ``min_h``."""
+    n = 0
+    while (w >> (n + 1)) >= max(min_w, PYRAMID_MIN_SIDE) and (h >> (n + 1)) >= max(min_h, PYRAMID_MIN_SIDE):
+        n += 1
+    return n
+
+
+class FramePyramid:
+    """Lazily built multi-scale view of one captured frame.
+
+    Level 0 is the captured frame; level ``n`` is half the size of level
+    ``n - 1`` and is derived from it (never from full resolution) the first
+    time any consumer asks for it. Every consumer of the same frame (local
+    display, web stream) shares the levels, so each scale is computed at most
+    once per frame. A new pyramid is created for every captured frame, which
+    drops the old levels.
+
+    ``store`` is an optional dict of level buffers from a previous frame of
+    the same camera; levels are resized into them when the shape matches so
+    steady-state frames don't allocate.
+    """
+
+    def __init__(self, base, store=None, counter=None):
+        self._levels = [base]
+        self._lock = threading.Lock()
+        self._store = store if store is not None else {}
+        self._counter = counter
+
+    @property
+    def base(self):
+        return self._levels[0]
+
+    def level(self, n):
+        """Return level ``n`` (1/2**n scale), building any missing levels on the way."""
+        with self._lock:
+            while len(self._levels) <= n:
+                prev = self._levels[-1]
+                h, w = prev.shape[:2]
+                if w // 2 < PYRAMID_MIN_SIDE or h // 2 < PYRAMID_MIN_SIDE:
+                    break
+                index = len(self._levels)
+                size = (w // 2, h // 2)
+                dst = self._store.get(index)
+                if dst is None or dst.shape[1::-1] != size or dst.shape[2:] != prev.shape[2:]:
+                    dst = cv2.resize(prev, size, interpolation=cv2.INTER_AREA)
+                    self._store[index] = dst
+                    if self._counter is not None:
+                        self._counter.allocated()
+                else:
+                    cv2.resize(prev, size, dst=dst, interpolation=cv2.INTER_AREA)
+                self._levels.append(dst)
+            return self._levels[min(n, len(self._levels) - 1)]
+
+    def level_for_size(self, min_w, min_h):
+        """Index of the smallest level that is still at least ``min_w`` x ``min_h``.
+
+        Worked out from the base shape alone, so nothing is built yet.
+        """
+        h, w = self.base.shape[:2]
+        return level_for_size(w, h, min_w, min_h)
+
+    def level_size(self, n):
+        """``(w, h)`` of level ``n`` (one ``level_for_size()`` returned), without building it."""
+        h, w = self.base.shape[:2]
+        return w >> n, h >> n
+
+    def for_size(self, min_w, min_h):
+        """Return the smallest level that is still at least ``min_w`` x ``min_h``.
+
+        Downstream resizes then only ever scale down by less than 2x (or up,
+        when even the full frame is smaller than requested).
+        """
+        return self.level(self.level_for_size(min_w, min_h))
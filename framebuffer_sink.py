@@ -0,0 +1,104 @@
+import logging
+import mmap
+import os
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# Linux framebuffer the display is attached to.
+FB_DEVICE = "/dev/fb0"
+# Where the kernel describes each framebuffer's mode.
+FB_SYSFS_DIR = "/sys/class/graphics"
+
+# Native pixel layouts, by bits per pixel. Both are little-endian, so
+# XRGB8888 is B, G, R, X in memory (BGRA) and RGB565 is the 2-byte layout
+# OpenCV calls BGR565.
+PIXEL_FORMATS = {
+    16: ('RGB565', cv2.COLOR_BGR2BGR565, 2),
+    32: ('XRGB8888', cv2.COLOR_BGR2BGRA, 4),
+}
+
+# Visible size, bits per pixel and bytes per row (stride, may include padding).
+FramebufferInfo = namedtuple('FramebufferInfo', ['width', 'height', 'bits_per_pixel', 'stride'])
+
+logger = logging.getLogger("Framebuffer")
+
+
+def read_framebuffer_info(device=FB_DEVICE, sysfs_dir=FB_SYSFS_DIR):
+    """Read ``device``'s mode from sysfs (``virtual_size``, ``bits_per_pixel``, ``stride``)."""
+    base = os.path.join(sysfs_dir, os.path.basename(device))
+
+    def read(name):
+        with open(os.path.join(base, name)) as f:
+            return f.read().strip()
+
+    width, height = (int(v) for v in read('virtual_size').split(','))
+    bpp = int(read('bits_per_pixel'))
+    return FramebufferInfo(width, height, bpp, int(read('stride')))
+
+
+class FramebufferSink:
+    """Display sink that writes composites straight into a memory-mapped framebuffer.
+
+    Skips the X server entirely: the BGR canvas is converted to the
+    framebuffer's native format (RGB565 or XRGB8888) by one ``cv2.cvtColor``
+    per rectangle, writing directly into the mapped device memory, so there
+    is no intermediate frame and no window-system copy.
+
+    The mode is read from sysfs unless ``info`` is given; passing it
+    explicitly lets a regular file stand in for the device (it is grown to
+    the framebuffer size if it is too small), e.g. for testing.
+    """
+
+    def __init__(self, device=FB_DEVICE, info=None):
+        info = read_framebuffer_info(device) if info is None else info
+        if info.bits_per_pixel not in PIXEL_FORMATS:
+            raise ValueError(f"Unsupported framebuffer depth: {info.bits_per_pixel} bits per pixel")
+        self.device = device
+        self.info = info
+        self.pixel_format, self._conversion, channels = PIXEL_FORMATS[info.bits_per_pixel]
+        size = info.stride * info.height
+
+        self._file = open(device, 'r+b')
+        try:
+            if os.path.getsize(device) < size and os.path.isfile(device):
+                self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        except Exception:
+            self._file.close()
+            raise
+        # Visible pixels, as rows of ``stride`` bytes in the mapping
+        self.pixels = np.ndarray(
+            (info.height, info.width, channels), dtype=np.uint8, buffer=self._map,
+            strides=(info.stride, channels, 1),
+        )
+        logger.info(f"Opened {device}: {info.width}x{info.height} {self.pixel_format}, stride {info.stride}")
+
+    @property
+    def size(self):
+        return self.info.width, self.info.height
+
+    def show(self, canvas, rects=None):
+        """Write ``canvas`` (BGR, drawn at the top-left corner) to the framebuffer.
+
+        ``rects`` limits the write to those ``(x, y, w, h)`` regions, e.g.
+        ``Compositor.dirty_rects()``; anything outside the screen is clipped.
+        """
+        height = min(canvas.shape[0], self.info.height)
+        width = min(canvas.shape[1], self.info.width)
+        if rects is None:
+            rects = [(0, 0, width, height)]
+        for x, y, w, h in rects:
+            x1, y1 = min(x + w, width), min(y + h, height)
+            if x1 <= x or y1 <= y:
+                continue
+            cv2.cvtColor(canvas[y:y1, x:x1], self._conversion, dst=self.pixels[y:y1, x:x1])
+
+    def clear(self):
+        self.pixels[:] = 0
+
+    def close(self):
+        # The pixel view holds the mapping open; drop it first
+        self.pixels = None
+        self._map.close()
+        self._file.close()
@@ -6,6 +6,10 @@ import time
 import cv2
 import numpy as np
 from flask import Flask, jsonify, request, render_template_string, Response
+from mjpeg import ensure_huffman_tables
+from latency import LatencyRecorder
+from camera_engine import open_capture
+from zoom import crop_view
 
 # ---- Hotspot Management ----
 
@@ -21,6 +25,11 @@ CANONICAL_URL_BASE = f"http://{HOSTNAME}.local"
 
 STREAM_JPEG_QUALITY = 65
 STREAM_THREAD_SHUTDOWN_TIMEOUT = 3
+# Longest the stream worker waits (seconds) for a new frame from the frame hub.
+STREAM_FRAME_WAIT_TIMEOUT = 0.1
+# Forward the camera's own JPEG bytes in single view instead of decoding and
+# re-encoding them. Multiview still transcodes, since it has to composite.
+STREAM_MJPEG_PASSTHROUGH = True
 
 # ---- Network Configuration ----
 
@@ -442,6 +451,7 @@ WEB_UI_HTML = """
             display: block;
             background: #000;
             min-height: 150px;
+            touch-action: none;  /* pinch and drag zoom the camera, not the page */
         }
         .btn-grid {
             display: grid; gap: 10px;
@@ -469,6 +479,7 @@ WEB_UI_HTML = """
 
     <div class="video-section">
         <img src="/video_feed" alt="Camera Feed" onerror="this.style.opacity='0.3'">
+        <div class="status">Pinch to zoom, drag to pan, double tap to zoom in/out</div>
     </div>
 
     <div class="section">
@@ -478,6 +489,8 @@ WEB_UI_HTML = """
             <button onclick="sendCmd('camera', '2')">Glow</button>
             <button onclick="sendCmd('camera', '3')">Brevity</button>
             <button onclick="sendCmd('camera', '0')">Multi</button>
+            <button onclick="sendCmd('camera', '4')">All</button>
+            <button onclick="sendCmd('camera', 'l')">Layout</button>
         </div>
     </div>
 
@@ -531,6 +544,99 @@ WEB_UI_HTML = """
                 document.getElementById('status').textContent = 'Ready';
             }, 1500);
         }
+
+        // ---- Pinch/drag zoom on the video ----
+        const video = document.querySelector('.video-section img');
+        let pinchDist = null, dragPos = null, lastTap = 0;
+        let zoomBusy = false, zoomQueued = null;
+
+        // Touch position as fractions of the video image
+        function relPos(x, y) {
+            const r = video.getBoundingClientRect();
+            return {x: (x - r.left) / r.width, y: (y - r.top) / r.height};
+        }
+
+        function touchDist(t) {
+            return Math.hypot(t[0].clientX - t[1].clientX, t[0].clientY - t[1].clientY);
+        }
+
+        function mergeZoom(a, b) {
+            if (!a || a.action !== b.action) return b;
+            if (b.action === 'zoom') return {...b, factor: a.factor * b.factor};
+            if (b.action === 'pan') return {...b, dx: a.dx + b.dx, dy: a.dy + b.dy};
+            return b;
+        }
+
+        // One request in flight at a time; moves made meanwhile are merged into the next one
+        async function sendZoom(cmd) {
+            if (zoomBusy) {
+                zoomQueued = mergeZoom(zoomQueued, cmd);
+                return;
+            }
+            zoomBusy = true;
+            try {
+                const res = await fetch('/api/zoom', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify(cmd)
+                });
+                const data = await res.json();
+                document.getElementById('status').textContent = data.status || 'OK';
+            } catch(e) {
+                document.getElementById('status').textContent = 'Error: ' + e.message;
+            }
+            zoomBusy = false;
+            if (zoomQueued) {
+                const next = zoomQueued;
+                zoomQueued = null;
+                sendZoom(next);
+            }
+        }
+
+        video.addEventListener('touchstart', e => {
+            e.preventDefault();
+            if (e.touches.length === 2) {
+                pinchDist = touchDist(e.touches);
+                dragPos = null;
+            } else if (e.touches.length === 1) {
+                const t = e.touches[0];
+                dragPos = relPos(t.clientX, t.clientY);
+                const now = Date.now();
+                if (now - lastTap < 300) sendZoom({action: 'toggle', ...dragPos});
+                lastTap = now;
+            }
+        }, {passive: false});
+
+        video.addEventListener('touchmove', e => {
+            e.preventDefault();
+            if (e.touches.length === 2 && pinchDist) {
+                const dist = touchDist(e.touches);
+                if (Math.abs(dist / pinchDist - 1) < 0.05) return;
+                const mid = relPos((e.touches[0].clientX + e.touches[1].clientX) / 2,
+                                   (e.touches[0].clientY + e.touches[1].clientY) / 2);
+                sendZoom({action: 'zoom', factor: dist / pinchDist, ...mid});
+                pinchDist = dist;
+            } else if (e.touches.length === 1 && dragPos) {
+                const p = relPos(e.touches[0].clientX, e.touches[0].clientY);
+                // The image follows the finger, so the view moves the other way
+                sendZoom({action: 'pan', dx: dragPos.x - p.x, dy: dragPos.y - p.y, ...dragPos});
+                dragPos = p;
+            }
+        }, {passive: false});
+
+        video.addEventListener('touchend', e => {
+            if (e.touches.length < 2) pinchDist = null;
+            if (e.touches.length === 0) dragPos = null;
+        });
+
+        video.addEventListener('dblclick', e => {
+            sendZoom({action: 'toggle', ...relPos(e.clientX, e.clientY)});
+        });
+
+        video.addEventListener('wheel', e => {
+            e.preventDefault();
+            sendZoom({action: 'zoom', factor: e.deltaY < 0 ? 1.25 : 0.8, ...relPos(e.clientX, e.clientY)});
+        }, {passive: false});
     </script>
 </body>
 </html>
@@ -539,19 +645,30 @@ WEB_UI_HTML = """
 
 # ---- MJPEG Streaming ----
 
+# Shared read-only black tile for missing cameras (avoids a fresh np.zeros per frame)
+_BLANK_TILE = np.zeros((240, 320, 3), dtype=np.uint8)
+
 def _open_camera(path):
-    """Open a camera at the given path and configure it."""
-    cap = cv2.VideoCapture(path, cv2.CAP_V4L2)
-    if cap.isOpened():
-        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-        cap.set(cv2.CAP_PROP_FPS, 30)
-    return cap
+    """Open a camera at the given path and configure it (MJPG at 30fps, default backend)."""
+    return open_capture(path)
+
 
+def _make_side_by_side(frames, target_h=240, target_w=320, views=None):
+    """Compose a list of frames side by side into a single image.
 
-def _make_side_by_side(frames, target_h=240, target_w=320):
-    """Compose a list of frames side by side into a single image."""
+    Entries may also be ``FramePyramid`` objects from the frame hub, in which
+    case the smallest level at least ``target_h`` tall is used. ``views``
+    gives each frame's zoomed (x0, y0, x1, y1) region (None: the whole frame),
+    cropped out before the resize.
+    """
     resized = []
-    for f in frames:
+    for i, f in enumerate(frames):
+        view = views[i] if views else None
+        if hasattr(f, 'for_size'):
+            # A zoomed view needs target_h rows across the region, not the frame
+            f = f.for_size(0, target_h if view is None else int(np.ceil(target_h / (view[3] - view[1]))))
+        if view is not None:
+            f = crop_view(f, view)
         h, w = f.shape[:2]
         if h == 0 or w == 0:
             resized.append(np.zeros((target_h, target_w, 3), dtype=np.uint8))
@@ -588,6 +705,14 @@ def create_web_app(remote_server):
             mimetype='multipart/x-mixed-replace; boundary=frame'
         )
 
+    @app.route('/api/latency')
+    def latency():
+        """Per-stage /video_feed latency percentiles in ms (empty unless measurement is on)."""
+        return jsonify({
+            'enabled': remote_server.stream_latency.enabled,
+            'stages': remote_server.stream_latency.percentiles(),
+        })
+
     @app.route('/api/camera_mode')
     def camera_mode():
         state = remote_server.get_display_state()
@@ -599,7 +724,7 @@ def create_web_app(remote_server):
         cmd_type = data.get('type')
         key = data.get('key')
 
-        if cmd_type == 'camera' and key in ['0', '1', '2', '3']:
+        if cmd_type == 'camera' and key in ['0', '1', '2', '3', '4', 'l']:
             remote_server.send_camera(key)
             return jsonify({"status": f"Camera → {key}"})
         elif cmd_type == 'fan' and key in list('asdfghjkzxcv'):
@@ -608,6 +733,33 @@ def create_web_app(remote_server):
         else:
             return jsonify({"status": "Unknown command"}), 400
 
+    @app.route('/api/zoom', methods=['POST'])
+    def zoom():
+        """Pinch, drag or double tap on the stream; ``x``/``y`` say where, as fractions of the image."""
+        data = request.get_json() or {}
+        action = data.get('action')
+        try:
+            x = min(max(float(data.get('x', 0.5)), 0.0), 1.0)
+            y = min(max(float(data.get('y', 0.5)), 0.0), 1.0)
+            target = remote_server.zoom_target(x, y)
+            if target is None:
+                return jsonify({"status": "Nothing to zoom"}), 400
+            zoom_state, anchor, columns = target
+            if action == 'zoom':
+                zoom_state.zoom_by(float(data.get('factor', 1.0)), anchor)
+            elif action == 'pan':
+                # Side by side, each camera is 1/columns of the image's width
+                zoom_state.pan_by(float(data.get('dx', 0.0)) * columns, float(data.get('dy', 0.0)))
+            elif action == 'toggle':
+                zoom_state.toggle(anchor)
+            elif action == 'reset':
+                zoom_state.reset()
+            else:
+                return jsonify({"status": "Unknown command"}), 400
+        except (TypeError, ValueError):
+            return jsonify({"status": "Bad zoom command"}), 400
+        return jsonify({"status": f"Zoom {zoom_state.zoom:.1f}x"})
+
     @app.route('/setup')
     def setup():
         return render_template_string(SETUP_HTML)
@@ -656,8 +808,9 @@ def create_web_app(remote_server):
 
 def _stream_generator(remote_server):
     """Yield MJPEG frames from the RemoteServer's shared frame buffer."""
+    last_jpeg = None
     while remote_server.is_running:
-        jpeg = remote_server.get_current_jpeg()
+        jpeg, capture_time, encoded_time = remote_server.get_current_frame()
         if jpeg is not None:
             yield (
                 b'--frame\r\n'
@@ -665,6 +818,12 @@ def _stream_generator(remote_server):
                 jpeg +
                 b'\r\n'
             )
+            # The generator resumes once the server has written the frame to this client
+            if jpeg is not last_jpeg and capture_time is not None:
+                remote_server.stream_latency.record_frame(capture_time, [
+                    ('encode', encoded_time), ('send', time.monotonic()),
+                ])
+            last_jpeg = jpeg
         else:
             time.sleep(0.033)
 
@@ -679,14 +838,25 @@ class RemoteServer:
     - ``'joined'``: Pi connects to an existing Wi-Fi network.
 
     ``smart_connect()`` automatically picks the best mode based on saved networks.
+
+    When ``frame_hub`` (a ``camera_engine.CaptureEngine``) is given, the stream
+    subscribes to it instead of opening the cameras itself, so the local
+    display keeps running while phones are watching.
+
+    ``zoom_states`` (camera key -> ``zoom.ZoomState``, shared with the local
+    display) lets phones pinch and drag the stream to zoom and pan a camera;
+    the stream shows the zoomed region too.
     """
 
     def __init__(self, send_camera_fn, send_fan_fn, camera_paths=None,
                  stop_display_fn=None, resume_display_fn=None,
-                 get_display_state_fn=None, port=8080):
+                 get_display_state_fn=None, port=8080, frame_hub=None,
+                 zoom_states=None):
         self.send_camera = send_camera_fn
         self.send_fan = send_fan_fn
         self.camera_paths = camera_paths or {}
+        self.frame_hub = frame_hub
+        self.zoom_states = zoom_states or {}
         self.stop_display_fn = stop_display_fn
         self.resume_display_fn = resume_display_fn
         self._get_display_state = get_display_state_fn or (lambda: {'mode': None, 'cam_keys': None})
@@ -697,7 +867,12 @@ class RemoteServer:
         self._active_network_name = None  # e.g. 'Dogmobile' | 'Home' | None
         self._streaming_active = threading.Event()
         self._current_jpeg = None
+        # Capture time of the oldest frame in the current JPEG and when it was encoded (monotonic)
+        self._current_capture_time = None
+        self._current_encoded_time = None
         self._jpeg_lock = threading.Lock()
+        # Capture-to-socket latency of /video_feed, by stage (enable latency.LATENCY_MEASUREMENT)
+        self.stream_latency = LatencyRecorder('stream')
         self._stream_thread = None
         self._server_thread = None
         self._app = None
@@ -724,18 +899,57 @@ class RemoteServer:
         """Return current display state dict: {'mode': ..., 'cam_keys': ...}."""
         return self._get_display_state()
 
+    def _streamed_keys(self):
+        """Cameras in the stream, left to right."""
+        state = self._get_display_state()
+        mode = state.get('mode')
+        if mode in ('1', '2', '3'):
+            return (mode,)
+        if mode == 'multi':
+            return tuple(state.get('cam_keys') or [])
+        return ()
+
+    def zoom_target(self, x, y):
+        """The camera shown at (``x``, ``y``) of the streamed image, as fractions of it.
+
+        Returns ``(zoom state, (x, y) within that camera's view, cameras side
+        by side)``, or None when no zoomable camera is there.
+        """
+        keys = self._streamed_keys()
+        if not keys:
+            return None
+        i = min(int(x * len(keys)), len(keys) - 1)
+        zoom_state = self.zoom_states.get(keys[i])
+        if zoom_state is None:
+            return None
+        return zoom_state, (x * len(keys) - i, y), len(keys)
+
+    def _zoom_views(self, keys):
+        """Zoomed (x0, y0, x1, y1) region per camera in ``keys`` (None: the whole frame)."""
+        views = []
+        for k in keys:
+            zoom_state = self.zoom_states.get(k)
+            views.append(zoom_state.snapshot()[1] if zoom_state is not None and zoom_state.is_zoomed else None)
+        return views
+
     def get_current_jpeg(self):
         """Return the latest JPEG bytes, or None if not available."""
         with self._jpeg_lock:
             return self._current_jpeg
 
+    def get_current_frame(self):
+        """Return ``(jpeg, capture_time, encoded_time)`` for the latest JPEG (times may be None)."""
+        with self._jpeg_lock:
+            return self._current_jpeg, self._current_capture_time, self._current_encoded_time
+
     # ---- Internal helpers ----
 
     def _start_server_components(self):
         """Start the background camera worker and the Flask daemon thread."""
         self._streaming_active.set()
+        worker = self._hub_worker if self.frame_hub is not None else self._camera_worker
         self._stream_thread = threading.Thread(
-            target=self._camera_worker, daemon=True, name="MJPEGCameraWorker"
+            target=worker, daemon=True, name="MJPEGCameraWorker"
         )
         self._stream_thread.start()
 
@@ -805,6 +1019,89 @@ class RemoteServer:
             with self._jpeg_lock:
                 self._current_jpeg = None
 
+    def _hub_worker(self):
+        """Background thread: takes the newest frames from the shared frame hub and encodes them."""
+        subscription = None
+        last_keys = None
+        last_seqs = ()
+        passthrough = False
+
+        try:
+            while self._streaming_active.is_set():
+                mode = self._get_display_state().get('mode')
+                keys = self._streamed_keys()
+
+                # Detect mode/camera change
+                if keys != last_keys:
+                    if subscription is not None:
+                        self.frame_hub.unsubscribe(subscription)
+                        subscription = None
+                    if keys:
+                        # Multiview thumbnails are 320x240; single view is sent at full size,
+                        # straight from the camera's MJPEG when passthrough is on
+                        passthrough = STREAM_MJPEG_PASSTHROUGH and mode != 'multi'
+                        tile_size = (320, 240) if mode == 'multi' else None
+                        subscription = self.frame_hub.subscribe(keys, tile_size, want_jpeg=passthrough)
+                    last_keys = keys
+                    last_seqs = (0,) * len(keys)
+
+                if not keys:
+                    jpeg = self._capture_jpeg({}, mode, keys)
+                    capture_time = None
+                    time.sleep(STREAM_FRAME_WAIT_TIMEOUT)
+                else:
+                    seqs = self.frame_hub.wait_for_new_frame(keys, last_seqs, STREAM_FRAME_WAIT_TIMEOUT)
+                    if seqs == last_seqs:
+                        continue  # Nothing new to encode
+                    last_seqs = seqs
+                    jpeg = None
+                    capture_time = None
+                    views = self._zoom_views(keys)
+                    if passthrough and views[0] is None:
+                        raw, _, capture_time = self.frame_hub.latest_jpeg(keys[0])
+                        if raw is not None:
+                            jpeg = ensure_huffman_tables(raw)
+                    if jpeg is None:
+                        # Compositing needed, or the camera isn't delivering raw MJPEG
+                        latest = [self.frame_hub.latest_pyramid(k) for k in keys]
+                        frames = [pyramid for pyramid, _, _ in latest]
+                        capture_times = [ts for _, _, ts in latest if ts is not None]
+                        capture_time = min(capture_times) if capture_times else None
+                        jpeg = self._encode_frames(frames, mode, views)
+
+                if jpeg is not None:
+                    with self._jpeg_lock:
+                        self._current_jpeg = jpeg
+                        self._current_capture_time = capture_time
+                        self._current_encoded_time = time.monotonic()
+                else:
+                    time.sleep(0.033)
+
+        finally:
+            if subscription is not None:
+                self.frame_hub.unsubscribe(subscription)
+            with self._jpeg_lock:
+                self._current_jpeg = None
+
+    def _encode_frames(self, frames, mode, views=None):
+        """Encode one frame (single view) or a side-by-side composite (multi) to JPEG bytes.
+
+        ``frames`` are ``FramePyramid`` objects (or None) from the frame hub;
+        ``views`` their zoomed regions (see ``_zoom_views()``).
+        """
+        if mode == 'multi':
+            frames = [f if f is not None else _BLANK_TILE for f in frames]
+            frame = _make_side_by_side(frames, views=views)
+        else:
+            if frames[0] is None:
+                return None
+            frame = frames[0].base
+            if views and views[0] is not None:
+                # Just the zoomed region, at the camera's resolution; the phone scales it up
+                frame = crop_view(frame, views[0])
+        ret, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
+        return buf.tobytes() if ret else None
+
     def _capture_jpeg(self, caps, mode, cam_keys):
         """Read a frame (or composite) and return JPEG bytes, or None on failure."""
         if not caps:
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+# Label look: white text on a half-transparent black box.
+HUD_FONT = cv2.FONT_HERSHEY_SIMPLEX
+HUD_FONT_SCALE = 0.5
+HUD_THICKNESS = 1
+HUD_TEXT_COLOR = (255, 255, 255)
+HUD_BOX_ALPHA = 0.5
+HUD_PADDING = 4
+# Gap (pixels) between a label and the tile or screen edge it is anchored to.
+HUD_MARGIN = 8
+
+ANCHOR_LEFT = 'left'
+ANCHOR_RIGHT = 'right'
+
+
+class Sprite:
+    """One rendered text label, ready to alpha-blend into a canvas.
+
+    The BGRA rendering is kept split into premultiplied color and inverse
+    alpha (float32), plus scratch buffers, so blending is three in-place
+    numpy operations with no allocation.
+    """
+
+    def __init__(self, text, color=HUD_TEXT_COLOR, scale=HUD_FONT_SCALE):
+        self.text = text
+        self.color = color
+        (text_w, text_h), baseline = cv2.getTextSize(text, HUD_FONT, scale, HUD_THICKNESS)
+        w, h = text_w + 2 * HUD_PADDING, text_h + baseline + 2 * HUD_PADDING
+        bgra = np.zeros((h, w, 4), dtype=np.uint8)
+        bgra[:, :, 3] = int(255 * HUD_BOX_ALPHA)
+        cv2.putText(bgra, text, (HUD_PADDING, HUD_PADDING + text_h), HUD_FONT, scale,
+                    (*color, 255), HUD_THICKNESS, cv2.LINE_AA)
+        self.bgra = bgra
+
+        alpha = bgra[:, :, 3:].astype(np.float32) / 255
+        self._premultiplied = bgra[:, :, :3] * alpha
+        self._inverse_alpha = 1 - alpha
+        self._scratch = np.empty((h, w, 3), dtype=np.float32)
+        self._saved = np.empty((h, w, 3), dtype=np.uint8)
+
+    @property
+    def size(self):
+        return self.bgra.shape[1], self.bgra.shape[0]
+
+    def blend(self, region):
+        """Blend over ``region`` (a canvas slice, at most the sprite's size), saving what was there."""
+        h, w = region.shape[:2]
+        np.copyto(self._saved[:h, :w], region)
+        np.multiply(region, self._inverse_alpha[:h, :w], out=self._scratch[:h, :w])
+        self._scratch[:h, :w] += self._premultiplied[:h, :w]
+        np.copyto(region, self._scratch[:h, :w], casting='unsafe')
+
+    def restore(self, region):
+        """Put back what ``blend()`` drew over."""
+        h, w = region.shape[:2]
+        np.copyto(region, self._saved[:h, :w])
+
+
+class Hud:
+    """Heads-up display drawn into the composite instead of separate windows.
+
+    Each label lives in a named slot at a fixed position; ``set()`` only
+    re-renders a slot's sprite when its text changes, so a steady HUD costs
+    one small alpha blend per label per frame.
+
+    ``draw()`` blends the labels into the canvas just before it is shown
+    and ``erase()`` restores the pixels underneath straight after, so the
+    compositor's canvases stay clean and its tile reuse is unaffected.
+    """
+
+    def __init__(self):
+        self._slots = {}  # slot -> (sprite, x, y, anchor)
+        self._drawn = []  # (sprite, region) blended by the last draw()
+        self._last_rects = []
+
+    def set(self, slot, text, x, y, anchor=ANCHOR_LEFT, color=HUD_TEXT_COLOR):
+        """Show ``text`` in ``slot`` with its top ``anchor`` corner at (``x``, ``y``)."""
+        current = self._slots.get(slot)
+        sprite = current[0] if current is not None else None
+        if sprite is None or sprite.text != text or sprite.color != color:
+            sprite = Sprite(text, color)
+        self._slots[slot] = (sprite, x, y, anchor)
+
+    def remove(self, slot):
+        self._slots.pop(slot, None)
+
+    def draw(self, canvas):
+        """Blend every label into ``canvas``.
+
+        Returns the ``(x, y, w, h)`` rects drawn over now and by the previous
+        ``draw()``, i.e. where the screen can differ from the last canvas
+        shown even if no tile underneath changed.
+        """
+        rects = []
+        height, width = canvas.shape[:2]
+        for sprite, x, y, anchor in self._slots.values():
+            w, h = sprite.size
+            if anchor == ANCHOR_RIGHT:
+                x -= w
+            if x < 0 or y < 0 or x >= width or y >= height:
+                continue
+            # Clipped at the right and bottom edges
+            region = canvas[y:y + h, x:x + w]
+            sprite.blend(region)
+            self._drawn.append((sprite, region))
+            rects.append((x, y, region.shape[1], region.shape[0]))
+        changed = rects + [r for r in self._last_rects if r not in rects]
+        self._last_rects = rects
+        return changed
+
+    def erase(self):
+        """Undo the last ``draw()`` (labels may overlap, so in reverse order)."""
+        for sprite, region in reversed(self._drawn):
+            sprite.restore(region)
+        self._drawn = []
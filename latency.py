@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+import numpy as np
+
+# Turn on to record per-stage latency for the local display and the web
+# stream. Recording is a deque append per stage; percentiles are only
+# computed when a report is asked for.
+LATENCY_MEASUREMENT = False
+# Samples kept per stage (~20 seconds at 30fps).
+LATENCY_WINDOW = 600
+REPORT_PERCENTILES = (50, 90, 99)
+
+
+class LatencyRecorder:
+    """Rolling per-stage latency samples for one output path (display or stream).
+
+    Timestamps are ``time.monotonic()`` seconds, the same clock as the
+    kernel V4L2 buffer timestamps the capture engine publishes frames with,
+    so ``record_frame()`` can measure from the moment the sensor delivered
+    the frame to the moment it reached the glass (or the socket).
+    """
+
+    def __init__(self, name, enabled=None, window=LATENCY_WINDOW):
+        self.name = name
+        self.enabled = LATENCY_MEASUREMENT if enabled is None else enabled
+        self._window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # stage -> deque of seconds, in first-recorded order
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self._window)
+            samples.append(seconds)
+
+    def record_frame(self, capture_time, marks):
+        """Record one frame's journey.
+
+        ``marks`` is a list of ``(stage, monotonic time the stage finished)``
+        in pipeline order; each stage is timed from the previous mark (the
+        first from ``capture_time``), and ``total`` covers the whole path.
+        """
+        if not self.enabled or capture_time is None or not marks:
+            return
+        previous = capture_time
+        for stage, t in marks:
+            self.record(stage, t - previous)
+            previous = t
+        self.record('total', previous - capture_time)
+
+    def percentiles(self):
+        """Return ``{stage: {percentile: milliseconds}}`` over the current window."""
+        with self._lock:
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items()}
+        return {
+            stage: {p: float(np.percentile(values, p)) * 1000 for p in REPORT_PERCENTILES}
+            for stage, values in snapshot.items() if values
+        }
+
+    def report(self):
+        """One-line summary, e.g. ``display latency: total p50=41.2 p90=48.0 p99=63.5 ms; ...``."""
+        parts = []
+        for stage, pcts in self.percentiles().items():
+            values = " ".join(f"p{p}={ms:.1f}" for p, ms in pcts.items())
+            parts.append(f"{stage} {values} ms")
+        return f"{self.name} latency: " + ("; ".join(parts) if parts else "no samples")
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
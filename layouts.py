@@ -0,0 +1,127 @@
+from functools import lru_cache
+from compositor import Tile, FIT_FILL, FIT_FIT
+
+# ---- Layout Names ----
+
+LAYOUT_SINGLE = 'single'   # one camera, fit to screen
+LAYOUT_2UP = '2up'         # two cameras side by side
+LAYOUT_3UP = '3up'         # three cameras in vertical strips
+LAYOUT_GRID = '2x2'        # up to four cameras in a 2x2 grid
+LAYOUT_PIP = 'pip'         # first camera full screen, the rest as insets
+LAYOUT_PANORAMA = 'panorama'  # overlapping cameras stitched into one view (see panorama.py)
+
+# Layout used when none is requested, by number of cameras
+DEFAULT_LAYOUTS = {1: LAYOUT_SINGLE, 2: LAYOUT_2UP, 3: LAYOUT_3UP, 4: LAYOUT_GRID}
+
+# Order the 'l' hotkey cycles through, by number of cameras
+LAYOUT_CYCLE = {
+    2: [LAYOUT_2UP, LAYOUT_PIP],
+    3: [LAYOUT_3UP, LAYOUT_GRID, LAYOUT_PIP],
+}
+
+# Picture-in-picture inset size (fraction of the screen) and margin (pixels)
+PIP_INSET_SCALE = 0.3
+PIP_MARGIN = 16
+
+
+# ---- Tile Builders ----
+# Each builder returns the tiles for ``count`` cameras on a width x height screen.
+
+def _single(width, height, count):
+    return [Tile(0, 0, width, height, FIT_FIT)]
+
+
+def _strips(width, height, count):
+    # Equal vertical strips; the last strip absorbs any rounding remainder
+    strip_w = width // count
+    return [
+        Tile(i * strip_w, 0, strip_w if i < count - 1 else width - i * strip_w, height, FIT_FILL)
+        for i in range(count)
+    ]
+
+
+def _grid(width, height, count):
+    half_w, half_h = width // 2, height // 2
+    cells = [
+        Tile(0, 0, half_w, half_h, FIT_FILL),
+        Tile(half_w, 0, width - half_w, half_h, FIT_FILL),
+        Tile(0, half_h, half_w, height - half_h, FIT_FILL),
+        Tile(half_w, half_h, width - half_w, height - half_h, FIT_FILL),
+    ]
+    return cells[:count]
+
+
+def _pip(width, height, count):
+    # Insets are stacked up the right edge, bottom first, and drawn after the main view
+    inset_w = int(width * PIP_INSET_SCALE)
+    inset_h = int(height * PIP_INSET_SCALE)
+    tiles = [Tile(0, 0, width, height, FIT_FILL)]
+    for i in range(count - 1):
+        y = height - PIP_MARGIN - (i + 1) * inset_h - i * PIP_MARGIN
+        tiles.append(Tile(width - PIP_MARGIN - inset_w, max(0, y), inset_w, inset_h, FIT_FILL))
+    return tiles
+
+
+def _panorama(width, height, count):
+    # Stand-in only: the panorama compositor places each camera where its calibration puts it
+    return [Tile(0, 0, width, height, FIT_FILL) for _ in range(count)]
+
+
+_BUILDERS = {
+    LAYOUT_SINGLE: _single,
+    LAYOUT_2UP: _strips,
+    LAYOUT_3UP: _strips,
+    LAYOUT_GRID: _grid,
+    LAYOUT_PIP: _pip,
+    LAYOUT_PANORAMA: _panorama,
+}
+
+# Custom tile maps registered at runtime: name -> list of fractional
+# (x, y, w, h, fit) rectangles, with x/y/w/h in 0..1 of the screen size.
+_CUSTOM_LAYOUTS = {}
+
+
+def register_layout(name, rects):
+    """Register a custom tile map, e.g. ``[(0, 0, 0.75, 1, 'fill'), (0.75, 0, 0.25, 0.5, 'fill')]``."""
+    _CUSTOM_LAYOUTS[name] = tuple(tuple(r) for r in rects)
+    compile_layout.cache_clear()
+
+
+def available_layouts():
+    return list(_BUILDERS) + list(_CUSTOM_LAYOUTS)
+
+
+# ---- Compilation ----
+
+@lru_cache(maxsize=None)
+def compile_layout(layout, width, height, count):
+    """Return the tuple of ``Tile`` ROIs for ``count`` cameras in ``layout``.
+
+    Compiled once per (layout, screen size, camera count); switching layouts
+    afterwards is a dictionary lookup, and per-frame cost is only the
+    per-tile resize done by the compositor.
+    """
+    if layout in _CUSTOM_LAYOUTS:
+        rects = _CUSTOM_LAYOUTS[layout][:count]
+        return tuple(
+            Tile(int(x * width), int(y * height), int(w * width), int(h * height), fit)
+            for x, y, w, h, fit in rects
+        )
+    builder = _BUILDERS.get(layout)
+    if builder is None:
+        raise ValueError(f"Unknown layout: {layout}")
+    return tuple(builder(width, height, count))
+
+
+def default_layout(count):
+    return DEFAULT_LAYOUTS.get(count, LAYOUT_GRID)
+
+
+def next_layout(current, count):
+    """Return the layout after ``current`` in the cycle for ``count`` cameras."""
+    cycle = LAYOUT_CYCLE.get(count)
+    if not cycle:
+        return default_layout(count)
+    if current not in cycle:
+        return cycle[0]
+    return cycle[(cycle.index(current) + 1) % len(cycle)]
@@ -0,0 +1,142 @@
+import cv2
+
+# ---- Reduced-Resolution Decode ----
+
+# JPEG decoders can scale by 1/2, 1/4 or 1/8 in the DCT domain, which skips
+# most of the IDCT and colour-conversion work instead of decoding full size
+# and throwing pixels away in a later resize.
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def merge_required_sizes(sizes):
+    """Combine the tile sizes subscribers asked for into one requirement.
+
+    ``None`` means "full resolution" and wins over everything else;
+    otherwise the result is the component-wise maximum.
+    """
+    if any(s is None for s in sizes):
+        return None
+    if not sizes:
+        return (0, 0)
+    return max(s[0] for s in sizes), max(s[1] for s in sizes)
+
+
+def pick_reduction(sensor_w, sensor_h, required):
+    """Largest decode scale factor (1, 2, 4 or 8) that still fills ``required``.
+
+    ``required`` is the largest tile (w, h) any consumer draws this camera
+    into; tiles are assumed to be filled (cropped), which needs the most
+    pixels. ``None`` forces a full-resolution decode.
+    """
+    if required is None or not sensor_w or not sensor_h:
+        return 1
+    tile_w, tile_h = required
+    scale = max(tile_w / sensor_w, tile_h / sensor_h)
+    for factor in (8, 4, 2):
+        if scale * factor <= 1:
+            return factor
+    return 1
+
+
+def is_raw_jpeg(buf):
+    """True if ``buf`` is an undecoded JPEG byte buffer (as returned with CAP_PROP_CONVERT_RGB off)."""
+    return buf is not None and buf.ndim <= 2 and buf.size >= 2 and buf.reshape(-1)[0] == 0xFF and buf.reshape(-1)[1] == 0xD8
+
+
+def decode_reduced(buf, factor):
+    """Decode a raw JPEG buffer at 1/``factor`` scale; returns None on a corrupt frame."""
+    frame = cv2.imdecode(buf.reshape(-1), REDUCED_DECODE_FLAGS[factor])
+    if frame is None or frame.size == 0:
+        return None
+    return frame
+
+
+# ---- Passthrough Fixups ----
+
+# Many UVC webcams send "AVI1" style MJPEG frames without a DHT (Huffman
+# table) segment and rely on the decoder assuming the standard tables from
+# the JPEG spec (ITU T.81, Annex K.3). Browsers don't, so those tables are
+# inserted before forwarding camera JPEGs untouched to web clients.
+
+_DC_LUMINANCE_BITS = [0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+_DC_CHROMINANCE_BITS = [0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0]
+_DC_VALUES = list(range(12))
+
+_AC_LUMINANCE_BITS = [0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7d]
+_AC_LUMINANCE_VALUES = [
+    0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12, 0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07,
+    0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xa1, 0x08, 0x23, 0x42, 0xb1, 0xc1, 0x15, 0x52, 0xd1, 0xf0,
+    0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0a, 0x16, 0x17, 0x18, 0x19, 0x1a, 0x25, 0x26, 0x27, 0x28,
+    0x29, 0x2a, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49,
+    0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69,
+    0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89,
+    0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5, 0xa6, 0xa7,
+    0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3, 0xc4, 0xc5,
+    0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda, 0xe1, 0xe2,
+    0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf1, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa,
+]
+
+_AC_CHROMINANCE_BITS = [0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77]
+_AC_CHROMINANCE_VALUES = [
+    0x00, 0x01, 0x02, 0x03, 0x11, 0x04, 0x05, 0x21, 0x31, 0x06, 0x12, 0x41, 0x51, 0x07, 0x61, 0x71,
+    0x13, 0x22, 0x32, 0x81, 0x08, 0x14, 0x42, 0x91, 0xa1, 0xb1, 0xc1, 0x09, 0x23, 0x33, 0x52, 0xf0,
+    0x15, 0x62, 0x72, 0xd1, 0x0a, 0x16, 0x24, 0x34, 0xe1, 0x25, 0xf1, 0x17, 0x18, 0x19, 0x1a, 0x26,
+    0x27, 0x28, 0x29, 0x2a, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48,
+    0x49, 0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68,
+    0x69, 0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87,
+    0x88, 0x89, 0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5,
+    0xa6, 0xa7, 0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3,
+    0xc4, 0xc5, 0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda,
+    0xe2, 0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa,
+]
+
+
+def _build_dht_segment():
+    # One DHT marker segment carrying all four tables: (class << 4 | id, bits, values)
+    tables = [
+        (0x00, _DC_LUMINANCE_BITS, _DC_VALUES),
+        (0x10, _AC_LUMINANCE_BITS, _AC_LUMINANCE_VALUES),
+        (0x01, _DC_CHROMINANCE_BITS, _DC_VALUES),
+        (0x11, _AC_CHROMINANCE_BITS, _AC_CHROMINANCE_VALUES),
+    ]
+    body = b''.join(bytes([tc_th]) + bytes(bits) + bytes(values) for tc_th, bits, values in tables)
+    return b'\xff\xc4' + (len(body) + 2).to_bytes(2, 'big') + body
+
+
+STANDARD_DHT_SEGMENT = _build_dht_segment()
+
+_MARKER_DHT = 0xC4
+_MARKER_SOS = 0xDA
+
+
+def ensure_huffman_tables(jpeg):
+    """Return ``jpeg`` (bytes-like) with the standard DHT segment inserted if it has none.
+
+    Only the header (everything before the start-of-scan marker) is walked,
+    so this costs a handful of byte reads per frame. Frames that already
+    carry Huffman tables, or that don't parse as JPEG, are returned as-is.
+    """
+    data = bytes(jpeg)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return data
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return data  # Not a marker where one should be; leave the frame alone
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # Fill byte
+            continue
+        if marker == _MARKER_DHT:
+            return data
+        if marker == _MARKER_SOS:
+            return data[:pos] + STANDARD_DHT_SEGMENT + data[pos:]
+        pos += 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+    return data
@@ -0,0 +1,326 @@
+import argparse
+import json
+import logging
+import os
+import cv2
+import numpy as np
+from compositor import Compositor, Tile, FIT_FILL
+from frame_pyramid import level_for_size
+
+# ---- Calibration ----
+
+# Homographies of the cameras stitched into the panorama layout, from
+# ``python panorama.py KEY=SOURCE ...`` run against a calibration capture.
+PANORAMA_CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "panorama_calibration.json")
+# Feature matching for calibration: ORB keypoints per image, Lowe ratio
+# test, RANSAC reprojection threshold (pixels) and the fewest inliers
+# accepted as a real overlap rather than a coincidental match.
+ORB_FEATURES = 4000
+MATCH_RATIO = 0.75
+RANSAC_THRESHOLD = 4.0
+MIN_INLIERS = 20
+# Frames read and thrown away before the calibration frame, while auto exposure settles.
+CALIBRATION_WARMUP_FRAMES = 15
+
+logger = logging.getLogger("Panorama")
+
+
+def _pair_homography(image, reference):
+    """Homography taking ``image`` pixel coordinates onto the overlapping ``reference``."""
+    orb = cv2.ORB_create(ORB_FEATURES)
+    kp1, des1 = orb.detectAndCompute(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), None)
+    kp2, des2 = orb.detectAndCompute(cv2.cvtColor(reference, cv2.COLOR_BGR2GRAY), None)
+    if des1 is None or des2 is None:
+        raise ValueError("No features found; is the calibration scene textured and lit?")
+    matches = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(des1, des2, k=2)
+    good = [m[0] for m in matches if len(m) == 2 and m[0].distance < MATCH_RATIO * m[1].distance]
+    if len(good) < MIN_INLIERS:
+        raise ValueError(f"Only {len(good)} feature matches; do the cameras overlap?")
+    src = np.float32([kp1[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
+    dst = np.float32([kp2[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+    homography, inliers = cv2.findHomography(src, dst, cv2.RANSAC, RANSAC_THRESHOLD)
+    if homography is None or int(inliers.sum()) < MIN_INLIERS:
+        raise ValueError(f"Only {0 if inliers is None else int(inliers.sum())} consistent matches")
+    return homography
+
+
+def calibrate(images):
+    """Work out each camera's homography into the first camera's image plane.
+
+    ``images`` is an ordered ``{camera key: BGR frame}`` of one calibration
+    capture, left to right: each camera must overlap the one before it,
+    and homographies are chained through those neighbours.
+    """
+    keys = list(images)
+    homographies = {keys[0]: np.eye(3)}
+    for previous, key in zip(keys, keys[1:]):
+        to_previous = _pair_homography(images[key], images[previous])
+        homographies[key] = homographies[previous] @ to_previous
+        logger.info(f"Camera {key} -> {previous}: homography found")
+    return {
+        'cameras': {
+            k: {
+                'size': [images[k].shape[1], images[k].shape[0]],
+                'homography': (homographies[k] / homographies[k][2, 2]).tolist(),
+            }
+            for k in keys
+        }
+    }
+
+
+def load_calibration(path=PANORAMA_CALIBRATION_FILE):
+    """Return the saved calibration, or None if there isn't a (readable) one."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError as e:
+        logger.error(f"Ignoring malformed panorama calibration {path}: {str(e)}")
+        return None
+
+
+# ---- Warp and Blend Tables ----
+
+class PanoramaTables:
+    """Warp maps and feather weights for stitching ``keys`` onto a ``width`` x ``height`` screen.
+
+    The stitched extent of all cameras is scaled to fit the screen, so each
+    camera gets one output-to-source homography. It is expanded into
+    ``cv2.remap`` tables per source resolution; the ones for cameras
+    streaming at their calibration resolution, and the blend of all of
+    them, are built here, so showing the layout doesn't stall its first
+    frames on them. Others are built on first use. Blending is
+    feathered: each camera's weight is its output pixels' distance from
+    the edge of what it sees, and the alpha tables are those weights
+    normalized in drawing order, cropped to the camera's bounding box.
+    """
+
+    def __init__(self, calibration, keys, width, height):
+        cameras = calibration['cameras']
+        missing = [k for k in keys if k not in cameras]
+        if missing:
+            raise ValueError(f"Cameras {', '.join(missing)} are not in the panorama calibration")
+        self.keys = list(keys)
+        self.width = width
+        self.height = height
+        self._sizes = [tuple(cameras[k]['size']) for k in keys]
+        homographies = [np.array(cameras[k]['homography'], dtype=np.float64) for k in keys]
+
+        # Fit the stitched extent to the screen, centered
+        corners = np.concatenate([
+            cv2.perspectiveTransform(np.float64([[[0, 0]], [[w, 0]], [[w, h]], [[0, h]]]), H)
+            for (w, h), H in zip(self._sizes, homographies)
+        ])
+        (min_x, min_y), (max_x, max_y) = corners.min(axis=(0, 1)), corners.max(axis=(0, 1))
+        scale = min(width / (max_x - min_x), height / (max_y - min_y))
+        offset_x = (width - (max_x - min_x) * scale) / 2 - min_x * scale
+        offset_y = (height - (max_y - min_y) * scale) / 2 - min_y * scale
+        fit = np.array([[scale, 0, offset_x], [0, scale, offset_y], [0, 0, 1]])
+        self._to_screen = [fit @ H for H in homographies]
+
+        self._weights = []
+        self.tiles = []
+        for (w, h), A in zip(self._sizes, self._to_screen):
+            coverage = cv2.warpPerspective(np.full((h, w), 255, np.uint8), A, (width, height),
+                                           flags=cv2.INTER_NEAREST)
+            x, y, bw, bh = cv2.boundingRect(coverage)
+            self.tiles.append(Tile(x, y, bw, bh, FIT_FILL))
+            self._weights.append(cv2.distanceTransform(coverage, cv2.DIST_L2, 3))
+        self._maps = {}    # (index, src_w, src_h) -> full-screen (map1, map2)
+        self._alphas = {}  # tuple of drawn indexes -> {index: (alpha, 1 - alpha)} over its tile
+
+        for i, (w, h) in enumerate(self._sizes):
+            # The pyramid level PanoramaCompositor samples from a calibration-sized frame
+            n = level_for_size(w, h, *self.source_size(i))
+            self.maps(i, w >> n, h >> n)
+        self.alphas(range(len(self.keys)))
+
+    def source_size(self, index):
+        """Source resolution tile ``index`` needs so it isn't scaled down by more than 2x."""
+        w, h = self._sizes[index]
+        A = self._to_screen[index]
+        # Linear scale of the warp at the frame's center
+        jacobian = cv2.perspectiveTransform(np.float64([[[w / 2, h / 2]], [[w / 2 + 1, h / 2 + 1]]]), A)
+        scale = min(1.0, float(np.abs(jacobian[1, 0] - jacobian[0, 0]).max()))
+        return int(np.ceil(w * scale)), int(np.ceil(h * scale))
+
+    def maps(self, index, src_w, src_h):
+        """Full-screen ``(map1, map2)`` sampling a ``src_w`` x ``src_h`` frame of camera ``index``."""
+        key = (index, src_w, src_h)
+        maps = self._maps.get(key)
+        if maps is None:
+            calib_w, calib_h = self._sizes[index]
+            # Frame pixels -> calibration pixels -> screen, inverted to screen -> frame
+            to_screen = self._to_screen[index] @ np.diag([calib_w / src_w, calib_h / src_h, 1.0])
+            inverse = np.linalg.inv(to_screen)
+            xs, ys = np.meshgrid(np.arange(self.width, dtype=np.float64), np.arange(self.height, dtype=np.float64))
+            denom = inverse[2, 0] * xs + inverse[2, 1] * ys + inverse[2, 2]
+            map_x = (inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]) / denom
+            map_y = (inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]) / denom
+            maps = cv2.convertMaps(map_x.astype(np.float32), map_y.astype(np.float32), cv2.CV_16SC2)
+            self._maps[key] = maps
+        return maps
+
+    def alphas(self, drawn):
+        """Blend weights for the cameras in ``drawn`` (indexes, in drawing order), after the first.
+
+        Cameras that aren't streaming are left out of ``drawn``, so the
+        others fill their share of the overlap instead of fading to black.
+        """
+        drawn = tuple(drawn)
+        alphas = self._alphas.get(drawn)
+        if alphas is None:
+            alphas = {}
+            total = self._weights[drawn[0]].copy()
+            for i in drawn[1:]:
+                total += self._weights[i]
+                alpha = np.divide(self._weights[i], total, out=np.zeros_like(total), where=total > 0)
+                t = self.tiles[i]
+                alpha = np.ascontiguousarray(alpha[t.y:t.y + t.h, t.x:t.x + t.w])
+                alphas[i] = (alpha, 1 - alpha)
+            self._alphas[drawn] = alphas
+        return alphas
+
+
+# ---- Compositor ----
+
+class PanoramaCompositor(Compositor):
+    """Compositor for the panorama layout: cameras stitched into one view.
+
+    Placing a camera only records its frame; ``finish_frame()`` remaps the
+    first camera over the whole screen (black where nothing is seen), the
+    others into their bounding box, and feather-blends them on top. With a
+    pool, those remaps run in parallel and the blends follow in order.
+    Every camera is redrawn on each composite, since a blend can't be
+    taken back out of the canvas.
+    """
+
+    def __init__(self, tables, buffers=2, pool=None):
+        super().__init__(tables.width, tables.height, tables.tiles, buffers=buffers, pool=pool)
+        self.panorama = tables
+        self._scratch = [np.empty((t.h, t.w, 3), dtype=np.uint8) for t in self.tiles]
+        self._sources = {}  # tile index -> (src_w, src_h, source())
+
+    def max_tile_size(self):
+        sizes = [self.panorama.source_size(i) for i in range(len(self.tiles))]
+        return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+    def begin_frame(self):
+        self._sources = {}
+        return super().begin_frame()
+
+    def place(self, index, frame, seq=None):
+        if frame is not None:
+            self._sources[index] = (frame.shape[1], frame.shape[0], lambda: frame)
+
+    def place_pyramid(self, index, pyramid, seq=None):
+        if pyramid is not None:
+            n = pyramid.level_for_size(*self.panorama.source_size(index))
+            self._sources[index] = (*pyramid.level_size(n), lambda: pyramid.level(n))
+
+    def place_placeholder(self, index, label):
+        # A missing camera just leaves its share of the panorama to the others
+        pass
+
+    def set_transform(self, index, profile):
+        if profile is not None:
+            raise ValueError(
+                "The panorama can't correct its cameras: the stitching homographies were "
+                "calibrated on the uncorrected frames, so a transform would misalign them"
+            )
+
+    def finish_frame(self):
+        canvas = self.canvas
+        self._jobs = None
+        drawn = sorted(self._sources)
+        if not drawn:
+            canvas.fill(0)
+            self.dirty_tiles = list(range(len(self.tiles)))
+            return canvas
+
+        first = drawn[0]
+        src_w, src_h, source = self._sources[first]
+        map1, map2 = self.panorama.maps(first, src_w, src_h)
+        warps = [lambda source=source, map1=map1, map2=map2: cv2.remap(
+            source(), map1, map2, cv2.INTER_LINEAR, dst=canvas)]
+        blends = []
+        alphas = self.panorama.alphas(drawn)
+        for i in drawn[1:]:
+            src_w, src_h, source = self._sources[i]
+            t = self.tiles[i]
+            map1, map2 = self.panorama.maps(i, src_w, src_h)
+            tile_maps = (map1[t.y:t.y + t.h, t.x:t.x + t.w], map2[t.y:t.y + t.h, t.x:t.x + t.w])
+            scratch = self._scratch[i]
+            warps.append(lambda source=source, tile_maps=tile_maps, scratch=scratch: cv2.remap(
+                source(), *tile_maps, cv2.INTER_LINEAR, dst=scratch))
+            region = canvas[t.y:t.y + t.h, t.x:t.x + t.w]
+            alpha, inverse = alphas[i]
+            blends.append(lambda region=region, scratch=scratch, alpha=alpha, inverse=inverse: cv2.blendLinear(
+                region, scratch, inverse, alpha, dst=region))
+
+        if self.pool is not None:
+            self.pool.run([warps] + [[blend] for blend in blends])
+        else:
+            for job in warps + blends:
+                job()
+        self.dirty_tiles = list(range(len(self.tiles)))
+        self.tiles_drawn += len(drawn)
+        return canvas
+
+
+# ---- Calibration Capture ----
+
+def _read_source(source):
+    """One frame from an image file, or from a camera device after it settles."""
+    if os.path.isfile(source) and not source.startswith('/dev/'):
+        image = cv2.imread(source)
+        if image is None:
+            raise ValueError(f"Could not read image {source}")
+        return image
+    cap = cv2.VideoCapture(source, cv2.CAP_V4L2)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open camera {source}")
+        for _ in range(CALIBRATION_WARMUP_FRAMES):
+            cap.read()
+        ret, frame = cap.read()
+        if not ret:
+            raise ValueError(f"Could not read a frame from {source}")
+        return frame
+    finally:
+        cap.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Calibrate the panorama layout from one capture of overlapping cameras."
+    )
+    parser.add_argument('cameras', nargs='+', metavar='KEY=SOURCE',
+                        help="camera key and a device path or image file, left to right; "
+                             "each camera must overlap the previous one")
+    parser.add_argument('--output', default=PANORAMA_CALIBRATION_FILE, help="calibration file to write")
+    parser.add_argument('--preview', metavar='FILE', help="also write a stitched preview image")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
+
+    images = {}
+    for spec in args.cameras:
+        key, source = spec.split('=', 1)
+        images[key] = _read_source(source)
+    calibration = calibrate(images)
+    with open(args.output, 'w') as f:
+        json.dump(calibration, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.preview:
+        width = sum(image.shape[1] for image in images.values())
+        height = max(image.shape[0] for image in images.values())
+        compositor = PanoramaCompositor(PanoramaTables(calibration, list(images), width, height))
+        compositor.compose(list(images.values()))
+        cv2.imwrite(args.preview, compositor.canvas)
+        print(f"Wrote {args.preview}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import time
+from collections import deque
+import numpy as np
+
+# Display refresh rate (fps) used when none is given.
+DEFAULT_RENDER_FPS = 30
+# The last stretch (seconds) before a tick is spent polling the clock
+# instead of sleeping, since time.sleep() can overshoot by a millisecond or more.
+SPIN_MARGIN = 0.001
+# Samples kept for jitter statistics (~20 seconds at 30fps).
+JITTER_WINDOW = 600
+
+
+class RenderScheduler:
+    """Paces a render loop at a fixed tick rate.
+
+    ``wait_next_tick()`` sleeps until the next tick deadline; the loop then
+    recomposites only if something changed and calls ``presented()`` when
+    it actually put a frame on screen. Deadlines advance by exactly one
+    period so rounding never accumulates; if the loop falls more than a
+    period behind it resyncs to now and counts the missed ticks.
+
+    Jitter is how late each wake-up was relative to its deadline;
+    frame-interval jitter is the spread of the time between presented
+    frames.
+    """
+
+    def __init__(self, fps=DEFAULT_RENDER_FPS, window=JITTER_WINDOW):
+        self.fps = fps
+        self.period = 1.0 / fps
+        self._deadline = None
+        self._wake_lateness = deque(maxlen=window)
+        self._intervals = deque(maxlen=window)
+        self._last_presented = None
+        self.ticks = 0
+        self.presented_frames = 0
+        self.missed_ticks = 0
+
+    def set_rate(self, fps):
+        self.fps = fps
+        self.period = 1.0 / fps
+        self._deadline = None
+
+    def wait_next_tick(self):
+        """Sleep until the next tick; returns the wake-up time (``time.monotonic()``)."""
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now
+        else:
+            self._deadline += self.period
+            if now - self._deadline > self.period:
+                # Fell behind (slow composite, GC pause): skip ahead instead of bursting
+                missed = int((now - self._deadline) / self.period)
+                self.missed_ticks += missed
+                self._deadline += missed * self.period
+        remaining = self._deadline - time.monotonic()
+        if remaining > SPIN_MARGIN:
+            time.sleep(remaining - SPIN_MARGIN)
+        while time.monotonic() < self._deadline:
+            time.sleep(0)
+        woke = time.monotonic()
+        self._wake_lateness.append(woke - self._deadline)
+        self.ticks += 1
+        return woke
+
+    def presented(self, when=None):
+        """Record that a new frame was shown at ``when`` (default: now)."""
+        when = time.monotonic() if when is None else when
+        if self._last_presented is not None:
+            self._intervals.append(when - self._last_presented)
+        self._last_presented = when
+        self.presented_frames += 1
+
+    def stats(self):
+        """Jitter statistics in milliseconds, plus tick counters."""
+        lateness = np.array(self._wake_lateness) * 1000
+        intervals = np.array(self._intervals) * 1000
+        return {
+            'target_fps': self.fps,
+            'ticks': self.ticks,
+            'presented': self.presented_frames,
+            'missed_ticks': self.missed_ticks,
+            'wake_jitter_p50': float(np.percentile(lateness, 50)) if lateness.size else 0.0,
+            'wake_jitter_p99': float(np.percentile(lateness, 99)) if lateness.size else 0.0,
+            'wake_jitter_max': float(lateness.max()) if lateness.size else 0.0,
+            'frame_interval_mean': float(intervals.mean()) if intervals.size else 0.0,
+            'frame_interval_std': float(intervals.std()) if intervals.size else 0.0,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (
+            f"Render @{s['target_fps']}fps: {s['presented']}/{s['ticks']} ticks presented, "
+            f"{s['missed_ticks']} missed, wake jitter p50={s['wake_jitter_p50']:.2f}ms "
+            f"p99={s['wake_jitter_p99']:.2f}ms max={s['wake_jitter_max']:.2f}ms, "
+            f"frame interval {s['frame_interval_mean']:.1f}±{s['frame_interval_std']:.1f}ms"
+        )
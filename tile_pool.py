@@ -0,0 +1,65 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads tiles are drawn on, besides the display thread itself
+# (which draws one tile of every batch rather than idling at the barrier).
+TILE_POOL_WORKERS = 2
+
+logger = logging.getLogger("TilePool")
+
+
+def usable_cpus(cpus=None):
+    """How many CPUs tile workers could run on: ``cpus`` if given, else this process's affinity."""
+    if cpus:
+        return len(set(cpus))
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class TilePool:
+    """Small thread pool the compositor resizes and copies tiles on.
+
+    ``cv2.resize`` and numpy slice copies release the GIL, so tiles drawn on
+    separate threads really do run on separate cores. Work is handed over
+    as waves of callables: every job in a wave runs concurrently and the
+    next wave only starts once the whole wave is done, which is both the
+    join barrier before the canvas is shown and how overlapping tiles (PIP
+    insets) are kept drawing on top of what is underneath them.
+
+    ``cpus`` pins the worker threads to those CPU numbers (Linux only),
+    e.g. to keep them off the cores the camera reader threads run on.
+    """
+
+    def __init__(self, workers=TILE_POOL_WORKERS, cpus=None):
+        self.workers = workers
+        self.cpus = set(cpus) if cpus else None
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="TilePool", initializer=self._pin
+        )
+
+    def _pin(self):
+        if self.cpus is None:
+            return
+        if not hasattr(os, 'sched_setaffinity'):
+            logger.warning("CPU affinity is not supported on this platform; tile workers not pinned")
+            return
+        try:
+            # pid 0 is the calling thread, i.e. this worker
+            os.sched_setaffinity(0, self.cpus)
+        except OSError as e:
+            logger.warning(f"Could not pin tile worker to CPUs {sorted(self.cpus)}: {str(e)}")
+
+    def run(self, waves):
+        """Run each wave's jobs in parallel, one wave after the other; re-raises a job's exception."""
+        for wave in waves:
+            futures = [self._executor.submit(job) for job in wave[1:]]
+            try:
+                wave[0]()
+            finally:
+                for future in futures:
+                    future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,201 @@
+import argparse
+import json
+import re
+from collections import namedtuple
+from camera_probe import CameraMode, CapabilityCache, choose_mode, PREFERRED_FOURCCS, TARGET_FPS
+
+# ---- Bandwidth Model ----
+
+# USB 2.0 high-speed link rate (bits/s). Every hub upstream link and the
+# controller's root port carry this at most.
+HIGH_SPEED_BPS = 480_000_000
+# Share of a high-speed link the spec lets periodic (isochronous) transfers
+# reserve: 80% of each microframe.
+PERIODIC_SHARE = 0.8
+# UVC cameras reserve isochronous bandwidth by payload size, not by actual
+# data. YUYV reserves its full 16 bits/pixel; for MJPG most cameras reserve
+# roughly a quarter of that, whatever the scene compresses to.
+BITS_PER_PIXEL = {'YUYV': 16, 'MJPG': 4}
+DEFAULT_BITS_PER_PIXEL = 16
+
+# "usb-0:1.1.4:1.0" -> bus "0", port chain "1.1.4"
+_BY_PATH_RE = re.compile(r"^(?P<controller>.*?)-usb-(?P<bus>\d+):(?P<ports>[\d.]+):[\d.]+-video-index\d+$")
+
+
+def mode_bandwidth(mode):
+    """Estimated isochronous bandwidth (bits/s) ``mode`` reserves on the bus."""
+    bpp = BITS_PER_PIXEL.get(mode.fourcc, DEFAULT_BITS_PER_PIXEL)
+    return mode.width * mode.height * bpp * mode.fps
+
+
+def link_budget():
+    """Periodic bandwidth (bits/s) one high-speed link can carry."""
+    return HIGH_SPEED_BPS * PERIODIC_SHARE
+
+
+# ---- Topology ----
+
+def parse_by_path(path):
+    """Return the shared links a ``/dev/v4l/by-path`` camera sits behind.
+
+    Each link is named by controller, bus and port prefix, so
+    ``...-usb-0:1.1.4:1.0-video-index0`` is behind ``usb-0:1`` (the root
+    port), then ``usb-0:1.1`` (the hub on it); the camera's own port is
+    not shared. Paths that don't look like by-path names get one private
+    link, i.e. are treated as sharing nothing.
+    """
+    name = path.rsplit('/', 1)[-1]
+    m = _BY_PATH_RE.match(name)
+    if not m:
+        return (f"unknown:{path}",)
+    ports = m.group('ports').split('.')
+    prefix = f"{m.group('controller')}-usb-{m.group('bus')}"
+    return tuple(f"{prefix}:{'.'.join(ports[:i])}" for i in range(1, len(ports)))
+
+
+class Topology:
+    """Which cameras share which USB links.
+
+    Built from real device paths with ``from_paths()``, or from a plain
+    dict for testing and planning without the hardware attached::
+
+        Topology({'1': ['hub-a'], '2': ['hub-a'], '3': ['root-2']})
+    """
+
+    def __init__(self, links_by_camera):
+        self.links_by_camera = {k: tuple(v) for k, v in links_by_camera.items()}
+
+    @classmethod
+    def from_paths(cls, camera_paths):
+        return cls({k: parse_by_path(p) for k, p in camera_paths.items()})
+
+    def cameras_on(self, link):
+        return [k for k, links in self.links_by_camera.items() if link in links]
+
+    @property
+    def links(self):
+        seen = []
+        for links in self.links_by_camera.values():
+            seen.extend(l for l in links if l not in seen)
+        return seen
+
+
+# ---- Planner ----
+
+# Outcome of planning: camera key -> chosen CameraMode, per-link usage in
+# bits/s, and the cameras that could not be fitted even at their cheapest mode.
+BandwidthPlan = namedtuple('BandwidthPlan', ['modes', 'usage', 'over_budget'])
+
+
+def _degradation_ladder(modes, fps, fourccs):
+    """Usable modes from most to least desirable: preferred format first, then bigger frames."""
+    usable = [m for m in modes if m.fourcc in fourccs and m.fps >= fps]
+    usable = usable or [m for m in modes if m.fourcc in fourccs] or list(modes)
+
+    def rank(m):
+        fmt = fourccs.index(m.fourcc) if m.fourcc in fourccs else len(fourccs)
+        return fmt, -m.width * m.height, -m.fps
+
+    return sorted(usable, key=rank)
+
+
+def plan_bandwidth(topology, modes_by_camera, required_by_camera, budget=None,
+                   fps=TARGET_FPS, fourccs=PREFERRED_FOURCCS):
+    """Assign each camera a mode so every shared link stays within ``budget``.
+
+    Cameras start at the mode ``camera_probe.choose_mode`` would pick for
+    their required tile size. While a link is over budget, the camera using
+    the most bandwidth on it steps down to the next mode on its ladder
+    (preferred format first, then smaller frames) that uses less. Cameras
+    still over budget at their cheapest mode are reported in
+    ``over_budget`` rather than left to fail when the device is opened.
+    """
+    budget = link_budget() if budget is None else budget
+    options = {}
+    chosen = {}
+    for k, modes in modes_by_camera.items():
+        if not modes:
+            continue
+        options[k] = _degradation_ladder(modes, fps, fourccs)
+        chosen[k] = choose_mode(modes, required_by_camera.get(k), fps, fourccs)
+
+    def usage():
+        return {
+            link: sum(mode_bandwidth(chosen[k]) for k in topology.cameras_on(link) if k in chosen)
+            for link in topology.links
+        }
+
+    stuck = set()
+    while True:
+        current = usage()
+        over = [l for l, bps in current.items() if bps > budget]
+        if not over:
+            break
+        link = max(over, key=lambda l: current[l])
+        movable = [k for k in topology.cameras_on(link) if k in chosen and k not in stuck]
+        if not movable:
+            break
+        k = max(movable, key=lambda c: mode_bandwidth(chosen[c]))
+        cheaper = [m for m in options[k] if mode_bandwidth(m) < mode_bandwidth(chosen[k])]
+        if cheaper:
+            chosen[k] = cheaper[0]
+        else:
+            stuck.add(k)
+
+    current = usage()
+    over_budget = sorted({
+        k for link, bps in current.items() if bps > budget
+        for k in topology.cameras_on(link) if k in chosen
+    })
+    return BandwidthPlan(chosen, current, over_budget)
+
+
+def format_plan(plan, budget=None):
+    """Human-readable plan, one line per camera and per shared link."""
+    budget = link_budget() if budget is None else budget
+    lines = ["Camera modes:"]
+    for k, m in sorted(plan.modes.items()):
+        lines.append(f"  {k}: {m.fourcc} {m.width}x{m.height}@{m.fps} "
+                     f"~{mode_bandwidth(m) / 1e6:.0f} Mbit/s")
+    lines.append(f"Shared links (budget {budget / 1e6:.0f} Mbit/s):")
+    for link, bps in plan.usage.items():
+        flag = "  OVER BUDGET" if bps > budget else ""
+        lines.append(f"  {link}: {bps / 1e6:.0f} Mbit/s ({bps / budget:.0%}){flag}")
+    if plan.over_budget:
+        lines.append(f"Cannot fit: {', '.join(plan.over_budget)}")
+    return "\n".join(lines)
+
+
+# ---- Dry Run ----
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the USB bandwidth plan for a set of cameras without opening them."
+    )
+    parser.add_argument('cameras', nargs='*', metavar='KEY=PATH',
+                        help="camera key and /dev/v4l/by-path device (modes are probed or read from cache)")
+    parser.add_argument('--topology', metavar='FILE',
+                        help="fake topology JSON: {\"cameras\": {key: {\"links\": [...], \"modes\": "
+                             "[[fourcc, w, h, fps], ...], \"tile\": [w, h]}}}")
+    parser.add_argument('--tile', metavar='WxH', help="required tile size for every camera (default: full resolution)")
+    args = parser.parse_args()
+
+    tile = tuple(int(v) for v in args.tile.split('x')) if args.tile else None
+    if args.topology:
+        with open(args.topology) as f:
+            cameras = json.load(f)['cameras']
+        topology = Topology({k: c['links'] for k, c in cameras.items()})
+        modes = {k: [CameraMode(*m) for m in c['modes']] for k, c in cameras.items()}
+        required = {k: tuple(c['tile']) if c.get('tile') else tile for k, c in cameras.items()}
+    else:
+        paths = dict(c.split('=', 1) for c in args.cameras)
+        topology = Topology.from_paths(paths)
+        cache = CapabilityCache()
+        modes = {k: cache.modes(p) for k, p in paths.items()}
+        required = {k: tile for k in paths}
+
+    print(format_plan(plan_bandwidth(topology, modes, required)))
+
+
+if __name__ == "__main__":
+    main()
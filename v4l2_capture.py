@@ -0,0 +1,531 @@
+import ctypes
+import fcntl
+import glob
+import mmap
+import os
+import select
+import threading
+import time
+import cv2
+import numpy as np
+
+# ---- V4L2 ABI ----
+# Just the structures and ioctls needed for mmap streaming capture, laid out
+# as in <linux/videodev2.h>. ctypes applies the same natural alignment as the
+# kernel headers, so the sizes match on both 32- and 64-bit userspace.
+
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_MEMORY_MMAP = 1
+V4L2_FIELD_ANY = 0
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_STREAMING = 0x04000000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+
+def v4l2_fourcc(code):
+    """``'MJPG'`` -> the little-endian pixel format code V4L2 uses."""
+    a, b, c, d = code.encode('ascii')
+    return a | (b << 8) | (c << 16) | (d << 24)
+
+
+def fourcc_str(value):
+    return bytes((value >> shift) & 0xFF for shift in (0, 8, 16, 24)).decode('ascii', 'replace')
+
+
+class v4l2_capability(ctypes.Structure):
+    _fields_ = [
+        ('driver', ctypes.c_char * 16),
+        ('card', ctypes.c_char * 32),
+        ('bus_info', ctypes.c_char * 32),
+        ('version', ctypes.c_uint32),
+        ('capabilities', ctypes.c_uint32),
+        ('device_caps', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32 * 3),
+    ]
+
+
+class v4l2_pix_format(ctypes.Structure):
+    _fields_ = [
+        ('width', ctypes.c_uint32),
+        ('height', ctypes.c_uint32),
+        ('pixelformat', ctypes.c_uint32),
+        ('field', ctypes.c_uint32),
+        ('bytesperline', ctypes.c_uint32),
+        ('sizeimage', ctypes.c_uint32),
+        ('colorspace', ctypes.c_uint32),
+        ('priv', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('ycbcr_enc', ctypes.c_uint32),
+        ('quantization', ctypes.c_uint32),
+        ('xfer_func', ctypes.c_uint32),
+    ]
+
+
+class _v4l2_format_union(ctypes.Union):
+    # The kernel union also holds v4l2_window, whose pointers give it 8-byte alignment
+    _fields_ = [
+        ('pix', v4l2_pix_format),
+        ('raw_data', ctypes.c_uint8 * 200),
+        ('_align', ctypes.c_void_p),
+    ]
+
+
+class v4l2_format(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_uint32), ('fmt', _v4l2_format_union)]
+
+
+class v4l2_fract(ctypes.Structure):
+    _fields_ = [('numerator', ctypes.c_uint32), ('denominator', ctypes.c_uint32)]
+
+
+class v4l2_captureparm(ctypes.Structure):
+    _fields_ = [
+        ('capability', ctypes.c_uint32),
+        ('capturemode', ctypes.c_uint32),
+        ('timeperframe', v4l2_fract),
+        ('extendedmode', ctypes.c_uint32),
+        ('readbuffers', ctypes.c_uint32),
+        ('reserved', ctypes.c_uint32 * 4),
+    ]
+
+
+class _v4l2_streamparm_union(ctypes.Union):
+    _fields_ = [('capture', v4l2_captureparm), ('raw_data', ctypes.c_uint8 * 200)]
+
+
+class v4l2_streamparm(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_uint32), ('parm', _v4l2_streamparm_union)]
+
+
+class v4l2_requestbuffers(ctypes.Structure):
+    _fields_ = [
+        ('count', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('memory', ctypes.c_uint32),
+        ('capabilities', ctypes.c_uint32),
+        ('flags', ctypes.c_uint8),
+        ('reserved', ctypes.c_uint8 * 3),
+    ]
+
+
+class timeval(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_usec', ctypes.c_long)]
+
+
+class v4l2_timecode(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('frames', ctypes.c_uint8),
+        ('seconds', ctypes.c_uint8),
+        ('minutes', ctypes.c_uint8),
+        ('hours', ctypes.c_uint8),
+        ('userbits', ctypes.c_uint8 * 4),
+    ]
+
+
+class _v4l2_buffer_m(ctypes.Union):
+    _fields_ = [
+        ('offset', ctypes.c_uint32),
+        ('userptr', ctypes.c_ulong),
+        ('planes', ctypes.c_void_p),
+        ('fd', ctypes.c_int32),
+    ]
+
+
+class v4l2_buffer(ctypes.Structure):
+    _fields_ = [
+        ('index', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('bytesused', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('field', ctypes.c_uint32),
+        ('timestamp', timeval),
+        ('timecode', v4l2_timecode),
+        ('sequence', ctypes.c_uint32),
+        ('memory', ctypes.c_uint32),
+        ('m', _v4l2_buffer_m),
+        ('length', ctypes.c_uint32),
+        ('reserved2', ctypes.c_uint32),
+        ('request_fd', ctypes.c_int32),
+    ]
+
+
+_IOC_WRITE = 1
+_IOC_READ = 2
+
+
+def _ioc(direction, nr, struct_type):
+    return (direction << 30) | (ctypes.sizeof(struct_type) << 16) | (ord('V') << 8) | nr
+
+
+VIDIOC_QUERYCAP = _ioc(_IOC_READ, 0, v4l2_capability)
+VIDIOC_G_FMT = _ioc(_IOC_READ | _IOC_WRITE, 4, v4l2_format)
+VIDIOC_S_FMT = _ioc(_IOC_READ | _IOC_WRITE, 5, v4l2_format)
+VIDIOC_REQBUFS = _ioc(_IOC_READ | _IOC_WRITE, 8, v4l2_requestbuffers)
+VIDIOC_QUERYBUF = _ioc(_IOC_READ | _IOC_WRITE, 9, v4l2_buffer)
+VIDIOC_QBUF = _ioc(_IOC_READ | _IOC_WRITE, 15, v4l2_buffer)
+VIDIOC_DQBUF = _ioc(_IOC_READ | _IOC_WRITE, 17, v4l2_buffer)
+VIDIOC_STREAMON = _ioc(_IOC_WRITE, 18, ctypes.c_int)
+VIDIOC_STREAMOFF = _ioc(_IOC_WRITE, 19, ctypes.c_int)
+VIDIOC_S_PARM = _ioc(_IOC_READ | _IOC_WRITE, 22, v4l2_streamparm)
+
+# ---- Capture Settings ----
+
+# Driver buffers used when the caller doesn't ask for a queue depth (mmap
+# streaming needs at least two: one being filled, one being read).
+DEFAULT_BUFFER_COUNT = 4
+MIN_BUFFER_COUNT = 2
+# Longest grab() waits (seconds) for the driver to fill a buffer.
+DEQUEUE_TIMEOUT = 1.0
+
+
+def _imdecode_takes_dst():
+    """Whether this OpenCV build's ``cv2.imdecode`` can decode into a given array."""
+    ok, jpeg = cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))
+    dst = np.empty((8, 8, 3), dtype=np.uint8)
+    try:
+        decoded = cv2.imdecode(jpeg, cv2.IMREAD_COLOR, dst)
+        return ok and decoded is not None and np.shares_memory(decoded, dst)
+    except (cv2.error, TypeError):
+        return False
+
+
+IMDECODE_TAKES_DST = _imdecode_takes_dst()
+
+
+# ---- Devices ----
+
+class IoctlDevice:
+    """A real ``/dev/video*`` node driven with ``fcntl.ioctl`` and ``mmap``."""
+
+    def __init__(self, path):
+        self._ioctl = fcntl.ioctl
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        cap = v4l2_capability()
+        self._ioctl(self.fd, VIDIOC_QUERYCAP, cap)
+        caps = cap.device_caps if cap.capabilities & V4L2_CAP_DEVICE_CAPS else cap.capabilities
+        if not caps & V4L2_CAP_VIDEO_CAPTURE or not caps & V4L2_CAP_STREAMING:
+            os.close(self.fd)
+            raise OSError(f"{path} is not a streaming capture device")
+        self._maps = []
+
+    def configure(self, fourcc, width, height, fps):
+        """Apply format and frame rate; returns the ``(fourcc, width, height, fps)`` the driver chose."""
+        fmt = v4l2_format(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        self._ioctl(self.fd, VIDIOC_G_FMT, fmt)
+        if fourcc:
+            fmt.fmt.pix.pixelformat = v4l2_fourcc(fourcc)
+        if width and height:
+            fmt.fmt.pix.width = width
+            fmt.fmt.pix.height = height
+        fmt.fmt.pix.field = V4L2_FIELD_ANY
+        self._ioctl(self.fd, VIDIOC_S_FMT, fmt)
+        actual_fps = fps
+        if fps:
+            parm = v4l2_streamparm(type=V4L2_BUF_TYPE_VIDEO_CAPTURE)
+            parm.parm.capture.timeperframe.numerator = 1
+            parm.parm.capture.timeperframe.denominator = int(fps)
+            try:
+                self._ioctl(self.fd, VIDIOC_S_PARM, parm)
+                tpf = parm.parm.capture.timeperframe
+                if tpf.numerator:
+                    actual_fps = tpf.denominator / tpf.numerator
+            except OSError:
+                pass  # Not every driver lets the frame rate be set
+        pix = fmt.fmt.pix
+        return fourcc_str(pix.pixelformat), pix.width, pix.height, actual_fps
+
+    def start(self, count):
+        """Allocate, map and queue ``count`` buffers, then start streaming; returns the mapped buffers."""
+        req = v4l2_requestbuffers(count=count, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        self._ioctl(self.fd, VIDIOC_REQBUFS, req)
+        self._maps = []
+        for index in range(req.count):
+            buf = v4l2_buffer(index=index, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+            self._ioctl(self.fd, VIDIOC_QUERYBUF, buf)
+            self._maps.append(mmap.mmap(self.fd, buf.length, mmap.MAP_SHARED,
+                                        mmap.PROT_READ | mmap.PROT_WRITE, offset=buf.m.offset))
+            self.queue(index)
+        self._ioctl(self.fd, VIDIOC_STREAMON, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+        return self._maps
+
+    def queue(self, index):
+        buf = v4l2_buffer(index=index, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        self._ioctl(self.fd, VIDIOC_QBUF, buf)
+
+    def dequeue(self, timeout):
+        """Return ``(index, bytesused, timestamp)`` of the next filled buffer, or None on timeout."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        buf = v4l2_buffer(type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+        self._ioctl(self.fd, VIDIOC_DQBUF, buf)
+        # uvcvideo stamps buffers with CLOCK_MONOTONIC, the clock time.monotonic() reads
+        return buf.index, buf.bytesused, buf.timestamp.tv_sec + buf.timestamp.tv_usec / 1e6
+
+    def ready(self):
+        """True if a filled buffer is waiting to be dequeued right now."""
+        readable, _, _ = select.select([self.fd], [], [], 0)
+        return bool(readable)
+
+    def stop(self):
+        try:
+            self._ioctl(self.fd, VIDIOC_STREAMOFF, ctypes.c_int(V4L2_BUF_TYPE_VIDEO_CAPTURE))
+        except OSError:
+            pass
+        for m in self._maps:
+            try:
+                m.close()
+            except BufferError:
+                pass  # A consumer still holds a view; the mapping goes when it does
+        self._maps = []
+        try:
+            req = v4l2_requestbuffers(count=0, type=V4L2_BUF_TYPE_VIDEO_CAPTURE, memory=V4L2_MEMORY_MMAP)
+            self._ioctl(self.fd, VIDIOC_REQBUFS, req)
+        except OSError:
+            pass
+
+    def close(self):
+        self.stop()
+        os.close(self.fd)
+
+
+class FileDevice:
+    """Fake MJPEG camera backed by files, with the same interface as ``IoctlDevice``.
+
+    ``path`` is either a directory of ``.jpg`` files or one file of
+    concatenated JPEG frames (e.g. a raw MJPEG dump). Frames are copied into
+    fixed buffers and handed out in a loop at the configured frame rate, so
+    the capture code above it runs exactly as it would against a camera.
+    """
+
+    def __init__(self, path, fps=30):
+        self.path = path
+        if os.path.isdir(path):
+            frames = []
+            for name in sorted(glob.glob(os.path.join(path, '*.jpg'))):
+                with open(name, 'rb') as f:
+                    frames.append(f.read())
+        else:
+            with open(path, 'rb') as f:
+                frames = split_jpeg_stream(f.read())
+        if not frames:
+            raise OSError(f"No JPEG frames in {path}")
+        self._frames = frames
+        first = cv2.imdecode(np.frombuffer(frames[0], np.uint8), cv2.IMREAD_COLOR)
+        self._size = (first.shape[1], first.shape[0])
+        self._fps = fps
+        self._buffers = []
+        self._queued = []
+        self._next_frame = 0
+        self._next_due = None
+
+    def configure(self, fourcc, width, height, fps):
+        # The files fix the format and size; only the pacing can change
+        self._fps = fps or self._fps
+        return 'MJPG', self._size[0], self._size[1], self._fps
+
+    def start(self, count):
+        size = max(len(f) for f in self._frames)
+        self._buffers = [bytearray(size) for _ in range(count)]
+        self._queued = list(range(count))
+        self._next_due = time.monotonic()
+        return self._buffers
+
+    def queue(self, index):
+        self._queued.append(index)
+
+    def dequeue(self, timeout):
+        if not self._queued:
+            return None
+        wait = self._next_due - time.monotonic()
+        if wait > timeout:
+            return None
+        if wait > 0:
+            time.sleep(wait)
+        stamp = max(self._next_due, time.monotonic() - 1 / self._fps)
+        self._next_due = stamp + 1 / self._fps
+        index = self._queued.pop(0)
+        frame = self._frames[self._next_frame]
+        self._next_frame = (self._next_frame + 1) % len(self._frames)
+        self._buffers[index][:len(frame)] = frame
+        return index, len(frame), stamp
+
+    def ready(self):
+        return bool(self._queued) and time.monotonic() >= self._next_due
+
+    def stop(self):
+        self._buffers = []
+        self._queued = []
+
+    def close(self):
+        self.stop()
+
+
+def split_jpeg_stream(data):
+    """Split concatenated JPEG frames on their SOI/EOI markers."""
+    frames = []
+    start = data.find(b'\xff\xd8')
+    while start >= 0:
+        end = data.find(b'\xff\xd9', start + 2)
+        if end < 0:
+            break
+        frames.append(data[start:end + 2])
+        start = data.find(b'\xff\xd8', end + 2)
+    return frames
+
+
+# ---- Capture ----
+
+class V4L2Capture:
+    """Drop-in for the parts of ``cv2.VideoCapture`` the capture engine uses.
+
+    Buffers are mmap'ed from the driver and handed out without copying: with
+    ``CAP_PROP_CONVERT_RGB`` off, ``retrieve()`` returns a uint8 array that
+    *is* the driver buffer (MJPEG bytes or YUYV pixels), valid until the
+    next ``grab()`` puts it back in the queue. Callers that keep it longer
+    must copy it (``zero_copy`` is True to tell them so). With conversion
+    on, MJPEG is decoded with ``cv2.imdecode`` and YUYV converted to BGR,
+    into ``image`` when its shape allows. OpenCV builds whose ``imdecode``
+    can't take a destination return a newly decoded frame each time, which
+    a ``frame_buffers.BufferRing`` then counts as an allocation.
+
+    Settings take effect on the next ``grab()`` (or size query), which
+    restarts streaming if the format changed.
+    """
+
+    zero_copy = True
+
+    def __init__(self, path, device=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fourcc = 'MJPG'
+        self._size = (0, 0)
+        self._fps = 30
+        self._buffer_count = DEFAULT_BUFFER_COUNT
+        self._convert_rgb = True
+        self._dirty = True
+        self._streaming = False
+        self._buffers = []
+        self._current = None  # (index, bytesused, timestamp) of the buffer we hold
+        self._active = ('MJPG', 0, 0, 0)
+        try:
+            self._device = device or IoctlDevice(path)
+        except OSError:
+            self._device = None
+
+    def isOpened(self):
+        return self._device is not None
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FOURCC:
+            self._fourcc = fourcc_str(int(value))
+        elif prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self._size = (int(value), self._size[1])
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self._size = (self._size[0], int(value))
+        elif prop == cv2.CAP_PROP_FPS:
+            self._fps = value
+        elif prop == cv2.CAP_PROP_BUFFERSIZE:
+            self._buffer_count = max(MIN_BUFFER_COUNT, int(value))
+        elif prop == cv2.CAP_PROP_CONVERT_RGB:
+            self._convert_rgb = bool(value)
+            return True
+        else:
+            return False
+        self._dirty = True
+        return True
+
+    def get(self, prop):
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS,
+                    cv2.CAP_PROP_FOURCC):
+            self._ensure_streaming()
+            fourcc, width, height, fps = self._active
+            return {
+                cv2.CAP_PROP_FRAME_WIDTH: width,
+                cv2.CAP_PROP_FRAME_HEIGHT: height,
+                cv2.CAP_PROP_FPS: fps,
+                cv2.CAP_PROP_FOURCC: v4l2_fourcc(fourcc),
+            }[prop]
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self._current[2] * 1000 if self._current else 0
+        if prop == cv2.CAP_PROP_BUFFERSIZE:
+            return self._buffer_count
+        if prop == cv2.CAP_PROP_CONVERT_RGB:
+            return float(self._convert_rgb)
+        return 0
+
+    def _ensure_streaming(self):
+        if self._device is None or not self._dirty:
+            return
+        if self._streaming:
+            # Drop our views first so the old mappings can be closed
+            self._buffers = []
+            self._current = None
+            self._device.stop()
+            self._streaming = False
+        width, height = self._size
+        self._active = self._device.configure(self._fourcc, width, height, self._fps)
+        self._buffers = [memoryview(b) for b in self._device.start(self._buffer_count)]
+        self._streaming = True
+        self._dirty = False
+
+    def grab(self):
+        with self._lock:
+            if self._device is None:
+                return False
+            self._ensure_streaming()
+            if self._current is not None:
+                # Hand the previous buffer back to the driver before taking the next one
+                self._device.queue(self._current[0])
+                self._current = None
+            self._current = self._device.dequeue(DEQUEUE_TIMEOUT)
+            return self._current is not None
+
+    def frame_waiting(self):
+        """True if another frame is already queued, i.e. ``grab()`` would return without waiting."""
+        with self._lock:
+            return self._streaming and self._device is not None and self._device.ready()
+
+    def buffer(self):
+        """Zero-copy ``memoryview`` of the grabbed frame's bytes (None if nothing is held)."""
+        if self._current is None:
+            return None
+        index, used, _ = self._current
+        return self._buffers[index][:used]
+
+    def retrieve(self, image=None):
+        view = self.buffer()
+        if view is None:
+            return False, None
+        data = np.frombuffer(view, dtype=np.uint8)
+        if not self._convert_rgb:
+            return True, data
+        fourcc, width, height, _ = self._active
+        if fourcc == 'YUYV':
+            yuyv = data[:width * height * 2].reshape(height, width, 2)
+            if image is not None and image.shape == (height, width, 3):
+                return True, cv2.cvtColor(yuyv, cv2.COLOR_YUV2BGR_YUYV, dst=image)
+            return True, cv2.cvtColor(yuyv, cv2.COLOR_YUV2BGR_YUYV)
+        if IMDECODE_TAKES_DST and image is not None and image.shape == (height, width, 3):
+            frame = cv2.imdecode(data, cv2.IMREAD_COLOR, image)
+            return frame is not None, frame
+        # A fresh frame; copying it into ``image`` would only add a memcpy and hide the allocation
+        frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        return frame is not None, frame
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def release(self):
+        with self._lock:
+            self._buffers = []
+            self._current = None
+            if self._device is not None:
+                self._device.close()
+                self._device = None
+            self._streaming = False
@@ -0,0 +1,84 @@
+import threading
+
+# Deepest digital zoom; past this a 720p frame is upscaling a few dozen pixels.
+MAX_ZOOM = 8.0
+# Zoom applied by one mouse wheel notch or double tap on the local display.
+ZOOM_STEP = 1.25
+DOUBLE_TAP_ZOOM = 2.0
+
+
+class ZoomState:
+    """Digital pan/zoom of one camera: which part of its frame is shown.
+
+    ``zoom`` 1 is the whole frame; at ``zoom`` 2 a quarter of it (half the
+    width and height) around ``center``, in 0..1 frame coordinates, fills
+    the tile. Touch handlers (local display, web UI) change it from their
+    own threads; the compositor reads ``snapshot()`` and only recomputes
+    its crop and resize geometry when ``version`` moved on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.zoom = 1.0
+        self.center = (0.5, 0.5)
+        self.version = 0
+
+    def _roi(self):
+        half = 0.5 / self.zoom
+        cx, cy = self.center
+        return cx - half, cy - half, cx + half, cy + half
+
+    def snapshot(self):
+        """Return ``(version, (x0, y0, x1, y1))``: the visible part of the frame, as 0..1 fractions."""
+        with self._lock:
+            return self.version, self._roi()
+
+    @property
+    def is_zoomed(self):
+        return self.zoom > 1.0
+
+    def _set(self, zoom, cx, cy):
+        zoom = min(max(zoom, 1.0), MAX_ZOOM)
+        # Keep the view inside the frame
+        half = 0.5 / zoom
+        center = (min(max(cx, half), 1 - half), min(max(cy, half), 1 - half))
+        if (zoom, center) != (self.zoom, self.center):
+            self.zoom = zoom
+            self.center = center
+            self.version += 1
+
+    def zoom_by(self, factor, anchor=(0.5, 0.5)):
+        """Zoom by ``factor`` (>1 in, <1 out), keeping the point at ``anchor`` (0..1 of the view) still."""
+        with self._lock:
+            x0, y0, x1, y1 = self._roi()
+            ax, ay = anchor
+            # Where the anchor is in the frame, before and after
+            px, py = x0 + ax * (x1 - x0), y0 + ay * (y1 - y0)
+            zoom = min(max(self.zoom * factor, 1.0), MAX_ZOOM)
+            size = 1.0 / zoom
+            self._set(zoom, px + (0.5 - ax) * size, py + (0.5 - ay) * size)
+
+    def pan_by(self, dx, dy):
+        """Move the view by ``dx``, ``dy`` (fractions of the view's own width and height)."""
+        with self._lock:
+            cx, cy = self.center
+            self._set(self.zoom, cx + dx / self.zoom, cy + dy / self.zoom)
+
+    def toggle(self, anchor=(0.5, 0.5)):
+        """Double tap: zoom in on ``anchor`` from the whole frame, or back out to it."""
+        if self.is_zoomed:
+            self.reset()
+        else:
+            self.zoom_by(DOUBLE_TAP_ZOOM, anchor)
+
+    def reset(self):
+        with self._lock:
+            self._set(1.0, 0.5, 0.5)
+
+
+def crop_view(image, view):
+    """Slice of ``image`` inside ``view``, an (x0, y0, x1, y1) from ``ZoomState.snapshot()``; no copy."""
+    h, w = image.shape[:2]
+    x0, y0, x1, y1 = view
+    x0, y0 = int(round(x0 * w)), int(round(y0 * h))
+    return image[y0:max(y0 + 1, int(round(y1 * h))), x0:max(x0 + 1, int(round(x1 * w)))]